@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class TasksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tasks'
+
+    def ready(self):
+        # Register signal handlers that keep the vector index in sync.
+        from . import signals  # noqa: F401
+        from .db import configure_sqlite_connection
+
+        # Apply the SQLite production profile's PRAGMAs to every new connection
+        connection_created.connect(configure_sqlite_connection, dispatch_uid='tasks.configure_sqlite_connection')
@@ -0,0 +1,238 @@
+from .logger import setup_logger
+from .models import Task
+from .serializers import (TaskSerializer, TaskSearchParamsSerializer, TaskSearchResultSerializer, field_columns,
+                          select_fields)
+from .embeddings import encode_text
+from .index import QuantizedIndex, get_index, fetch_exact_vectors, rerank, search_index
+from .metrics import DB_FETCH_SECONDS, SIMILARITY_SECONDS
+from .pagination import RankedCursorPagination, use_cursor_pagination
+from .search import fuse_hybrid, hybrid_candidate_limit, lexical_search
+from .search_cache import get_search_cache
+from asgiref.sync import sync_to_async
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
+import asyncio
+import json
+import threading
+
+logger = setup_logger(__name__)
+encode_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_encode_executor():
+    """
+    Returns the bounded thread pool that runs encodes and index searches for the async views,
+    so CPU-bound work never blocks the event loop and at most TASK_ASYNC_ENCODE_WORKERS of it runs at once.
+    """
+    global encode_executor
+
+    if encode_executor is None:
+        with _executor_lock:
+            if encode_executor is None:
+                encode_executor = ThreadPoolExecutor(max_workers=getattr(settings, 'TASK_ASYNC_ENCODE_WORKERS', 4),
+                                                     thread_name_prefix='task-async-encode')
+
+    return encode_executor
+
+
+async def run_in_encoder(func, *args):
+    """
+    Run a blocking, CPU-bound callable on the encode executor and await its result.
+    """
+    return await asyncio.get_running_loop().run_in_executor(get_encode_executor(), func, *args)
+
+
+async def authenticate(request):
+    """
+    Resolve the user of a request from its 'Authorization: Token <key>' header with the async ORM,
+    like rest_framework.authentication.TokenAuthentication does for the sync views.
+
+    :return: The active user, or None.
+    """
+    header = request.headers.get('Authorization', '').split()
+    if len(header) != 2 or header[0].lower() != 'token':
+        return None
+    token = await Token.objects.select_related('user').filter(key=header[1]).afirst()
+    if token is None or not token.user.is_active:
+        return None
+    return token.user
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+def parse_json(request):
+    try:
+        return json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncTaskView(View):
+    """
+    Base class for the async task views: token authentication with the async ORM and JSON errors.
+    """
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await authenticate(request)
+        if request.user is None:
+            return json_response({'detail': 'Authentication credentials were not provided.'}, status=401)
+        return await super().dispatch(request, *args, **kwargs)
+
+    async def http_method_not_allowed(self, request, *args, **kwargs):
+        return json_response({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+
+
+class AsyncTaskListView(AsyncTaskView):
+    """
+    Async task creation. The task's vector is generated on the encode executor
+    while the event loop keeps serving other requests.
+    """
+    async def post(self, request):
+        data = parse_json(request)
+        if data is None:
+            return json_response({'detail': 'Malformed JSON.'}, status=400)
+        serializer = TaskSerializer(data=data, context={'request': request})
+        if not serializer.is_valid():
+            return json_response(serializer.errors, status=400)
+
+        task = Task(owner=request.user, **serializer.validated_data)
+        if getattr(settings, 'TASK_EMBEDDING_MODE', 'sync') != 'async':
+            task.set_embedding(await run_in_encoder(encode_text, task.embedding_text))
+        await task.asave()
+        logger.info(f"Created new task: {task.id}")
+        return json_response(TaskSerializer(task, context={'request': request}).data, status=201)
+
+
+class AsyncTaskDetailView(AsyncTaskView):
+    """
+    Async retrieval and full or partial update of a task. Only the owner may update it.
+    """
+    async def get_task(self, pk):
+        return await Task.objects.filter(pk=pk).afirst()
+
+    async def get(self, request, pk):
+        task = await self.get_task(pk)
+        if task is None:
+            return json_response({'detail': 'No Task matches the given query.'}, status=404)
+        return json_response(TaskSerializer(task, context={'request': request}).data)
+
+    async def put(self, request, pk):
+        return await self.update(request, pk, partial=False)
+
+    async def patch(self, request, pk):
+        return await self.update(request, pk, partial=True)
+
+    async def update(self, request, pk, partial):
+        task = await self.get_task(pk)
+        if task is None:
+            return json_response({'detail': 'No Task matches the given query.'}, status=404)
+        if task.owner_id != request.user.pk:
+            return json_response({'detail': 'You do not have permission to perform this action.'}, status=403)
+        data = parse_json(request)
+        if data is None:
+            return json_response({'detail': 'Malformed JSON.'}, status=400)
+        serializer = TaskSerializer(task, data=data, partial=partial, context={'request': request})
+        if not serializer.is_valid():
+            return json_response(serializer.errors, status=400)
+
+        for attr, value in serializer.validated_data.items():
+            setattr(task, attr, value)
+        dirty = task.get_dirty_fields()
+        if ('title' in dirty or 'description' in dirty) and getattr(settings, 'TASK_EMBEDDING_MODE', 'sync') != 'async':
+            task.set_embedding(await run_in_encoder(encode_text, task.embedding_text))
+        await task.asave()
+        logger.info(f"Updated task: {task.id}")
+        return json_response(TaskSerializer(task, context={'request': request}).data)
+
+
+class AsyncTaskSearchView(AsyncTaskView):
+    """
+    Async counterpart of TaskViewSet.search_tasks, taking the same k, min_score, page and cursor
+    parameters and returning the same paginated, scored results.
+    """
+    async def get(self, request, query):
+        drf_request = Request(request)
+        params = TaskSearchParamsSerializer(data=drf_request.query_params, context={'request': request})
+        if not params.is_valid():
+            return json_response(params.errors, status=400)
+        try:
+            fields = select_fields(TaskSearchResultSerializer, drf_request.query_params, ['vector_representation'])
+        except ValidationError as e:
+            return json_response(e.detail, status=400)
+
+        k, mode, filters = params.validated_data['k'], params.validated_data['mode'], params.validated_data['filters']
+        min_score = params.validated_data['min_score']
+        cache = get_search_cache()
+        cache_key = hits = None
+        if cache is not None:
+            cache_key, hits = await sync_to_async(cache.lookup)(query, mode, k, min_score, filters)
+        if hits is None:
+            hits = await self.search(query, mode, k, min_score, filters)
+            if cache is not None:
+                await sync_to_async(cache.set)(cache_key, hits)
+
+        paginator = RankedCursorPagination() if use_cursor_pagination(drf_request) else PageNumberPagination()
+        try:
+            page_hits = paginator.paginate_queryset(hits, drf_request)
+        except NotFound as e:
+            return json_response({'detail': str(e.detail)}, status=404)
+        with DB_FETCH_SECONDS.time(operation='search_page'):
+            tasks_by_id = await Task.objects.only(*field_columns(fields)).ain_bulk(
+                [task_id for task_id, _ in page_hits])
+        similar_tasks = []
+        for task_id, score in page_hits:
+            task = tasks_by_id.get(task_id)
+            if task is not None:
+                task.score = score
+                similar_tasks.append(task)
+
+        serializer = TaskSearchResultSerializer(similar_tasks, many=True, fields=fields,
+                                                context={'request': drf_request})
+        return json_response(paginator.get_paginated_response(serializer.data).data)
+
+    async def search(self, query, mode, k, min_score, filters):
+        """
+        Rank the tasks matching a query like TaskViewSet.search_tasks does.
+
+        :return: List of (task_id, score) tuples, best first.
+        """
+        if mode != 'vector':
+            limit = k if mode == 'keyword' else hybrid_candidate_limit(k)
+            lexical_hits = await sync_to_async(lexical_search)(query, limit, filters)
+            if mode == 'keyword':
+                return lexical_hits
+            if lexical_hits:
+                query_vector = await run_in_encoder(encode_text, query, 'query')
+                vectors = await sync_to_async(fetch_exact_vectors)([task_id for task_id, _ in lexical_hits])
+                return fuse_hybrid(lexical_hits, query_vector, vectors, k, min_score)
+        query_vector = await run_in_encoder(encode_text, query, 'query')
+        # A first search may build the index from the database, which must run on the ORM's thread
+        index = await sync_to_async(get_index)()
+        if isinstance(index, QuantizedIndex):
+            return await self.search_quantized(index, query_vector, k, min_score, filters)
+        return await run_in_encoder(search_index, index, query_vector, k, min_score, filters)
+
+    @staticmethod
+    async def search_quantized(index, query_vector, k, min_score, filters):
+        """
+        Search a quantized index like search_index does, but load the exact vectors of its shortlist
+        on the ORM's thread: the scoring runs on the encode executor, where the ORM must not be used.
+        """
+        with SIMILARITY_SECONDS.time(index=getattr(settings, 'TASK_INDEX_TYPE', 'exact')):
+            query, shortlist = await run_in_encoder(index.shortlist, query_vector, k, min_score, filters)
+            if not shortlist:
+                return []
+            exact = await sync_to_async(index.exact_lookup)([task_id for task_id, _ in shortlist])
+            return await run_in_encoder(rerank, shortlist, query, exact, k, min_score)
@@ -0,0 +1,176 @@
+from .logger import setup_logger
+from .exception import AppException
+from .utils import get_model
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from django.conf import settings
+import os
+import queue
+import threading
+import time
+import numpy as np
+
+logger = setup_logger(__name__)
+encode_batcher = None
+_batcher_lock = threading.Lock()
+
+
+class EncodeBatcher:
+    """
+    Coalesces concurrent encode requests into batched model calls.
+
+    Callers on any thread submit their texts and block on a future. A single
+    dispatcher thread takes the first waiting request and the ones queued behind
+    it; if there are any, it keeps collecting requests for up to max_wait_ms or
+    until max_batch_size texts are queued. It then encodes them with one model
+    call and hands each caller its rows. A request that arrives alone is encoded
+    right away, so batching only costs latency under contention. Running the model on one
+    thread also stops request threads from contending for torch's intra-op thread pool.
+    """
+    def __init__(self, max_batch_size=32, max_wait_ms=5.0, encode=None, max_queue_size=0, queue_timeout=None,
+                 result_timeout=None):
+        """
+        :param max_batch_size: Number of texts after which a batch is dispatched without waiting.
+        :param max_wait_ms: How long the first request of a batch waits for others to join it.
+        :param encode: Callable mapping a list of texts to an array of vectors. Defaults to the shared model.
+        :param max_queue_size: Maximum number of requests waiting for a batch (0 for no limit).
+        :param queue_timeout: Seconds a request waits for room in a full queue before encode() raises
+                              AppException (None waits indefinitely).
+        :param result_timeout: Seconds a queued request waits for its batch to be encoded before encode()
+                               raises AppException (None waits indefinitely).
+        """
+        self.max_batch_size = max(int(max_batch_size), 1)
+        self.max_wait = max(float(max_wait_ms), 0.0) / 1000
+        self._encode = encode or (lambda texts: get_model().encode(texts))
+        self.max_queue_size = max(int(max_queue_size), 0)
+        self.queue_timeout = queue_timeout
+        self.result_timeout = result_timeout
+        self._queue = queue.Queue(self.max_queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.batches = 0
+        self.requests = 0
+        self.items = 0
+        self.max_batch_seen = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.rejected = 0
+
+    def _ensure_started(self):
+        # Started lazily, again in a forked child, where the parent's thread does not exist,
+        # and again if the thread died, in which case it takes over the requests already queued
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue(self.max_queue_size)
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='task-encode-batcher', daemon=True)
+                self._thread.start()
+
+    def encode(self, texts):
+        """
+        Encode texts as part of the next batch, blocking until it has run.
+
+        :param texts: List of strings.
+        :return: float32 NumPy array of shape (len(texts), dim).
+        """
+        future = Future()
+        self._ensure_started()
+        try:
+            self._queue.put((list(texts), future, time.monotonic()), timeout=self.queue_timeout)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            raise AppException(f"Encode queue is full ({self.max_queue_size} requests waiting).")
+        try:
+            return future.result(timeout=self.result_timeout)
+        except FutureTimeoutError:
+            raise AppException(f"Encode batch did not complete within {self.result_timeout}s.")
+
+    def _run(self):
+        while True:
+            request = self._queue.get()
+            batch = [request]
+            size = len(request[0])
+            deadline = request[2] + self.max_wait
+            while size < self.max_batch_size:
+                try:
+                    # Requests already queued join the batch at once. More are awaited until the
+                    # deadline, but not by a lone request: waiting would only add to its latency.
+                    request = self._queue.get_nowait()
+                except queue.Empty:
+                    timeout = deadline - time.monotonic()
+                    if len(batch) == 1 or timeout <= 0:
+                        break
+                    try:
+                        request = self._queue.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+                batch.append(request)
+                size += len(request[0])
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        started = time.monotonic()
+        texts = [text for request_texts, _, _ in batch for text in request_texts]
+        waits = [started - enqueued for _, _, enqueued in batch]
+        with self._lock:
+            self.batches += 1
+            self.requests += len(batch)
+            self.items += len(texts)
+            self.max_batch_seen = max(self.max_batch_seen, len(texts))
+            self.queue_wait_total += sum(waits)
+            self.queue_wait_max = max(self.queue_wait_max, *waits)
+
+        try:
+            vectors = np.asarray(self._encode(texts), dtype=np.float32)
+        except Exception as e:
+            logger.error(f"Error encoding a batch of {len(texts)} texts: {e}")
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        offset = 0
+        for request_texts, future, _ in batch:
+            future.set_result(vectors[offset:offset + len(request_texts)])
+            offset += len(request_texts)
+
+    def stats(self):
+        """
+        Returns batch-size and queue-wait metrics since the batcher was created.
+        """
+        with self._lock:
+            return {
+                'batches': self.batches,
+                'requests': self.requests,
+                'items': self.items,
+                'mean_batch_size': self.items / self.batches if self.batches else 0.0,
+                'max_batch_size': self.max_batch_seen,
+                'mean_queue_wait_ms': 1000 * self.queue_wait_total / self.requests if self.requests else 0.0,
+                'max_queue_wait_ms': 1000 * self.queue_wait_max,
+                'queued': self._queue.qsize(),
+                'rejected': self.rejected,
+            }
+
+
+def get_encode_batcher():
+    """
+    Returns the process-wide encode batcher, or None when TASK_ENCODE_BATCH_WAIT_MS is 0.
+    """
+    global encode_batcher
+
+    max_wait_ms = getattr(settings, 'TASK_ENCODE_BATCH_WAIT_MS', 5.0)
+    if max_wait_ms <= 0:
+        return None
+    if encode_batcher is None:
+        with _batcher_lock:
+            if encode_batcher is None:
+                encode_batcher = EncodeBatcher(
+                    max_batch_size=getattr(settings, 'TASK_ENCODE_BATCH_MAX_SIZE', 32),
+                    max_wait_ms=max_wait_ms,
+                    result_timeout=getattr(settings, 'TASK_ENCODE_BATCH_TIMEOUT', 60.0),
+                )
+
+    return encode_batcher
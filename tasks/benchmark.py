@@ -0,0 +1,369 @@
+from .logger import setup_logger
+from .exception import AppException
+from .db import get_sqlite_pragmas
+from .models import Task
+from .index import get_index, reset_index
+from .pagination import TaskCursorPagination
+from .search import fts_available
+from .serializers import TaskSerializer
+from . import utils
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, connections
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from datetime import timedelta
+import math
+import random
+import time
+import numpy as np
+
+logger = setup_logger(__name__)
+
+WORDS = [
+    'review', 'update', 'fix', 'deploy', 'write', 'plan', 'prepare', 'schedule', 'migrate', 'test',
+    'design', 'refactor', 'document', 'call', 'email', 'invoice', 'budget', 'report', 'meeting', 'release',
+    'database', 'server', 'login', 'payment', 'search', 'dashboard', 'customer', 'vendor', 'contract', 'audit',
+    'backup', 'security', 'onboarding', 'training', 'roadmap', 'sprint', 'ticket', 'bug', 'feature', 'api',
+    'mobile', 'website', 'newsletter', 'campaign', 'survey', 'analytics', 'quarterly', 'weekly', 'monthly',
+    'annual', 'team', 'client', 'project', 'office', 'hiring', 'interview', 'benchmark', 'performance', 'cache',
+    'index', 'upgrade', 'license', 'renewal', 'travel', 'expense', 'tax', 'legal', 'policy', 'inventory',
+    'shipping', 'order', 'refund', 'support', 'feedback', 'prototype', 'review', 'approval', 'draft', 'final',
+    'urgent', 'follow', 'up', 'with', 'for', 'the', 'new', 'old', 'q3', 'q4', 'summary', 'notes', 'slides',
+]
+
+
+def parse_size(value):
+    """
+    Parse a corpus size such as '1000', '100k' or '1m'.
+    """
+    value = value.strip().lower()
+    multiplier = {'k': 1000, 'm': 1000000}.get(value[-1:], 1)
+    return int(float(value[:-1] if multiplier > 1 else value) * multiplier)
+
+
+def summarize(samples_ms):
+    """
+    Latency percentiles of a list of samples in milliseconds.
+    """
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    if not samples.size:
+        return {'n': 0}
+    p50, p90, p99 = np.percentile(samples, [50, 90, 99])
+    return {'n': int(samples.size), 'mean_ms': float(samples.mean()), 'p50_ms': float(p50),
+            'p90_ms': float(p90), 'p99_ms': float(p99), 'max_ms': float(samples.max())}
+
+
+@contextmanager
+def use_encoder(encoder):
+    """
+    Serve get_model() from another encoder, e.g. a HashingEncoder, for the duration of the block.
+    Vectors it produces are tagged and cached under its own name, so they never mix with the
+    configured encoder's.
+    """
+    previous = utils.model
+    utils.model = encoder
+    try:
+        yield encoder
+    finally:
+        utils.model = previous
+
+
+@contextmanager
+def sqlite_profile(production):
+    """
+    Open new database connections under the default or the production SQLite profile
+    (TASK_SQLITE_PRODUCTION with its connection settings) for the duration of the block.
+    The file's journal mode, which persists across connections, is restored afterwards.
+    """
+    settings_dict = connection.settings_dict
+    saved = {key: settings_dict.get(key) for key in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS', 'OPTIONS')}
+    sqlite = connection.vendor == 'sqlite'
+    if sqlite:
+        journal_mode = get_sqlite_pragmas(connection)['journal_mode']
+    with override_settings(TASK_SQLITE_PRODUCTION=production):
+        settings_dict.update({
+            'CONN_MAX_AGE': 600 if production else 0,
+            'CONN_HEALTH_CHECKS': production,
+            'OPTIONS': {**(saved['OPTIONS'] or {}), 'transaction_mode': 'IMMEDIATE' if production else None},
+        })
+        connections.close_all()
+        try:
+            if sqlite and not production:
+                # WAL sticks to the file once enabled: measure the default profile in rollback-journal mode
+                with connection.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode = DELETE')
+            yield
+        finally:
+            connections.close_all()
+            settings_dict.update(saved)
+            if sqlite:
+                with connection.cursor() as cursor:
+                    cursor.execute(f'PRAGMA journal_mode = {journal_mode}')
+
+
+class SyntheticCorpus:
+    """
+    Deterministic generator of task payloads and search queries: the same seed always yields the same corpus.
+    """
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        self.base = (timezone.now() + timedelta(days=1)).replace(microsecond=0)
+
+    def phrase(self, low, high):
+        return ' '.join(self.rng.choice(WORDS) for _ in range(self.rng.randint(low, high)))
+
+    def task(self):
+        return {
+            'title': self.phrase(2, 6).capitalize(),
+            'description': self.phrase(8, 30),
+            'status': self.rng.choice(Task.STATUS_CHOICES)[0],
+            'deadline': (self.base + timedelta(minutes=self.rng.randrange(365 * 24 * 60))).isoformat(),
+        }
+
+    def tasks(self, count):
+        return [self.task() for _ in range(count)]
+
+    def queries(self, count):
+        return [self.phrase(2, 4) for _ in range(count)]
+
+
+class Benchmark:
+    """
+    Measures the project's hot paths through the API, against a growing synthetic corpus:
+    bulk ingest, single creates, index build, search latency per mode, list pagination
+    and serialization.
+    """
+    def __init__(self, owners=10, seed=0, queries=100, creates=100, repeat=20, batch_size=None, log=None):
+        """
+        :param owners: Number of users the corpus is spread over.
+        :param seed: Seed of the synthetic corpus and queries.
+        :param queries: Search requests measured per mode.
+        :param creates: Single task creations measured per corpus size.
+        :param repeat: Requests measured per list and serialization case.
+        :param batch_size: Tasks per bulk request (default TASK_BULK_MAX_ITEMS).
+        :param log: Callable receiving progress messages.
+        """
+        self.corpus = SyntheticCorpus(seed)
+        self.query_texts = self.corpus.queries(queries)
+        self.creates = creates
+        self.repeat = repeat
+        self.batch_size = batch_size or getattr(settings, 'TASK_BULK_MAX_ITEMS', 1000)
+        self.log = log or logger.info
+        User = get_user_model()
+        self.users = [User.objects.get_or_create(username=f'benchmark-{n}')[0] for n in range(max(owners, 1))]
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+
+    def task_count(self):
+        return Task.objects.filter(owner__in=self.users).count()
+
+    def run(self, size):
+        """
+        Grow the corpus to `size` tasks and measure every hot path at that size.
+        """
+        results = {'tasks': size, 'bulk_ingest': self.ingest(size - self.task_count())}
+        results['index_build_ms'] = self.index_build()
+        results['search'] = self.search()
+        results['list'] = self.list_pages()
+        results['serialization'] = self.serialization()
+        results['create'] = self.create()
+        return results
+
+    def ingest(self, count):
+        """
+        Create tasks through POST /api/tasks/bulk/, rotating the requesting user per batch.
+        """
+        self.log(f"Ingesting {count} tasks")
+        url = reverse('task-bulk')
+        started = time.perf_counter()
+        created = 0
+        while created < count:
+            batch = min(self.batch_size, count - created)
+            client = APIClient()
+            client.force_authenticate(self.users[(created // self.batch_size) % len(self.users)])
+            response = client.post(url, {'create': self.corpus.tasks(batch)}, format='json')
+            if response.status_code != 200 or response.data['errors']:
+                raise AppException(f"Bulk ingest failed: {response.data}")
+            created += batch
+        elapsed = time.perf_counter() - started
+        return {'tasks': created, 'seconds': elapsed, 'tasks_per_sec': created / elapsed if elapsed else None}
+
+    def create(self):
+        """
+        Create tasks one request at a time through POST /api/tasks/.
+        """
+        self.log(f"Creating {self.creates} tasks")
+        url = reverse('task-list')
+        samples = []
+        for payload in self.corpus.tasks(self.creates):
+            started = time.perf_counter()
+            response = self.client.post(url, payload, format='json')
+            samples.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 201:
+                raise AppException(f"Task creation failed: {response.data}")
+        total = sum(samples) / 1000
+        return {'latency': summarize(samples), 'tasks_per_sec': len(samples) / total if total else None}
+
+    def index_build(self):
+        reset_index()
+        started = time.perf_counter()
+        get_index()
+        return (time.perf_counter() - started) * 1000
+
+    def time_requests(self, urls, params=None):
+        samples = []
+        for url in urls:
+            started = time.perf_counter()
+            response = self.client.get(url, params)
+            samples.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise AppException(f"GET {url} failed: {response.data}")
+        return summarize(samples)
+
+    def search(self):
+        """
+        Time GET /api/tasks/search/ per mode with the result cache disabled, then vector searches
+        repeated against a warm result cache.
+        """
+        modes = ['vector'] + (['hybrid', 'keyword'] if fts_available() else [])
+        urls = [reverse('task-search-tasks', args=[query]) for query in self.query_texts]
+        results = {}
+        with override_settings(TASK_SEARCH_CACHE_ALIAS=''):
+            for mode in modes:
+                self.log(f"Searching ({mode})")
+                results[mode] = self.time_requests(urls, {'mode': mode, 'min_score': 0})
+        self.time_requests(urls, {'mode': 'vector', 'min_score': 0})
+        results['vector_cached'] = self.time_requests(urls, {'mode': 'vector', 'min_score': 0})
+        return results
+
+    def list_pages(self):
+        """
+        Time the first and last pages of GET /api/tasks/ with page numbers and with cursors.
+        """
+        self.log("Listing")
+        url = reverse('task-list')
+        count = Task.objects.count()
+        page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE') or 10
+        last_page = max(math.ceil(count / page_size), 1)
+        # The cursor of the last page, as reached by following next links
+        paginator = TaskCursorPagination()
+        ordered = Task.objects.order_by('deadline', 'id').values_list('deadline', 'id')
+        position = ordered[max(count - page_size - 1, 0)]
+        deep_cursor = paginator.encode_cursor(position, False)
+        return {
+            'page_first': self.time_requests([url] * self.repeat),
+            'page_last': self.time_requests([url] * self.repeat, {'page': last_page}),
+            'cursor_first': self.time_requests([url] * self.repeat, {'cursor': ''}),
+            'cursor_last': self.time_requests([url] * self.repeat, {'cursor': deep_cursor}),
+        }
+
+    def serialization(self):
+        """
+        Time serializing and rendering 100 tasks to JSON, with and without their vectors.
+        """
+        self.log("Serializing")
+        tasks = list(Task.objects.all()[:100])
+        results = {}
+        for name, fields in [('with_vectors', None), ('without_vectors', ['id', 'title', 'description', 'status',
+                                                                          'deadline', 'owner'])]:
+            samples = []
+            for _ in range(self.repeat):
+                started = time.perf_counter()
+                JSONRenderer().render(TaskSerializer(tasks, many=True, fields=fields).data)
+                samples.append((time.perf_counter() - started) * 1000)
+            results[name] = summarize(samples)
+        return results
+
+    def concurrency(self, readers=4, writers=2, duration=5.0):
+        """
+        Run `readers` threads listing tasks through GET /api/tasks/ against `writers` threads
+        creating tasks through POST /api/tasks/ for `duration` seconds, each thread on its own
+        database connection, and report the throughput, latency and failures of both.
+        Created tasks are deleted afterwards, so successive runs see the same corpus.
+        """
+        self.log(f"Running {readers} readers against {writers} writers for {duration}s")
+        list_url = reverse('task-list')
+        deadline = time.perf_counter() + duration
+
+        def worker(number, kind):
+            client = APIClient()
+            client.force_authenticate(self.users[number % len(self.users)])
+            corpus = SyntheticCorpus(seed=number)
+            samples, errors, created = [], 0, []
+            try:
+                while time.perf_counter() < deadline:
+                    started = time.perf_counter()
+                    try:
+                        if kind == 'write':
+                            response = client.post(list_url, corpus.task(), format='json')
+                            ok = response.status_code == 201
+                            if ok:
+                                created.append(response.data['id'])
+                        else:
+                            ok = client.get(list_url).status_code == 200
+                    except Exception:
+                        # e.g. "database is locked" once the busy timeout expires
+                        ok = False
+                    if ok:
+                        samples.append((time.perf_counter() - started) * 1000)
+                    else:
+                        errors += 1
+            finally:
+                connections.close_all()
+            return kind, samples, errors, created
+
+        kinds = ['read'] * readers + ['write'] * writers
+        with ThreadPoolExecutor(max_workers=len(kinds)) as executor:
+            outcomes = list(executor.map(worker, range(len(kinds)), kinds))
+
+        results = {}
+        for kind in ('read', 'write'):
+            samples = [sample for k, kind_samples, _, _ in outcomes if k == kind for sample in kind_samples]
+            results[f'{kind}s'] = {
+                'threads': kinds.count(kind),
+                'ops': len(samples),
+                'ops_per_sec': len(samples) / duration,
+                'errors': sum(errors for k, _, errors, _ in outcomes if k == kind),
+                'latency': summarize(samples),
+            }
+        Task.objects.filter(pk__in=[pk for _, _, _, created in outcomes for pk in created]).delete()
+        if connection.vendor == 'sqlite':
+            results['pragmas'] = get_sqlite_pragmas(connection)
+        return results
+
+    def cleanup(self):
+        Task.objects.filter(owner__in=self.users).delete()
+        get_user_model().objects.filter(pk__in=[user.pk for user in self.users]).delete()
+        reset_index()
+
+
+def environment():
+    """
+    Versions and settings the results depend on, recorded next to them.
+    """
+    import django
+    import platform
+    import subprocess
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, timeout=5,
+                                cwd=settings.BASE_DIR).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'database': connection.vendor,
+        'index_type': getattr(settings, 'TASK_INDEX_TYPE', 'exact'),
+        'vector_dtype': getattr(settings, 'TASK_VECTOR_DTYPE', 'float32'),
+        'embedding_model': utils.get_model_name(),
+    }
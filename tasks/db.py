@@ -0,0 +1,53 @@
+from .logger import setup_logger
+from django.conf import settings
+
+logger = setup_logger(__name__)
+
+
+def sqlite_pragmas():
+    """
+    PRAGMAs applied to every new SQLite connection, in order: none by default, or the
+    production profile's when TASK_SQLITE_PRODUCTION is set.
+
+    WAL lets readers run alongside the one writer instead of waiting for its lock;
+    synchronous=NORMAL only syncs at checkpoints, which is durable against application crashes
+    in WAL mode (a power loss may roll back the last transactions, never corrupt the file);
+    mmap_size and cache_size keep hot pages in memory; busy_timeout makes a writer wait
+    for the lock rather than fail with "database is locked".
+    """
+    if not getattr(settings, 'TASK_SQLITE_PRODUCTION', False):
+        return []
+    return [
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),
+        ('busy_timeout', int(getattr(settings, 'TASK_SQLITE_BUSY_TIMEOUT_MS', 5000))),
+        ('mmap_size', int(getattr(settings, 'TASK_SQLITE_MMAP_SIZE', 256 * 1024 * 1024))),
+        ('cache_size', int(getattr(settings, 'TASK_SQLITE_CACHE_SIZE', -64 * 1024))),
+    ]
+
+
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """
+    connection_created receiver applying sqlite_pragmas() to each new SQLite connection.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = sqlite_pragmas()
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas:
+            cursor.execute(f'PRAGMA {name} = {value}')
+    logger.debug(f"Configured SQLite connection to {connection.settings_dict['NAME']}: {dict(pragmas)}")
+
+
+def get_sqlite_pragmas(connection):
+    """
+    Current values of the profile's PRAGMAs on a connection, e.g. to record them next to benchmark results.
+    """
+    values = {}
+    with connection.cursor() as cursor:
+        for name in ['journal_mode', 'synchronous', 'busy_timeout', 'mmap_size', 'cache_size']:
+            cursor.execute(f'PRAGMA {name}')
+            values[name] = cursor.fetchone()[0]
+    return values
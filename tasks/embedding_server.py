@@ -0,0 +1,257 @@
+from .logger import setup_logger
+from .exception import AppException
+from .batching import EncodeBatcher
+from .encoders import Encoder, create_encoder
+from django.conf import settings
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+import numpy as np
+
+logger = setup_logger(__name__)
+
+# Every message is a frame: the lengths of its JSON header and of its binary payload, then both.
+# A request's header is {"op": "encode", "texts": [...]} or {"op": "info"}; an encode response
+# carries {"shape": [n, dim]} and the float32 vectors as payload, a failure {"error": "..."}.
+FRAME = struct.Struct('!II')
+
+# Largest frame (header and payload) the server reads, unless configured otherwise
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+
+
+class MessageTooLarge(ValueError):
+    pass
+
+
+def send_message(sock, header, payload=b''):
+    data = json.dumps(header).encode('utf-8')
+    sock.sendall(FRAME.pack(len(data), len(payload)) + data + payload)
+
+
+def recv_exactly(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:], size - received)
+        if not count:
+            raise ConnectionError("Connection closed by peer.")
+        received += count
+    return bytes(buffer)
+
+
+def recv_message(sock, max_size=None):
+    """
+    Read one frame.
+
+    :param max_size: Largest frame in bytes to accept; bigger ones raise MessageTooLarge before anything
+                     is allocated for them. Unlimited if None.
+    :return: Tuple of (header dict, payload bytes), or None if the peer closed the connection between frames.
+    """
+    first = sock.recv(FRAME.size)
+    if not first:
+        return None
+    if len(first) < FRAME.size:
+        first += recv_exactly(sock, FRAME.size - len(first))
+    header_size, payload_size = FRAME.unpack(first)
+    if max_size is not None and header_size + payload_size > max_size:
+        raise MessageTooLarge(f"Message of {header_size + payload_size} bytes exceeds the limit of {max_size} bytes.")
+    header = json.loads(recv_exactly(sock, header_size))
+    return header, recv_exactly(sock, payload_size) if payload_size else b''
+
+
+def tune_torch_threads(threads):
+    """
+    Limit torch's intra-op thread pool, e.g. to the cores left to the web workers.
+    Does nothing when torch is not installed (encoders without a model).
+    """
+    if not threads:
+        return
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(threads)
+
+
+class EncodeRequestHandler(socketserver.BaseRequestHandler):
+    """
+    Serves the requests of one client connection, one at a time, until the client disconnects.
+    """
+    def handle(self):
+        while True:
+            try:
+                message = recv_message(self.request, self.server.max_message_size)
+            except MessageTooLarge as e:
+                # The rest of the frame is never read, so the connection cannot be used any further
+                logger.warning(f"Rejected an embedding request: {e}")
+                try:
+                    send_message(self.request, {'error': str(e)})
+                except OSError:
+                    pass
+                return
+            except (ConnectionError, OSError, ValueError):
+                return
+            if message is None:
+                return
+            header, _ = message
+            try:
+                if header.get('op') == 'info':
+                    send_message(self.request, self.server.info())
+                    continue
+                vectors = self.server.batcher.encode(header['texts'])
+                vectors = np.ascontiguousarray(vectors, dtype='<f4')
+                send_message(self.request, {'shape': list(vectors.shape)}, vectors.tobytes())
+            except (ConnectionError, OSError):
+                return
+            except Exception as e:
+                logger.error(f"Error serving an embedding request: {e}")
+                try:
+                    send_message(self.request, {'error': str(e)})
+                except OSError:
+                    return
+
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Serves encode requests from the web workers over a Unix domain socket, so that one process
+    holds the model (and its torch thread pool) instead of every worker loading its own copy.
+
+    Each client connection is handled on its own thread; its requests are queued to an
+    EncodeBatcher, which coalesces requests arriving together from different workers into
+    one model call. When max_queue_size requests are already waiting, new ones wait up to
+    queue_timeout seconds and are then answered with an error, so an overloaded server sheds
+    load instead of queueing without bound.
+    """
+    daemon_threads = True
+
+    def __init__(self, path, encoder, max_batch_size=64, max_wait_ms=5.0, max_queue_size=1024, queue_timeout=10.0,
+                 max_message_size=MAX_MESSAGE_SIZE):
+        """
+        :param path: Filesystem path of the socket; a stale socket file is replaced.
+        :param encoder: Loaded Encoder the requests are encoded with.
+        :param max_batch_size: Texts per model call after which a batch is dispatched without waiting.
+        :param max_wait_ms: How long the first request of a batch waits for others to join it.
+        :param max_queue_size: Requests waiting for a batch before new ones are held back.
+        :param queue_timeout: Seconds a held back request waits before being rejected.
+        :param max_message_size: Largest request in bytes; bigger ones are answered with an error and
+                                 their connection closed.
+        """
+        self.encoder = encoder
+        self.max_message_size = max_message_size
+        self.batcher = EncodeBatcher(max_batch_size=max_batch_size, max_wait_ms=max_wait_ms, encode=encoder.encode,
+                                     max_queue_size=max_queue_size, queue_timeout=queue_timeout)
+        if os.path.exists(path):
+            os.unlink(path)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Create the socket readable and writable by the owner and group of the web workers only.
+        # Setting the mode with chmod after bind() would leave it open to others in between.
+        umask = os.umask(0o117)
+        try:
+            super().__init__(path, EncodeRequestHandler)
+        finally:
+            os.umask(umask)
+
+    def info(self):
+        return {'name': self.encoder.name, 'dim': int(self.encoder.dim), 'pid': os.getpid(),
+                'batching': self.batcher.stats()}
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+class RemoteEncoder(Encoder):
+    """
+    Thin client of an EmbeddingServer (TASK_ENCODER = 'remote'): encodes by sending the texts
+    over the server's Unix socket, so web workers never load the model themselves.
+
+    Vectors are tagged with the name of the server's encoder (TASK_EMBEDDING_SERVER_ENCODER),
+    which is checked against the server when the client first connects. Each thread keeps its
+    own connection, reopened after a fork and retried once if the server restarted.
+    """
+    def __init__(self, path=None, timeout=None):
+        """
+        :param path: Socket path of the server (default TASK_EMBEDDING_SERVER_SOCKET).
+        :param timeout: Seconds to wait for a response (default TASK_EMBEDDING_SERVER_TIMEOUT).
+        """
+        self.path = path or getattr(settings, 'TASK_EMBEDDING_SERVER_SOCKET', 'embedding.sock')
+        self.timeout = timeout or getattr(settings, 'TASK_EMBEDDING_SERVER_TIMEOUT', 30.0)
+        self.source = f'unix:{self.path}'
+        # Instantiating an encoder does not load its model, so the name is known without the server
+        self.name = create_encoder(getattr(settings, 'TASK_EMBEDDING_SERVER_ENCODER', 'sentence-transformers')).name
+        self._info = None
+        self._local = threading.local()
+
+    @property
+    def loaded(self):
+        return self._info is not None
+
+    def load(self):
+        if self._info is None:
+            info, _ = self.request({'op': 'info'})
+            if info['name'] != self.name:
+                raise AppException(f"Embedding server at {self.path} encodes with '{info['name']}', "
+                                   f"expected '{self.name}' (TASK_EMBEDDING_SERVER_ENCODER).")
+            self._info = info
+            logger.info(f"Connected to embedding server at {self.path} (pid {info['pid']}, {info['name']})")
+        return self
+
+    @property
+    def dim(self):
+        return self.load()._info['dim']
+
+    def info(self):
+        """
+        The server's encoder, pid and batching statistics.
+        """
+        return self.request({'op': 'info'})[0]
+
+    def connection(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None and self._local.pid == os.getpid():
+            return sock
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.path)
+        self._local.sock, self._local.pid = sock, os.getpid()
+        return sock
+
+    def disconnect(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None and self._local.pid == os.getpid():
+            sock.close()
+        self._local.sock = None
+
+    def request(self, header):
+        for attempt in range(2):
+            try:
+                sock = self.connection()
+                send_message(sock, header)
+                message = recv_message(sock)
+                if message is None:
+                    raise ConnectionError("Connection closed by the embedding server.")
+                break
+            except socket.timeout as e:
+                self.disconnect()
+                raise AppException(f"Embedding server at {self.path} did not answer within {self.timeout}s.") from e
+            except (ConnectionError, OSError) as e:
+                self.disconnect()
+                # A kept-alive connection may predate a server restart: reconnect once
+                if attempt:
+                    raise AppException(f"Embedding server at {self.path} is unavailable: {e}") from e
+        response, payload = message
+        if 'error' in response:
+            raise AppException(f"Embedding server error: {response['error']}")
+        return response, payload
+
+    def encode(self, texts):
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, self.dim), dtype=np.float32)
+        response, payload = self.request({'op': 'encode', 'texts': texts})
+        return np.frombuffer(payload, dtype='<f4').reshape(response['shape']).astype(np.float32)
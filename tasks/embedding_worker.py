@@ -0,0 +1,123 @@
+from .logger import setup_logger
+from .embeddings import encode_texts
+from .index import apply_task_changes
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+import threading
+
+logger = setup_logger(__name__)
+worker = None
+_worker_lock = threading.Lock()
+
+
+def process_pending_embeddings(batch_size=None, max_batches=None):
+    """
+    Generate vector representations for tasks marked as pending, in batches.
+
+    Each batch is embedded with a single encode call. A vector is only written back
+    if the task's title and description are unchanged since the batch was read, so a
+    concurrent edit is never overwritten by a vector of its old text; the edited task
+    stays pending and is picked up by a later batch.
+
+    :param batch_size: Number of tasks embedded per encode call (TASK_EMBEDDING_BATCH_SIZE).
+    :param max_batches: Stop after this many batches; None drains the queue.
+    :return: Number of tasks whose vector was written.
+    """
+    from .models import Task
+
+    batch_size = batch_size or getattr(settings, 'TASK_EMBEDDING_BATCH_SIZE', 64)
+    processed = 0
+    batches = 0
+    last_id = 0
+
+    while max_batches is None or batches < max_batches:
+        batch = list(Task.objects.filter(embedding_pending=True, id__gt=last_id)
+                     .order_by('id').only('id', 'title', 'description', 'owner', 'status', 'deadline')[:batch_size])
+        if not batch:
+            break
+        batches += 1
+        last_id = batch[-1].id
+
+        vectors = encode_texts([task.embedding_text for task in batch])
+        written = []
+        with transaction.atomic():
+            for task, vector in zip(batch, vectors):
+                task.vector_representation = vector
+                task.embedding_pending = False
+                updated = Task.objects.filter(
+                    pk=task.pk, title=task.title, description=task.description
+                ).update(vector_blob=task.vector_blob, vector_norm=task.vector_norm,
+                         vector_dtype=task.vector_dtype, vector_model=task.vector_model,
+                         embedding_pending=False, updated_at=timezone.now())
+                if updated:
+                    written.append(task)
+
+        if written:
+            apply_task_changes(saved=written, owner_ids=[task.owner_id for task in written])
+
+        processed += len(written)
+        logger.info(f"Embedded {len(written)} of {len(batch)} pending tasks")
+
+    return processed
+
+
+class EmbeddingWorker:
+    """
+    Background thread that drains pending embeddings inside a web process.
+
+    It sleeps until woken by a committed task save (or until the poll interval
+    elapses, to pick up tasks saved by other processes) and then embeds every
+    pending task in batches.
+    """
+    def __init__(self, batch_size=None, poll_interval=None):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval or getattr(settings, 'TASK_EMBEDDING_POLL_INTERVAL', 5.0)
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='task-embedding-worker', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def wake(self):
+        self._wakeup.set()
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                break
+            try:
+                close_old_connections()
+                process_pending_embeddings(self.batch_size)
+            except Exception as e:
+                logger.error(f"Error processing pending embeddings: {e}")
+            finally:
+                connection.close()
+
+
+def wake_embedding_worker():
+    """
+    Wake the in-process embedding worker, starting it on first use.
+    Does nothing unless TASK_EMBEDDING_WORKER is 'thread'; with 'command' the
+    pending tasks are drained by `manage.py process_embeddings` instead.
+    """
+    global worker
+
+    if getattr(settings, 'TASK_EMBEDDING_WORKER', 'thread') != 'thread':
+        return
+
+    if worker is None:
+        with _worker_lock:
+            if worker is None:
+                worker = EmbeddingWorker()
+                worker.start()
+
+    worker.wake()
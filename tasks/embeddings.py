@@ -0,0 +1,197 @@
+from .logger import setup_logger
+from .exception import AppException
+from .batching import get_encode_batcher
+from .metrics import ENCODE_BATCH_SIZE, ENCODE_SECONDS
+from .utils import get_model, get_model_name
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+import hashlib
+import threading
+import numpy as np
+
+logger = setup_logger(__name__)
+embedding_cache = None
+
+
+class EmbeddingCache:
+    """
+    Bounded cache of text embeddings keyed by a hash of the model name and text.
+
+    Lookups go to an in-process LRU tier first and then to an optional persistent
+    tier backed by a Django cache (for example a database cache table shared by
+    all workers). Persistent hits are promoted into the LRU tier.
+    """
+    def __init__(self, maxsize=10000, cache_alias=None, timeout=None):
+        """
+        :param maxsize: Maximum number of embeddings held in the in-process tier. 0 disables it.
+        :param cache_alias: Alias in settings.CACHES used as the persistent tier, or None.
+        :param timeout: Expiry in seconds for persistent entries; None keeps them until evicted.
+        """
+        self.maxsize = max(int(maxsize), 0)
+        self.cache_alias = cache_alias
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.persistent_hits = 0
+
+    @staticmethod
+    def make_key(model_name, text):
+        """
+        Builds the cache key for a text embedded by the given model.
+        """
+        digest = hashlib.sha256(f"{model_name}\0{text}".encode('utf-8')).hexdigest()
+        return f"embedding:{digest}"
+
+    @property
+    def persistent(self):
+        return caches[self.cache_alias] if self.cache_alias else None
+
+    def get_many(self, keys):
+        """
+        Look up several keys at once.
+
+        :param keys: Iterable of cache keys.
+        :return: Dict mapping each found key to its float32 vector.
+        """
+        keys = list(keys)
+        found = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                vector = self._entries.get(key)
+                if vector is None:
+                    missing.append(key)
+                else:
+                    self._entries.move_to_end(key)
+                    found[key] = vector
+
+        stored = {}
+        if missing and self.persistent is not None:
+            try:
+                stored = self.persistent.get_many(missing)
+            except Exception as e:
+                logger.error(f"Error reading embeddings from cache '{self.cache_alias}': {e}")
+            for key, blob in stored.items():
+                vector = np.frombuffer(blob, dtype=np.float32)
+                found[key] = vector
+                self._remember(key, vector)
+
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+            self.persistent_hits += len(stored)
+        return found
+
+    def set_many(self, vectors):
+        """
+        Store several embeddings in both tiers.
+
+        :param vectors: Dict mapping cache keys to vectors.
+        """
+        arrays = {}
+        for key, vector in vectors.items():
+            array = np.ascontiguousarray(vector, dtype=np.float32)
+            array.flags.writeable = False
+            arrays[key] = array
+            self._remember(key, array)
+
+        if arrays and self.persistent is not None:
+            try:
+                self.persistent.set_many({key: array.tobytes() for key, array in arrays.items()}, self.timeout)
+            except Exception as e:
+                logger.error(f"Error writing embeddings to cache '{self.cache_alias}': {e}")
+
+    def _remember(self, key, vector):
+        if self.maxsize == 0:
+            return
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = self.persistent_hits = 0
+
+    def stats(self):
+        """
+        Returns the hit/miss/eviction counters and the current in-process size.
+        """
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'persistent_hits': self.persistent_hits,
+        }
+
+
+def get_embedding_cache():
+    """
+    Returns the process-wide embedding cache configured from settings.
+    """
+    global embedding_cache
+
+    if embedding_cache is None:
+        embedding_cache = EmbeddingCache(
+            maxsize=getattr(settings, 'TASK_EMBEDDING_CACHE_SIZE', 10000),
+            cache_alias=getattr(settings, 'TASK_EMBEDDING_CACHE_ALIAS', None),
+            timeout=getattr(settings, 'TASK_EMBEDDING_CACHE_TIMEOUT', None),
+        )
+
+    return embedding_cache
+
+
+def encode_texts(texts, kind='document'):
+    """
+    Embed a list of texts, serving repeated texts from the embedding cache.
+    All cache misses are encoded together in a single batched model call; small
+    requests are coalesced with concurrent ones by the encode batcher.
+
+    :param texts: List of strings.
+    :param kind: 'document' (task texts) or 'query' (search queries), to tell them apart in the metrics.
+    :return: float32 NumPy array of shape (len(texts), dim).
+    """
+    cache = get_embedding_cache()
+    model_name = get_model_name()
+    keys = [cache.make_key(model_name, text) for text in texts]
+    found = cache.get_many(keys)
+
+    missing = list(OrderedDict.fromkeys(key for key in keys if key not in found))
+    if missing:
+        text_by_key = dict(zip(keys, texts))
+        batcher = get_encode_batcher()
+        ENCODE_BATCH_SIZE.observe(len(missing), kind=kind)
+        try:
+            with ENCODE_SECONDS.time(kind=kind):
+                if batcher is not None and len(missing) < batcher.max_batch_size:
+                    encoded = batcher.encode([text_by_key[key] for key in missing])
+                else:
+                    encoded = get_model().encode([text_by_key[key] for key in missing])
+        except Exception as e:
+            logger.error(f"Error encoding {len(missing)} texts: {e}")
+            raise AppException(str(e)) from e
+        new_vectors = dict(zip(missing, np.asarray(encoded, dtype=np.float32)))
+        cache.set_many(new_vectors)
+        found.update(new_vectors)
+
+    if not keys:
+        return np.empty((0, 0), dtype=np.float32)
+    return np.stack([found[key] for key in keys])
+
+
+def encode_text(text, kind='document'):
+    """
+    Embed a single text through the embedding cache.
+
+    :return: float32 NumPy array of shape (dim,).
+    """
+    return encode_texts([text], kind)[0]
@@ -0,0 +1,203 @@
+from .logger import setup_logger
+from .exception import AppException
+from django.conf import settings
+from django.utils.module_loading import import_string
+import hashlib
+import math
+import re
+import threading
+import time
+import numpy as np
+
+logger = setup_logger(__name__)
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+class Encoder:
+    """
+    Interface of the text encoders that produce task and query vectors.
+
+    Subclasses set `name`, which tags every stored vector (Task.vector_model) and keys the
+    embedding and search caches, and implement `encode` and `dim`.
+    """
+    name = None
+
+    @property
+    def dim(self):
+        raise NotImplementedError
+
+    @property
+    def loaded(self):
+        """
+        Whether the encoder is ready to encode without loading anything first.
+        """
+        return True
+
+    def load(self):
+        """
+        Load whatever the encoder needs (e.g. model weights) and return it.
+        """
+        return self
+
+    def encode(self, texts):
+        """
+        Encode a batch of texts.
+
+        :param texts: List of strings.
+        :return: float32 NumPy array of shape (len(texts), dim).
+        """
+        raise NotImplementedError
+
+    def get_sentence_embedding_dimension(self):
+        # Same accessor as a SentenceTransformer
+        return self.dim
+
+
+class SentenceTransformerEncoder(Encoder):
+    """
+    The sentence-transformers model TASK_EMBEDDING_MODEL, loaded from TASK_EMBEDDING_MODEL_PATH
+    if configured. sentence-transformers (and torch) are only imported when the model is loaded,
+    so processes that never encode text do not pay for them.
+    """
+    def __init__(self, model_name=None, path=None):
+        """
+        :param model_name: Name of the model on the Hugging Face hub (default TASK_EMBEDDING_MODEL).
+        :param path: Local directory to load it from without network access (TASK_EMBEDDING_MODEL_PATH).
+        """
+        self.name = model_name or getattr(settings, 'TASK_EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+        self.source = path or getattr(settings, 'TASK_EMBEDDING_MODEL_PATH', '') or self.name
+        self.model = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self.model is not None
+
+    def load(self):
+        if self.model is None:
+            with self._lock:
+                if self.model is None:
+                    try:
+                        from sentence_transformers import SentenceTransformer
+
+                        started = time.monotonic()
+                        self.model = SentenceTransformer(self.source, local_files_only=self.source != self.name)
+                        logger.info(f"Loaded SentenceTransformer model from {self.source} "
+                                    f"in {time.monotonic() - started:.1f}s")
+                    except Exception as e:
+                        logger.error(f"Error initializing SentenceTransformer model: {e}")
+                        raise AppException("Failed to load SentenceTransformer model.") from e
+        return self
+
+    @property
+    def dim(self):
+        return self.load().model.get_sentence_embedding_dimension()
+
+    def encode(self, texts):
+        return np.asarray(self.load().model.encode(list(texts)), dtype=np.float32)
+
+
+class HashingEncoder(Encoder):
+    """
+    Cheap bag-of-words vectorizer for CPU-starved deployments: each lowercased word and word
+    bigram of a text is hashed to a signed unit in one of `dim` dimensions (the hashing trick),
+    weighted by its sublinear term frequency 1 + log(tf).
+
+    Texts sharing words get similar vectors, so keyword-like searches work well, at a few
+    microseconds per text and without downloading anything; it does not capture synonyms
+    or paraphrases like a sentence-transformers model. Deterministic, so it also serves to
+    benchmark and test the code around the model.
+    """
+    def __init__(self, dim=None):
+        """
+        :param dim: Vector dimension (default TASK_ENCODER_DIM).
+        """
+        self._dim = dim or getattr(settings, 'TASK_ENCODER_DIM', 384)
+        self.name = f'hashing-{self._dim}'
+
+    @property
+    def dim(self):
+        return self._dim
+
+    def encode_one(self, text):
+        tokens = TOKEN_RE.findall(text.lower())
+        counts = {}
+        for feature in tokens + [f'{a} {b}' for a, b in zip(tokens, tokens[1:])]:
+            counts[feature] = counts.get(feature, 0) + 1
+        vector = np.zeros(self._dim, dtype=np.float32)
+        for feature, count in counts.items():
+            digest = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+            weight = 1.0 + math.log(count)
+            vector[digest % self._dim] += weight if digest >> 63 else -weight
+        return vector
+
+    def encode(self, texts):
+        if isinstance(texts, str):
+            raise TypeError("Encoder.encode takes a list of texts, not a single string.")
+        texts = list(texts)
+        vectors = np.zeros((len(texts), self._dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            vectors[row] = self.encode_one(text)
+        return vectors
+
+
+class DeterministicEncoder(Encoder):
+    """
+    Test encoder: every distinct text gets a fixed pseudo-random unit vector seeded by its hash.
+    Equal texts always get equal vectors and different texts nearly orthogonal ones, so tests
+    can assert exact matches and scores without any model.
+    """
+    def __init__(self, dim=None):
+        """
+        :param dim: Vector dimension (default TASK_ENCODER_DIM).
+        """
+        self._dim = dim or getattr(settings, 'TASK_ENCODER_DIM', 384)
+        self.name = f'deterministic-{self._dim}'
+
+    @property
+    def dim(self):
+        return self._dim
+
+    def encode(self, texts):
+        vectors = np.zeros((len(texts), self._dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+            vector = np.random.default_rng(seed).standard_normal(self._dim)
+            vectors[row] = vector / np.linalg.norm(vector)
+        return vectors
+
+
+# Encoders selectable with TASK_ENCODER; a dotted path to an Encoder subclass also works
+ENCODERS = {
+    'sentence-transformers': SentenceTransformerEncoder,
+    'hashing': HashingEncoder,
+    'deterministic': DeterministicEncoder,
+    # Client of the shared embedding server (python manage.py embedding_server)
+    'remote': 'tasks.embedding_server.RemoteEncoder',
+}
+
+
+def register_encoder(name, encoder_class):
+    """
+    Make an Encoder subclass, or the dotted path to one, selectable as TASK_ENCODER = name.
+    """
+    ENCODERS[name] = encoder_class
+
+
+def create_encoder(name=None):
+    """
+    Instantiate the encoder configured by TASK_ENCODER. Model weights are not loaded until first use.
+    """
+    name = name or getattr(settings, 'TASK_ENCODER', 'sentence-transformers')
+    if name in ENCODERS:
+        encoder_class = ENCODERS[name]
+        if isinstance(encoder_class, str):
+            encoder_class = import_string(encoder_class)
+    else:
+        try:
+            encoder_class = import_string(name)
+        except ImportError as e:
+            raise AppException(f"Unknown encoder '{name}'; expected one of {', '.join(ENCODERS)} "
+                               f"or a dotted path to an Encoder class.") from e
+    return encoder_class()
@@ -23,8 +23,14 @@ class AppException(Exception):
         :return: A formatted error message string.
         """
         exc_type, _, exc_tb = sys.exc_info()
-        file_name = exc_tb.tb_frame.f_code.co_filename
-        line_number = exc_tb.tb_lineno
+        if exc_tb is not None:
+            file_name = exc_tb.tb_frame.f_code.co_filename
+            line_number = exc_tb.tb_lineno
+        else:
+            # Raised outside an except block: report the frame that raised it.
+            frame = sys._getframe(2)
+            file_name = frame.f_code.co_filename
+            line_number = frame.f_lineno
         error_type = exc_type.__name__ if exc_type else 'UnknownError'
 
         formatted_message = (
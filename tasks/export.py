@@ -0,0 +1,178 @@
+from .index import current_vectors
+from .models import Task
+from .utils import get_model_name, unpack_vector
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Max
+from datetime import timedelta
+import base64
+import itertools
+import json
+import numpy as np
+
+# How vectors are written in NDJSON exports: left out, as the API's list of floats, or as the
+# stored normalized vector packed in base64 with its dtype and norm (the fastest to write and parse)
+VECTOR_FORMATS = ('none', 'list', 'base64')
+
+VECTOR_FILE_FORMAT = 'task-vectors'
+VECTOR_FILE_VERSION = 1
+
+COLUMNS = ['id', 'title', 'description', 'status', 'deadline', 'owner_id', 'vector_model', 'embedding_pending',
+           'updated_at']
+VECTOR_COLUMNS = ['vector_blob', 'vector_norm', 'vector_dtype']
+
+JSON_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+def format_datetime(value):
+    # Same representation as the API's DateTimeFields
+    value = value.isoformat()
+    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+
+async def iterate_async(chunks):
+    """
+    Iterate a chunk generator for a StreamingHttpResponse served under ASGI, where Django would
+    otherwise consume a synchronous iterator completely before sending any of it. Each chunk is
+    produced in the request's thread-sensitive sync thread, which owns the export's database cursor.
+    """
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    while (chunk := await next_chunk(chunks, None)) is not None:
+        yield chunk
+
+
+def vector_record_dtype(dim):
+    """
+    NumPy dtype of one record of a vector file: the task id and its normalized float32 vector.
+    """
+    return np.dtype([('id', '<i8'), ('vector', '<f4', (dim,))])
+
+
+def read_vector_file(data):
+    """
+    Parse a vector file written by TaskExport.vector_file.
+
+    :param data: The file's content as bytes.
+    :return: Tuple of (header dict, int64 array of task ids, float32 array of shape (n, dim)).
+    """
+    header_line, _, body = data.partition(b'\n')
+    header = json.loads(header_line)
+    if header.get('format') != VECTOR_FILE_FORMAT:
+        raise ValueError("Not a task vector file.")
+    records = np.frombuffer(body, dtype=vector_record_dtype(header['dim']))
+    return header, records['id'], records['vector']
+
+
+class TaskExport:
+    """
+    Streams tasks in (updated_at, id) order as NDJSON or as a binary vector file, reading the
+    table with a chunked iterator over values() rows, so memory stays constant however many
+    tasks are exported and no model instance or DRF serializer is built per row.
+
+    The export covers the tasks written after `since` and up to `until`, the time of the latest
+    write when the export started. Passing `until` as the next export's `since` exports what
+    changed in between; tasks written while an export runs are left to the next one.
+    Deleted tasks are not reported.
+
+    updated_at is set when a task is saved, not when its transaction commits, so a write may
+    become visible after an export whose `until` is already past its time. Incremental exports
+    therefore reach back `overlap` before `since`, and may repeat tasks exported before: consumers
+    should upsert by id, keeping the record with the latest updated_at.
+    """
+    def __init__(self, since=None, owner_id=None, vectors='none', chunk_size=None, overlap=None):
+        """
+        :param since: Only export tasks written after this datetime, less the overlap.
+        :param owner_id: Only export the tasks of this user.
+        :param vectors: One of VECTOR_FORMATS, for NDJSON exports.
+        :param chunk_size: Rows fetched from the database at a time (default TASK_EXPORT_CHUNK_SIZE).
+        :param overlap: Seconds an incremental export reaches back before since (default TASK_EXPORT_SINCE_OVERLAP).
+        """
+        self.since = since
+        self.owner_id = owner_id
+        self.vectors = vectors
+        self.chunk_size = chunk_size or getattr(settings, 'TASK_EXPORT_CHUNK_SIZE', 2000)
+        self.overlap = timedelta(seconds=getattr(settings, 'TASK_EXPORT_SINCE_OVERLAP', 60.0) if overlap is None
+                                 else overlap)
+        self.until = self.filtered(Task.objects.all()).aggregate(until=Max('updated_at'))['until']
+        if self.until is not None and since is not None:
+            # Tasks repeated from the overlap must not move the watermark backwards
+            self.until = max(self.until, since)
+        self.rows = 0
+
+    def filtered(self, queryset):
+        if self.since is not None:
+            queryset = queryset.filter(updated_at__gt=self.since - self.overlap)
+        if self.owner_id is not None:
+            queryset = queryset.filter(owner_id=self.owner_id)
+        return queryset
+
+    def queryset(self):
+        if self.until is None:
+            return Task.objects.none()
+        # Served by the (updated_at, id) index
+        return self.filtered(Task.objects.filter(updated_at__lte=self.until)).order_by('updated_at', 'id')
+
+    def ndjson(self):
+        """
+        Yield the tasks as newline-delimited JSON objects with the API's field names, a chunk of lines at a time.
+        """
+        columns = COLUMNS + (VECTOR_COLUMNS if self.vectors != 'none' else [])
+        rows = self.queryset().values_list(*columns).iterator(chunk_size=self.chunk_size)
+        encode = JSON_ENCODER.encode
+        lines = []
+        for task_id, title, description, status, deadline, owner_id, vector_model, pending, updated_at, *vector \
+                in rows:
+            record = {'id': task_id, 'title': title, 'description': description, 'status': status,
+                      'deadline': format_datetime(deadline), 'owner': owner_id, 'vector_model': vector_model,
+                      'embedding_pending': pending, 'updated_at': format_datetime(updated_at)}
+            if vector:
+                blob, norm, dtype = vector
+                if self.vectors == 'list':
+                    record['vector_representation'] = None if blob is None else \
+                        (unpack_vector(bytes(blob), dtype) * norm).tolist()
+                elif blob is not None:
+                    record.update(vector_blob=base64.b64encode(blob).decode('ascii'), vector_norm=norm,
+                                  vector_dtype=dtype)
+                else:
+                    record.update(vector_blob=None, vector_norm=None, vector_dtype=None)
+            lines.append(encode(record))
+            if len(lines) >= self.chunk_size:
+                yield self.flush(lines)
+                lines = []
+        if lines:
+            yield self.flush(lines)
+
+    def flush(self, lines):
+        self.rows += len(lines)
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+
+    def vector_file(self):
+        """
+        Yield a binary vector file: a JSON header line (format, version, encoder, dim, until),
+        then one fixed-size little-endian record per task (int64 id, float32[dim] normalized
+        vector), for building an index offline; see read_vector_file. Only vectors of the
+        configured encoder are exported.
+        """
+        rows = current_vectors(self.queryset()).values_list('id', 'vector_blob', 'vector_dtype') \
+            .iterator(chunk_size=self.chunk_size)
+        header = {'format': VECTOR_FILE_FORMAT, 'version': VECTOR_FILE_VERSION, 'model': get_model_name(),
+                  'until': format_datetime(self.until) if self.until else None}
+        first = next(rows, None)
+        header['dim'] = 0 if first is None else len(unpack_vector(bytes(first[1]), first[2]))
+        yield (json.dumps(header) + '\n').encode('utf-8')
+        if first is None:
+            return
+
+        record_dtype = vector_record_dtype(header['dim'])
+        records = np.empty(self.chunk_size, dtype=record_dtype)
+        count = 0
+        for task_id, blob, dtype in itertools.chain([first], rows):
+            records[count] = (task_id, unpack_vector(bytes(blob), dtype))
+            count += 1
+            if count == self.chunk_size:
+                self.rows += count
+                yield records.tobytes()
+                count = 0
+        if count:
+            self.rows += count
+            yield records[:count].tobytes()
@@ -0,0 +1,884 @@
+from .logger import setup_logger
+from .exception import AppException
+from .metrics import DB_FETCH_SECONDS, SIMILARITY_SECONDS
+from .utils import normalize_vector, unpack_vector
+from .quantization import ScalarQuantizer, ProductQuantizer, assign, kmeans
+from .search_cache import bump_tasks_version, get_search_cache
+from django.conf import settings
+from collections import namedtuple
+import itertools
+import os
+import threading
+import numpy as np
+
+logger = setup_logger(__name__)
+index = None
+# Shared tasks version (see search_cache.bump_tasks_version) the process-wide index is up to date with
+index_version = None
+_index_lock = threading.Lock()
+
+# Filterable attributes of an indexed task: owner id, status code and deadline as a POSIX timestamp
+TaskMeta = namedtuple('TaskMeta', ['owner_id', 'status', 'deadline'])
+UNKNOWN_META = TaskMeta(-1, -1, float('nan'))
+_status_codes = None
+
+
+def status_code(status):
+    """
+    Small integer code of a Task.status value, by its position in Task.STATUS_CHOICES; -1 if unknown.
+    """
+    global _status_codes
+
+    if _status_codes is None:
+        from .models import Task
+        _status_codes = {value: code for code, (value, _) in enumerate(Task.STATUS_CHOICES)}
+    return _status_codes.get(status, -1)
+
+
+def task_meta(task):
+    """
+    The TaskMeta of a Task instance.
+    """
+    return TaskMeta(task.owner_id if task.owner_id is not None else -1, status_code(task.status),
+                    task.deadline.timestamp() if task.deadline is not None else float('nan'))
+
+
+def to_timestamp(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return value.timestamp()
+
+
+class SearchFilter:
+    """
+    Restricts a search to the tasks of one owner, with one of the given statuses and a
+    deadline within [deadline_after, deadline_before]. Unset criteria match every task.
+    """
+    def __init__(self, owner_id=None, statuses=None, deadline_after=None, deadline_before=None):
+        """
+        :param owner_id: Primary key of the owning user.
+        :param statuses: Task.status values to keep.
+        :param deadline_after: Earliest deadline, as a datetime or timestamp.
+        :param deadline_before: Latest deadline, as a datetime or timestamp.
+        """
+        self.owner_id = owner_id
+        self.status_values = list(statuses) if statuses else None
+        self.status_codes = None if not statuses else np.array([status_code(value) for value in statuses],
+                                                                dtype=np.int8)
+        self.deadline_after = to_timestamp(deadline_after)
+        self.deadline_before = to_timestamp(deadline_before)
+
+    def __bool__(self):
+        return any(value is not None for value in (self.owner_id, self.status_codes, self.deadline_after,
+                                                   self.deadline_before))
+
+    @property
+    def has_deadline(self):
+        return self.deadline_after is not None or self.deadline_before is not None
+
+    def mask(self, owners, statuses, deadlines):
+        """
+        Boolean mask of the rows, given by their metadata arrays, that match every criterion.
+        """
+        keep = np.ones(len(owners), dtype=bool)
+        if self.owner_id is not None:
+            keep &= owners == self.owner_id
+        if self.status_codes is not None:
+            keep &= np.isin(statuses, self.status_codes)
+        # NaN deadlines (unknown) fail both comparisons
+        if self.deadline_after is not None:
+            keep &= deadlines >= self.deadline_after
+        if self.deadline_before is not None:
+            keep &= deadlines <= self.deadline_before
+        return keep
+
+
+class VectorIndex:
+    """
+    In-memory similarity index over task vectors.
+
+    Vectors are stored L2-normalized in a contiguous float32 matrix next to an
+    array of task ids, so scoring every task against a query is a single
+    matrix-vector product. Rows are added, replaced and removed in place as
+    tasks change; removal moves the last row into the freed slot so the
+    matrix stays dense.
+
+    Each row also carries its task's owner, status and deadline. The rows of each
+    owner are tracked in a partition, so a search filtered by owner only scores
+    that owner's rows; status and deadline filters are boolean masks over the
+    candidate rows, applied before scoring.
+    """
+    name = 'exact'
+
+    def __init__(self, dim=None, capacity=1024):
+        """
+        :param dim: Dimensionality of the vectors. Inferred from the first vector when None.
+        :param capacity: Number of rows to preallocate.
+        """
+        self.dim = dim
+        self._lock = threading.RLock()
+        self._capacity = max(int(capacity), 1)
+        self._size = 0
+        self._ids = np.empty(self._capacity, dtype=np.int64)
+        self._owners = np.empty(self._capacity, dtype=np.int64)
+        self._statuses = np.empty(self._capacity, dtype=np.int8)
+        self._deadlines = np.empty(self._capacity, dtype=np.float64)
+        self._data = None
+        self._rows = {}
+        self._owner_rows = {}
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, task_id):
+        return task_id in self._rows
+
+    def _row_layout(self):
+        """
+        Shape and dtype of one stored row.
+        """
+        return (self.dim,), np.float32
+
+    def _encode(self, normalized):
+        """
+        Convert a matrix of normalized vectors into stored rows.
+        """
+        return normalized
+
+    def _scores(self, query, rows=None):
+        """
+        Cosine similarity of the query with the given rows, or with every stored row.
+        """
+        if rows is None:
+            return self._data[:self._size] @ query
+        return self._data[rows] @ query
+
+    def _ensure_capacity(self, required):
+        """
+        Grow the id array and row matrix geometrically so appends are amortized O(1).
+        """
+        shape, dtype = self._row_layout()
+        if self._data is None:
+            self._data = np.empty((self._capacity, *shape), dtype=dtype)
+        if required <= self._capacity:
+            return
+        capacity = self._capacity
+        while capacity < required:
+            capacity *= 2
+        for name in ('_ids', '_owners', '_statuses', '_deadlines', '_data'):
+            current = getattr(self, name)
+            grown = np.empty((capacity, *current.shape[1:]), dtype=current.dtype)
+            grown[:self._size] = current[:self._size]
+            setattr(self, name, grown)
+        self._capacity = capacity
+
+    def upsert(self, task_id, vector, meta=None):
+        """
+        Insert or replace the vector of a task. A missing or zero vector removes the task.
+
+        :param task_id: Primary key of the task.
+        :param vector: Sequence of floats or NumPy array.
+        :param meta: TaskMeta used by search filters; tasks without one never match a filter.
+        """
+        self.upsert_many([task_id], [vector], None if meta is None else [meta])
+
+    def upsert_many(self, task_ids, vectors, metas=None):
+        """
+        Insert or replace the vectors of several tasks, encoding them as one batch.
+        Tasks with a missing or zero vector are removed.
+
+        :param task_ids: Primary keys of the tasks.
+        :param vectors: Vectors aligned with task_ids.
+        :param metas: TaskMeta of each task, or None.
+        """
+        pending = []
+        for task_id, vector, meta in zip(task_ids, vectors, metas or itertools.repeat(UNKNOWN_META)):
+            normalized = normalize_vector(vector)
+            if normalized is None:
+                self.remove(task_id)
+            else:
+                pending.append((task_id, normalized, meta))
+        if not pending:
+            return
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = pending[0][1].shape[0]
+            for task_id, normalized, _ in pending:
+                if normalized.shape[0] != self.dim:
+                    raise AppException(f"Vector for task {task_id} has dimension {normalized.shape[0]}, "
+                                       f"expected {self.dim}.")
+
+            encoded = self._encode(np.stack([normalized for _, normalized, _ in pending]))
+            self._ensure_capacity(self._size + len(pending))
+            for (task_id, _, meta), row_data in zip(pending, encoded):
+                row = self._rows.get(task_id)
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._ids[row] = task_id
+                    self._rows[task_id] = row
+                else:
+                    self._owner_rows[int(self._owners[row])].discard(row)
+                self._data[row] = row_data
+                self._set_meta(row, meta)
+
+    def _set_meta(self, row, meta):
+        self._owners[row], self._statuses[row], self._deadlines[row] = meta
+        self._owner_rows.setdefault(int(meta.owner_id), set()).add(row)
+
+    def remove(self, task_id):
+        """
+        Remove a task from the index. Unknown ids are ignored.
+        """
+        with self._lock:
+            row = self._rows.pop(task_id, None)
+            if row is None:
+                return
+            self._owner_rows[int(self._owners[row])].discard(row)
+            last = self._size - 1
+            if row != last:
+                moved_id = int(self._ids[last])
+                self._ids[row] = moved_id
+                self._data[row] = self._data[last]
+                self._rows[moved_id] = row
+                self._owner_rows[int(self._owners[last])].discard(last)
+                self._set_meta(row, TaskMeta(self._owners[last], self._statuses[last], self._deadlines[last]))
+            self._size = last
+
+    def clear(self):
+        with self._lock:
+            self._size = 0
+            self._rows.clear()
+            self._owner_rows.clear()
+
+    def memory_bytes(self):
+        """
+        Bytes held by the ids, metadata and stored rows, excluding unused preallocated capacity.
+        """
+        if self._data is None:
+            return 0
+        row_bytes = self._ids.itemsize + self._owners.itemsize + self._statuses.itemsize + self._deadlines.itemsize
+        return self._size * (row_bytes + self._data[0].nbytes)
+
+    def _candidate_rows(self, filters):
+        """
+        Rows matching a search filter, or None to scan every row. An owner filter only
+        visits that owner's partition; the other criteria are masks over the candidates.
+        """
+        if not filters:
+            return None
+        if filters.owner_id is not None:
+            rows = np.fromiter(self._owner_rows.get(filters.owner_id, ()), dtype=np.int64)
+            rows.sort()
+        else:
+            rows = np.arange(self._size)
+        return rows[filters.mask(self._owners[rows], self._statuses[rows], self._deadlines[rows])]
+
+    def _filtered_scores(self, query, filters):
+        """
+        Scores of the rows matching filters and the task ids of those rows.
+        """
+        rows = self._candidate_rows(filters)
+        if rows is None:
+            return self._scores(query), self._ids[:self._size]
+        return self._scores(query, rows), self._ids[rows]
+
+    def _check_query(self, query_vector):
+        query = normalize_vector(query_vector)
+        if query is not None and self.dim is not None and query.shape[0] != self.dim:
+            raise AppException(f"Query vector has dimension {query.shape[0]}, expected {self.dim}.")
+        return query
+
+    def search(self, query_vector, k=None, min_score=0.5, filters=None):
+        """
+        Find the tasks most similar to a query vector.
+
+        The best k rows are selected with a partial sort (argpartition), so only
+        the returned hits are fully ordered.
+
+        :param query_vector: The query embedding.
+        :param k: Maximum number of hits to return; None returns every match.
+        :param min_score: Tasks must have a cosine similarity above this value.
+        :param filters: Optional SearchFilter; only matching rows are scored.
+        :return: List of (task_id, score) tuples ordered by descending score.
+        """
+        query = self._check_query(query_vector)
+        if query is None or k == 0:
+            return []
+
+        with self._lock:
+            if self._size == 0:
+                return []
+            scores, ids = self._filtered_scores(query, filters)
+            keep = np.flatnonzero(scores > min_score)
+            ids = ids[keep]
+
+        return top_k(ids, scores[keep], k)
+
+
+class QuantizedIndex(VectorIndex):
+    """
+    Vector index that keeps compressed codes in memory instead of float vectors.
+
+    Queries are scored against the codes to pick a shortlist of rerank_factor * k
+    candidates, whose exact vectors are then loaded with exact_lookup and used for
+    the final ranking and the min_score cut-off. The shortlist is capped at
+    rerank_limit (but never below k), so a large k does not turn every query into
+    a fetch of thousands of full-precision vectors. A search with k=None still
+    re-ranks every candidate, as it returns every match.
+    """
+    # Approximate scores may undershoot the exact ones; keep candidates this close to min_score
+    SCORE_MARGIN = 0.05
+
+    def __init__(self, quantizer, exact_lookup=None, rerank_factor=10, rerank_limit=200, capacity=1024):
+        """
+        :param quantizer: A trained ScalarQuantizer or ProductQuantizer.
+        :param exact_lookup: Callable mapping a list of task ids to {task_id: vector}.
+                             Defaults to reading the stored vectors from the database.
+        :param rerank_factor: Shortlist size as a multiple of k.
+        :param rerank_limit: Largest shortlist re-ranked for a given k; None for no limit.
+        :param capacity: Number of rows to preallocate.
+        """
+        super().__init__(dim=quantizer.dim, capacity=capacity)
+        self.quantizer = quantizer
+        self.name = quantizer.name
+        self.exact_lookup = exact_lookup or fetch_exact_vectors
+        self.rerank_factor = max(int(rerank_factor), 1)
+        self.rerank_limit = None if rerank_limit is None else max(int(rerank_limit), 1)
+
+    def shortlist_size(self, k):
+        """
+        Number of approximate hits whose exact vectors are fetched for a search of k hits; None for all.
+        """
+        if k is None:
+            return None
+        size = k * self.rerank_factor
+        if self.rerank_limit is not None:
+            size = min(size, max(k, self.rerank_limit))
+        return size
+
+    def _row_layout(self):
+        return self.quantizer.code_shape, self.quantizer.code_dtype
+
+    def _encode(self, normalized):
+        return self.quantizer.encode(normalized)
+
+    def _scores(self, query, rows=None):
+        return self.quantizer.scores(self._data[:self._size] if rows is None else self._data[rows], query)
+
+    def memory_bytes(self):
+        return super().memory_bytes() + self.quantizer.memory_bytes()
+
+    def shortlist(self, query_vector, k=None, min_score=0.5, filters=None):
+        """
+        Approximate search over the codes, selecting the hits whose exact vectors search() re-ranks.
+        Does not touch the database, unlike the exact lookup.
+
+        :return: Tuple of (normalized query, list of (task_id, approximate score) tuples).
+        """
+        query = self._check_query(query_vector)
+        if query is None or k == 0:
+            return query, []
+
+        with self._lock:
+            if self._size == 0:
+                return query, []
+            scores, ids = self._filtered_scores(query, filters)
+            keep = np.flatnonzero(scores > min_score - self.SCORE_MARGIN)
+            ids = ids[keep]
+
+        return query, top_k(ids, scores[keep], self.shortlist_size(k))
+
+    def search(self, query_vector, k=None, min_score=0.5, filters=None):
+        """
+        Approximate search over the codes followed by an exact re-rank of the shortlist.
+        Takes the same arguments and returns the same hits as VectorIndex.search.
+        """
+        query, shortlist = self.shortlist(query_vector, k, min_score, filters)
+        if not shortlist:
+            return []
+        return rerank(shortlist, query, self.exact_lookup([task_id for task_id, _ in shortlist]), k, min_score)
+
+
+class IVFIndex:
+    """
+    Inverted-file index for approximate nearest neighbour search.
+
+    Vectors are partitioned into cells by their nearest k-means centroid, and
+    each cell is an exact VectorIndex. A query is compared with the centroids and
+    only the nprobe closest cells are scanned, so the cost of a search grows with
+    nlist + nprobe * N / nlist rather than with N.
+    """
+    name = 'ivf'
+
+    def __init__(self, centroids, nprobe=16):
+        """
+        :param centroids: Array of shape (nlist, dim) from train_ivf_centroids.
+        :param nprobe: Number of closest cells scanned per query.
+        """
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.dim = self.centroids.shape[1]
+        self.nprobe = max(int(nprobe), 1)
+        self._lists = [VectorIndex(dim=self.dim, capacity=16) for _ in range(len(self.centroids))]
+        self._cell_of = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._cell_of)
+
+    def __contains__(self, task_id):
+        return task_id in self._cell_of
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    def upsert(self, task_id, vector, meta=None):
+        self.upsert_many([task_id], [vector], None if meta is None else [meta])
+
+    def upsert_many(self, task_ids, vectors, metas=None):
+        """
+        Assign vectors to their nearest cell and store them there, moving tasks whose cell changed.
+        Tasks with a missing or zero vector are removed.
+        """
+        pending = []
+        for task_id, vector, meta in zip(task_ids, vectors, metas or itertools.repeat(UNKNOWN_META)):
+            normalized = normalize_vector(vector)
+            if normalized is None:
+                self.remove(task_id)
+            else:
+                pending.append((task_id, normalized, meta))
+        if not pending:
+            return
+
+        cells = assign(np.stack([normalized for _, normalized, _ in pending]), self.centroids)
+        with self._lock:
+            by_cell = {}
+            for (task_id, normalized, meta), cell in zip(pending, cells.tolist()):
+                previous = self._cell_of.get(task_id)
+                if previous is not None and previous != cell:
+                    self._lists[previous].remove(task_id)
+                self._cell_of[task_id] = cell
+                by_cell.setdefault(cell, ([], [], []))
+                by_cell[cell][0].append(task_id)
+                by_cell[cell][1].append(normalized)
+                by_cell[cell][2].append(meta)
+            for cell, (cell_ids, cell_vectors, cell_metas) in by_cell.items():
+                self._lists[cell].upsert_many(cell_ids, cell_vectors, cell_metas)
+
+    def remove(self, task_id):
+        with self._lock:
+            cell = self._cell_of.pop(task_id, None)
+            if cell is not None:
+                self._lists[cell].remove(task_id)
+
+    def clear(self):
+        with self._lock:
+            self._cell_of.clear()
+            for cell in self._lists:
+                cell.clear()
+
+    def memory_bytes(self):
+        return self.centroids.nbytes + sum(cell.memory_bytes() for cell in self._lists)
+
+    def search(self, query_vector, k=None, min_score=0.5, filters=None):
+        """
+        Scan the nprobe cells whose centroids are closest to the query, applying filters within each cell.
+        Takes the same arguments and returns the same hits as VectorIndex.search.
+        """
+        query = normalize_vector(query_vector)
+        if query is None or k == 0 or not self._cell_of:
+            return []
+
+        closeness = self.centroids @ query
+        nprobe = min(self.nprobe, self.nlist)
+        probed = np.argpartition(-closeness, nprobe - 1)[:nprobe]
+
+        hits = []
+        for cell in probed:
+            hits.extend(self._lists[cell].search(query, k=k, min_score=min_score, filters=filters))
+        if not hits:
+            return []
+        ids = np.array([task_id for task_id, _ in hits], dtype=np.int64)
+        scores = np.array([score for _, score in hits], dtype=np.float32)
+        return top_k(ids, scores, k)
+
+
+def rerank(shortlist, query, exact, k=None, min_score=0.5):
+    """
+    Re-score a shortlist of approximate hits against the tasks' exact vectors.
+
+    :param shortlist: List of (task_id, approximate score) tuples.
+    :param query: Normalized query vector.
+    :param exact: Mapping of task id to exact vector, from the index's exact_lookup.
+    :return: List of (task_id, score) tuples ordered by descending exact score.
+    """
+    candidates = [(task_id, exact[task_id]) for task_id, _ in shortlist if exact.get(task_id) is not None]
+    if not candidates:
+        return []
+
+    ids = np.array([task_id for task_id, _ in candidates], dtype=np.int64)
+    scores = np.stack([vector for _, vector in candidates]) @ query
+    keep = scores > min_score
+    return top_k(ids[keep], scores[keep], k)
+
+
+def top_k(ids, scores, k=None):
+    """
+    Select the k highest scores with argpartition and order only those.
+
+    :param ids: Array of task ids.
+    :param scores: Array of scores aligned with ids.
+    :param k: Number of hits to keep; None keeps all.
+    :return: List of (task_id, score) tuples ordered by descending score.
+    """
+    if k is not None and k < len(scores):
+        selected = np.argpartition(-scores, k - 1)[:k]
+    else:
+        selected = np.arange(len(scores))
+    order = selected[np.argsort(-scores[selected], kind='stable')]
+    return [(int(ids[i]), float(scores[i])) for i in order]
+
+
+def current_vectors(queryset):
+    """
+    Restrict a task queryset to tasks with a vector produced by the configured encoder; vectors
+    of another model (e.g. before reembed_tasks has run) cannot be compared with its queries.
+    Tasks waiting to be re-embedded are left out too, as their vector is of their previous text.
+    """
+    from .utils import get_model_name
+
+    return queryset.exclude(vector_blob=None).filter(vector_model=get_model_name(), embedding_pending=False)
+
+
+def indexed_vector(task):
+    """
+    The normalized vector a task is indexed under, by the same rule as current_vectors,
+    or None if it is not searchable.
+    """
+    from .utils import get_model_name
+
+    if task.embedding_pending or task.vector_model != get_model_name():
+        return None
+    return task.normalized_vector
+
+
+def fetch_exact_vectors(task_ids):
+    """
+    Load the stored normalized vectors of the given tasks from the database.
+
+    :return: Dict mapping task id to float32 vector.
+    """
+    from .models import Task
+
+    rows = current_vectors(Task.objects.filter(id__in=task_ids)).values_list('id', 'vector_blob', 'vector_dtype')
+    with DB_FETCH_SECONDS.time(operation='exact_vectors'):
+        return {task_id: unpack_vector(bytes(blob), dtype) for task_id, blob, dtype in rows}
+
+
+def iter_task_vectors(chunk_size=2000, limit=None, with_meta=False):
+    """
+    Stream (task_id, normalized vector) pairs for every task with a vector of the configured encoder, in id order.
+    With with_meta, yields (task_id, normalized vector, TaskMeta) triples instead.
+    """
+    from .models import Task
+
+    queryset = current_vectors(Task.objects.all()).order_by('id')
+    if limit is not None:
+        queryset = queryset[:limit]
+    if not with_meta:
+        for task_id, blob, dtype in queryset.values_list('id', 'vector_blob', 'vector_dtype').iterator(
+                chunk_size=chunk_size):
+            yield task_id, unpack_vector(bytes(blob), dtype)
+        return
+    rows = queryset.values_list('id', 'vector_blob', 'vector_dtype', 'owner_id', 'status', 'deadline')
+    for task_id, blob, dtype, owner_id, status, deadline in rows.iterator(chunk_size=chunk_size):
+        yield task_id, unpack_vector(bytes(blob), dtype), TaskMeta(owner_id, status_code(status), deadline.timestamp())
+
+
+def train_quantizer(index_type):
+    """
+    Train the quantizer of a compressed index on up to TASK_INDEX_TRAIN_SIZE stored vectors.
+
+    :param index_type: 'int8' or 'pq'.
+    :return: A trained quantizer, or None if there are no vectors to train on.
+    """
+    sample = sample_task_vectors(getattr(settings, 'TASK_INDEX_TRAIN_SIZE', 50000))
+    if sample is None:
+        return None
+    dim = sample.shape[1]
+
+    if index_type == 'int8':
+        quantizer = ScalarQuantizer(dim)
+    else:
+        quantizer = ProductQuantizer(dim, m=getattr(settings, 'TASK_INDEX_PQ_SUBSPACES', 96))
+    logger.info(f"Training {index_type} quantizer on {len(sample)} vectors")
+    return quantizer.train(sample)
+
+
+def sample_task_vectors(limit):
+    """
+    Stack up to limit stored task vectors (in id order) into a training matrix, or None.
+    """
+    sample = [vector for _, vector in iter_task_vectors(limit=limit)]
+    return np.stack(sample) if sample else None
+
+
+def train_ivf_centroids(nlist=None, sample_size=None, n_iter=20):
+    """
+    Train IVF cell centroids with k-means on stored task vectors.
+
+    :param nlist: Number of cells (TASK_IVF_NLIST); clipped to the number of training vectors.
+    :param sample_size: Number of training vectors (TASK_INDEX_TRAIN_SIZE).
+    :return: Array of shape (nlist, dim), or None if there are no vectors to train on.
+    """
+    nlist = nlist or getattr(settings, 'TASK_IVF_NLIST', 1024)
+    sample = sample_task_vectors(sample_size or getattr(settings, 'TASK_INDEX_TRAIN_SIZE', 50000))
+    if sample is None:
+        return None
+    logger.info(f"Training {nlist} IVF centroids on {len(sample)} vectors")
+    centroids, _ = kmeans(sample, nlist, n_iter=n_iter)
+    return centroids
+
+
+def save_ivf_centroids(centroids, path=None):
+    """
+    Atomically write IVF centroids to TASK_IVF_CENTROIDS_PATH.
+    """
+    path = str(path or settings.TASK_IVF_CENTROIDS_PATH)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, np.asarray(centroids, dtype=np.float32))
+    os.replace(tmp_path, path)
+
+
+def load_ivf_centroids(path=None):
+    """
+    Read IVF centroids saved by the train_ivf command. If none are saved, train provisional ones
+    on a small sample (TASK_IVF_FALLBACK_TRAIN_SIZE vectors, few iterations) rather than the full
+    training set, as this runs while building the index for a request.
+    """
+    path = str(path or getattr(settings, 'TASK_IVF_CENTROIDS_PATH', ''))
+    if path and os.path.exists(path):
+        return np.load(path)
+    sample_size = getattr(settings, 'TASK_IVF_FALLBACK_TRAIN_SIZE', 10000)
+    logger.warning(f"No IVF centroids saved at '{path}'; training provisional centroids on up to {sample_size} "
+                   f"vectors. Run `manage.py train_ivf` to train and save proper ones.")
+    return train_ivf_centroids(sample_size=sample_size, n_iter=5)
+
+
+def write_index_snapshot(path=None):
+    """
+    Write every stored task vector to the memory-mapped index file at TASK_INDEX_PATH,
+    replacing the previous snapshot and its delta log.
+
+    :return: Generation number of the new snapshot.
+    """
+    from .index_store import write_snapshot
+    from .utils import get_model
+
+    path = str(path or settings.TASK_INDEX_PATH)
+    rows = iter_task_vectors(with_meta=True)
+    first = next(rows, None)
+    if first is None:
+        dim = get_model().dim
+        rows = iter(())
+    else:
+        dim = first[1].shape[0]
+        rows = itertools.chain([first], rows)
+    return write_snapshot(path, rows, dim)
+
+
+def open_mmap_index(path=None):
+    """
+    Map the index file at TASK_INDEX_PATH, writing a first snapshot if none exists yet.
+    """
+    from .index_store import MmapIndex
+
+    path = str(path or settings.TASK_INDEX_PATH)
+    if not os.path.exists(path):
+        write_index_snapshot(path)
+    return MmapIndex(path)
+
+
+def build_index(index_type=None):
+    """
+    Build a new index from every task that has a vector representation.
+
+    :param index_type: 'exact', 'int8', 'pq', 'ivf' or 'mmap'. Defaults to TASK_INDEX_TYPE.
+    """
+    index_type = index_type or getattr(settings, 'TASK_INDEX_TYPE', 'exact')
+    if index_type == 'mmap':
+        new_index = open_mmap_index()
+        logger.info(f"Opened mmap vector index with {len(new_index)} tasks from {new_index.path}")
+        return new_index
+
+    new_index = None
+    if index_type == 'ivf':
+        centroids = load_ivf_centroids()
+        if centroids is not None:
+            new_index = IVFIndex(centroids, nprobe=getattr(settings, 'TASK_IVF_NPROBE', 16))
+    elif index_type in ('int8', 'pq'):
+        quantizer = train_quantizer(index_type)
+        if quantizer is not None:
+            new_index = QuantizedIndex(quantizer, rerank_factor=getattr(settings, 'TASK_INDEX_RERANK_FACTOR', 10),
+                                       rerank_limit=getattr(settings, 'TASK_INDEX_RERANK_LIMIT', 200) or None)
+    elif index_type != 'exact':
+        raise AppException(f"Unknown vector index type '{index_type}'.")
+
+    if new_index is None:
+        if index_type != 'exact':
+            logger.warning(f"No task vectors to train the {index_type} index on; using an exact index")
+        new_index = VectorIndex()
+
+    batch = []
+    for item in iter_task_vectors(with_meta=True):
+        batch.append(item)
+        if len(batch) >= 2000:
+            new_index.upsert_many(*zip(*batch))
+            batch = []
+    if batch:
+        new_index.upsert_many(*zip(*batch))
+    logger.info(f"Built {new_index.name} vector index with {len(new_index)} tasks "
+                f"({new_index.memory_bytes() / 2**20:.1f} MiB)")
+    return new_index
+
+
+def shared_tasks_version():
+    """
+    The tasks version every worker bumps when it changes tasks, or None if there is no search
+    cache to hold it. Only shared between processes with a shared cache backend.
+    """
+    cache = get_search_cache()
+    return None if cache is None else cache.get_version()
+
+
+def get_index():
+    """
+    Returns the process-wide vector index, building it from the database on first use.
+
+    When the shared tasks version moved on without this process applying the change (see
+    apply_task_changes), i.e. another worker or a management command wrote tasks, an in-memory
+    index catches up by reloading only the changed tasks recorded with each version, and is
+    rebuilt only if they are not all known. The mmap index replays their changes from its delta
+    log instead.
+    """
+    global index, index_version
+
+    version = None if index is not None and index.name == 'mmap' else shared_tasks_version()
+    if index is None or (version is not None and version != index_version):
+        with _index_lock:
+            if index is None or (version is not None and version != index_version):
+                try:
+                    if index is None or not catch_up_index(index, index_version, version):
+                        if index is not None:
+                            logger.info(f"Rebuilding the vector index: the changes from tasks version "
+                                        f"{index_version} to {version} are not all known")
+                        index = build_index()
+                    index_version = version
+                except Exception as e:
+                    logger.error(f"Error building vector index: {e}")
+                    raise AppException("Failed to build vector index.") from e
+
+    return index
+
+
+def catch_up_index(target, since, until):
+    """
+    Reload into an index the tasks changed between two tasks versions by other processes.
+
+    :return: False if the changed tasks are not all known, in which case the index is left as is.
+    """
+    from .models import Task
+
+    cache = get_search_cache()
+    task_ids = None if cache is None else cache.changed_task_ids(since, until)
+    if task_ids is None:
+        return False
+
+    task_ids = sorted(task_ids)
+    found = set()
+    for start in range(0, len(task_ids), 2000):
+        rows = current_vectors(Task.objects.filter(id__in=task_ids[start:start + 2000])).values_list(
+            'id', 'vector_blob', 'vector_dtype', 'owner_id', 'status', 'deadline')
+        batch = [(task_id, unpack_vector(bytes(blob), dtype), TaskMeta(owner_id, status_code(status),
+                                                                       deadline.timestamp()))
+                 for task_id, blob, dtype, owner_id, status, deadline in rows]
+        if batch:
+            target.upsert_many(*zip(*batch))
+            found.update(task_id for task_id, _, _ in batch)
+    for task_id in task_ids:
+        if task_id not in found:
+            target.remove(task_id)
+    logger.info(f"Caught up the vector index from tasks version {since} to {until} "
+                f"({len(task_ids)} tasks changed)")
+    return True
+
+
+def get_loaded_index():
+    """
+    Returns the process-wide index if it has been built, otherwise None.
+    Used by signal handlers so that writes never trigger a full build.
+
+    The mmap index is returned whenever its snapshot file exists, because its changes are
+    appended to a delta log shared with the other worker processes, and opening it is cheap.
+    Without a snapshot nothing is logged: the first search, or `manage.py build_index_snapshot`,
+    writes one from the database, changes included.
+    """
+    if index is None and getattr(settings, 'TASK_INDEX_TYPE', 'exact') == 'mmap' \
+            and os.path.exists(str(settings.TASK_INDEX_PATH)):
+        return get_index()
+    return index
+
+
+def apply_task_changes(saved=(), deleted=(), owner_ids=()):
+    """
+    Apply saved and deleted tasks to this process's index, if it is loaded, then bump the shared
+    tasks version, which invalidates cached search results and the other processes' indexes.
+
+    Saved tasks without a searchable vector (see indexed_vector) are removed from the index.
+    The index is marked up to date with the new version only if it was up to date with the
+    previous one, i.e. no other process changed tasks in between; otherwise it catches up on
+    the next search.
+
+    :param saved: Task instances that were created or updated.
+    :param deleted: Ids of deleted tasks.
+    :param owner_ids: Owners of the changed tasks, whose owner-filtered cached searches are invalidated.
+    """
+    global index_version
+
+    saved, deleted = list(saved), list(deleted)
+    loaded = get_loaded_index()
+    if loaded is not None:
+        if saved:
+            loaded.upsert_many([task.pk for task in saved], [indexed_vector(task) for task in saved],
+                               [task_meta(task) for task in saved])
+        for task_id in deleted:
+            loaded.remove(task_id)
+
+    version = bump_tasks_version(owner_ids, [task.pk for task in saved] + deleted)
+    if loaded is not None and version is not None:
+        with _index_lock:
+            if index is loaded and index_version is not None and index_version == version - 1:
+                index_version = version
+
+
+def search_index(index, query, k=None, min_score=None, filters=None):
+    """
+    Search an index, recording the time spent scoring in the task_similarity_seconds metric.
+    """
+    with SIMILARITY_SECONDS.time(index=getattr(settings, 'TASK_INDEX_TYPE', 'exact')):
+        return index.search(query, k=k, min_score=min_score, filters=filters)
+
+
+def reset_index():
+    """
+    Discard the process-wide index; it is rebuilt from the database on next use.
+    """
+    global index, index_version
+
+    with _index_lock:
+        index = None
+        index_version = None
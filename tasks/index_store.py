@@ -0,0 +1,379 @@
+from .logger import setup_logger
+from .exception import AppException
+from .index import VectorIndex, TaskMeta, UNKNOWN_META, top_k
+from .utils import normalize_vector
+from contextlib import contextmanager
+import fcntl
+import os
+import struct
+import threading
+import time
+import numpy as np
+
+logger = setup_logger(__name__)
+
+# Snapshot file: header | float32 vectors [count, dim] | per-task arrays [count] (see SNAPSHOT_SECTIONS)
+SNAPSHOT_MAGIC = b'TVINDEX\0'
+SNAPSHOT_VERSION = 2
+SNAPSHOT_HEADER = struct.Struct('<8sIIQQQ')  # magic, version, dim, count, generation, ids offset
+SNAPSHOT_HEADER_SIZE = 64
+# Arrays stored back to back from the 8-byte aligned ids offset. Task ids are ascending; by_owner and
+# by_deadline are row numbers ordered by owner and by deadline, next to the sorted keys, so a filter on
+# either is a binary search followed by a slice.
+SNAPSHOT_SECTIONS = [
+    ('ids', '<i8'),
+    ('owners', '<i8'),
+    ('deadlines', '<f8'),
+    ('by_owner', '<i8'),
+    ('owner_keys', '<i8'),
+    ('by_deadline', '<i8'),
+    ('deadline_keys', '<f8'),
+    ('statuses', '<i1'),
+]
+
+# Delta log: header | fixed-size records of (op, task id, metadata, vector) appended since the snapshot
+DELTA_MAGIC = b'TVDELTA\0'
+DELTA_HEADER = struct.Struct('<8sQI')  # magic, snapshot generation, dim
+DELTA_HEADER_SIZE = 32
+OP_UPSERT = 1
+OP_DELETE = 2
+
+
+def delta_path(path):
+    return f"{path}.delta"
+
+
+def delta_record_dtype(dim):
+    return np.dtype([('op', 'u1'), ('task_id', '<i8'), ('owner', '<i8'), ('status', '<i1'), ('deadline', '<f8'),
+                     ('vector', '<f4', (dim,))])
+
+
+def snapshot_sections(ids_offset, count):
+    """
+    Byte offset and dtype of each per-task array of a snapshot.
+    """
+    sections = {}
+    offset = ids_offset
+    for name, dtype in SNAPSHOT_SECTIONS:
+        sections[name] = (offset, np.dtype(dtype))
+        offset += count * np.dtype(dtype).itemsize
+    return sections
+
+
+@contextmanager
+def index_file_lock(path):
+    """
+    Exclusive advisory lock serializing delta appends with snapshot rebuilds across processes.
+    """
+    with open(f"{path}.lock", 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_snapshot_header(path):
+    """
+    Read and validate a snapshot header.
+
+    :return: Dict with dim, count, generation and ids_offset.
+    """
+    with open(path, 'rb') as f:
+        raw = f.read(SNAPSHOT_HEADER.size)
+    if len(raw) < SNAPSHOT_HEADER.size:
+        raise AppException(f"Vector index file '{path}' is truncated.")
+    magic, version, dim, count, generation, ids_offset = SNAPSHOT_HEADER.unpack(raw)
+    if magic != SNAPSHOT_MAGIC:
+        raise AppException(f"'{path}' is not a vector index file.")
+    if version != SNAPSHOT_VERSION:
+        raise AppException(f"Vector index file '{path}' has unsupported version {version}; "
+                           f"rewrite it with `manage.py build_index_snapshot`.")
+    return {'dim': dim, 'count': count, 'generation': generation, 'ids_offset': ids_offset}
+
+
+def write_snapshot(path, rows, dim):
+    """
+    Write a snapshot of task vectors and atomically replace the file at path.
+
+    Vectors are streamed to disk as they are produced, so memory use is bounded by
+    the per-task arrays. Changes logged in the delta file while the snapshot was
+    being written are carried over into a fresh delta log for the new snapshot.
+
+    :param path: Destination file.
+    :param rows: Iterable of (task_id, vector) or (task_id, vector, TaskMeta) tuples in ascending task id order.
+    :param dim: Vector dimensionality.
+    :return: Generation number of the new snapshot.
+    """
+    os.makedirs(os.path.dirname(str(path)) or '.', exist_ok=True)
+    generation = time.time_ns()
+    carried_from = delta_length(path)
+    tmp_path = f"{path}.tmp"
+    ids, metas = [], []
+    with open(tmp_path, 'wb') as f:
+        f.write(b'\0' * SNAPSHOT_HEADER_SIZE)
+        for task_id, vector, *meta in rows:
+            normalized = normalize_vector(vector)
+            if normalized is None:
+                continue
+            if normalized.shape[0] != dim:
+                raise AppException(f"Vector for task {task_id} has dimension {normalized.shape[0]}, expected {dim}.")
+            f.write(normalized.tobytes())
+            ids.append(task_id)
+            metas.append(meta[0] if meta else UNKNOWN_META)
+        ids_offset = f.tell() + (-f.tell() % 8)
+        f.write(b'\0' * (ids_offset - f.tell()))
+        owners = np.array([meta.owner_id for meta in metas], dtype='<i8')
+        deadlines = np.array([meta.deadline for meta in metas], dtype='<f8')
+        by_owner = np.argsort(owners, kind='stable')
+        by_deadline = np.argsort(deadlines, kind='stable')
+        arrays = {
+            'ids': np.asarray(ids, dtype='<i8'),
+            'owners': owners,
+            'deadlines': deadlines,
+            'by_owner': by_owner,
+            'owner_keys': owners[by_owner],
+            'by_deadline': by_deadline,
+            'deadline_keys': deadlines[by_deadline],
+            'statuses': np.array([meta.status for meta in metas], dtype='<i1'),
+        }
+        for name, dtype in SNAPSHOT_SECTIONS:
+            f.write(arrays[name].astype(dtype).tobytes())
+        f.seek(0)
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, dim, len(ids), generation, ids_offset))
+        f.flush()
+        os.fsync(f.fileno())
+
+    with index_file_lock(path):
+        carried = read_delta_tail(path, carried_from)
+        tmp_delta = f"{delta_path(path)}.tmp"
+        with open(tmp_delta, 'wb') as f:
+            f.write(DELTA_HEADER.pack(DELTA_MAGIC, generation, dim).ljust(DELTA_HEADER_SIZE, b'\0'))
+            f.write(carried)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        os.replace(tmp_delta, delta_path(path))
+    logger.info(f"Wrote vector index snapshot {generation} with {len(ids)} tasks to {path}")
+    return generation
+
+
+def delta_length(path):
+    """
+    Size in bytes of the delta log of the snapshot at path, or 0 if there is none.
+    """
+    try:
+        return os.path.getsize(delta_path(path))
+    except OSError:
+        return 0
+
+
+def read_delta_tail(path, offset):
+    """
+    Raw records appended to the delta log after the given byte offset.
+    """
+    try:
+        with open(delta_path(path), 'rb') as f:
+            f.seek(max(offset, DELTA_HEADER_SIZE))
+            return f.read()
+    except OSError:
+        return b''
+
+
+class MmapIndex:
+    """
+    Exact vector index backed by a memory-mapped snapshot file plus a delta log.
+
+    Every worker process maps the same read-only snapshot, so the vectors are shared
+    through the OS page cache and opening the index takes milliseconds. Tasks changed
+    after the snapshot was written are appended to the delta log by whichever process
+    saved them; each process replays new log records into a small in-memory overlay
+    before searching. Overlay entries and deletions shadow the snapshot's rows.
+    """
+    name = 'mmap'
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._lock = threading.RLock()
+        self._open()
+
+    def _open(self):
+        header = read_snapshot_header(self.path)
+        self.dim = header['dim']
+        self.generation = header['generation']
+        count = header['count']
+        self._snapshot_inode = os.stat(self.path).st_ino
+        if count:
+            self._vectors = np.memmap(self.path, dtype='<f4', mode='r', offset=SNAPSHOT_HEADER_SIZE,
+                                      shape=(count, self.dim))
+            self._arrays = {name: np.memmap(self.path, dtype=dtype, mode='r', offset=offset, shape=(count,))
+                            for name, (offset, dtype) in snapshot_sections(header['ids_offset'], count).items()}
+        else:
+            self._vectors = np.empty((0, self.dim), dtype=np.float32)
+            self._arrays = {name: np.empty(0, dtype=dtype) for name, dtype in SNAPSHOT_SECTIONS}
+        self._ids = self._arrays['ids']
+        self._record_dtype = delta_record_dtype(self.dim)
+        self._overlay = VectorIndex(dim=self.dim, capacity=64)
+        self._changed = set()
+        self._deleted = set()
+        self._delta_offset = DELTA_HEADER_SIZE
+
+    def __len__(self):
+        self.refresh()
+        with self._lock:
+            shadowed = self._changed | self._deleted
+            return len(self._ids) - int(self._in_snapshot(shadowed).sum()) + len(self._overlay)
+
+    def __contains__(self, task_id):
+        self.refresh()
+        with self._lock:
+            return task_id in self._overlay or (task_id not in self._deleted and bool(self._in_snapshot([task_id])[0]))
+
+    def _in_snapshot(self, task_ids):
+        """
+        Boolean mask of which task ids have a row in the snapshot. Snapshot ids are written in ascending order.
+        """
+        task_ids = np.fromiter(task_ids, dtype=np.int64)
+        if not len(self._ids):
+            return np.zeros(len(task_ids), dtype=bool)
+        positions = np.minimum(np.searchsorted(self._ids, task_ids), len(self._ids) - 1)
+        return self._ids[positions] == task_ids
+
+    def refresh(self):
+        """
+        Reopen the snapshot if it was replaced, then replay delta records appended since the last refresh.
+        """
+        with self._lock:
+            try:
+                if os.stat(self.path).st_ino != self._snapshot_inode:
+                    self._open()
+                size = os.path.getsize(delta_path(self.path))
+            except OSError:
+                return
+            record_size = self._record_dtype.itemsize
+            available = (size - self._delta_offset) // record_size
+            if available <= 0:
+                return
+            with open(delta_path(self.path), 'rb') as f:
+                header = DELTA_HEADER.unpack(f.read(DELTA_HEADER.size))
+                if header[1] != self.generation:
+                    # The log belongs to a newer snapshot that is being swapped in
+                    return
+                f.seek(self._delta_offset)
+                records = np.frombuffer(f.read(available * record_size), dtype=self._record_dtype)
+            self._delta_offset += len(records) * record_size
+            for record in records:
+                task_id = int(record['task_id'])
+                if record['op'] == OP_UPSERT:
+                    meta = TaskMeta(int(record['owner']), int(record['status']), float(record['deadline']))
+                    self._overlay.upsert(task_id, record['vector'], meta)
+                    self._changed.add(task_id)
+                    self._deleted.discard(task_id)
+                else:
+                    self._overlay.remove(task_id)
+                    self._changed.discard(task_id)
+                    self._deleted.add(task_id)
+
+    def _append(self, ops, task_ids, vectors, metas):
+        records = np.zeros(len(task_ids), dtype=self._record_dtype)
+        records['op'] = ops
+        records['task_id'] = task_ids
+        records['owner'] = [meta.owner_id for meta in metas]
+        records['status'] = [meta.status for meta in metas]
+        records['deadline'] = [meta.deadline for meta in metas]
+        records['vector'] = vectors
+        with index_file_lock(self.path):
+            fd = os.open(delta_path(self.path), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                if os.fstat(fd).st_size == 0:
+                    # The log is missing: start one for the snapshot currently on disk
+                    generation = read_snapshot_header(self.path)['generation']
+                    os.write(fd, DELTA_HEADER.pack(DELTA_MAGIC, generation, self.dim).ljust(DELTA_HEADER_SIZE, b'\0'))
+                os.write(fd, records.tobytes())
+            finally:
+                os.close(fd)
+        self.refresh()
+
+    def upsert(self, task_id, vector, meta=None):
+        self.upsert_many([task_id], [vector], None if meta is None else [meta])
+
+    def upsert_many(self, task_ids, vectors, metas=None):
+        """
+        Log new or changed task vectors to the delta file. Missing or zero vectors are logged as deletions.
+        """
+        metas = list(metas) if metas is not None else [UNKNOWN_META] * len(task_ids)
+        ops, ids, rows = [], [], []
+        for task_id, vector in zip(task_ids, vectors):
+            normalized = normalize_vector(vector)
+            if normalized is not None and normalized.shape[0] != self.dim:
+                raise AppException(f"Vector for task {task_id} has dimension {normalized.shape[0]}, "
+                                   f"expected {self.dim}.")
+            ops.append(OP_DELETE if normalized is None else OP_UPSERT)
+            ids.append(task_id)
+            rows.append(np.zeros(self.dim, dtype=np.float32) if normalized is None else normalized)
+        if ids:
+            self._append(ops, ids, np.stack(rows), metas)
+
+    def remove(self, task_id):
+        self._append([OP_DELETE], [task_id], np.zeros((1, self.dim), dtype=np.float32), [UNKNOWN_META])
+
+    def memory_bytes(self):
+        """
+        Bytes mapped from the snapshot (shared between processes) plus the private overlay.
+        """
+        return (self._vectors.nbytes + sum(array.nbytes for array in self._arrays.values())
+                + self._overlay.memory_bytes())
+
+    def _candidate_rows(self, filters):
+        """
+        Snapshot rows matching a search filter, found by binary search in the owner or
+        deadline ordering and narrowed with masks over the remaining criteria.
+        """
+        arrays = self._arrays
+        if filters.owner_id is not None:
+            keys = arrays['owner_keys']
+            rows = arrays['by_owner'][np.searchsorted(keys, filters.owner_id, 'left'):
+                                      np.searchsorted(keys, filters.owner_id, 'right')]
+        elif filters.has_deadline:
+            keys = arrays['deadline_keys']
+            start = 0 if filters.deadline_after is None else np.searchsorted(keys, filters.deadline_after, 'left')
+            # Unknown (NaN) deadlines are sorted after every timestamp, so an open upper bound stops before them
+            before = np.inf if filters.deadline_before is None else filters.deadline_before
+            rows = arrays['by_deadline'][start:np.searchsorted(keys, before, 'right')]
+        else:
+            rows = np.arange(len(self._ids))
+        rows = np.sort(rows)
+        return rows[filters.mask(arrays['owners'][rows], arrays['statuses'][rows], arrays['deadlines'][rows])]
+
+    def search(self, query_vector, k=None, min_score=0.5, filters=None):
+        """
+        Search the snapshot and the overlay, dropping snapshot rows shadowed by later changes.
+        Takes the same arguments and returns the same hits as VectorIndex.search.
+        """
+        query = normalize_vector(query_vector)
+        if query is None or k == 0:
+            return []
+        if query.shape[0] != self.dim:
+            raise AppException(f"Query vector has dimension {query.shape[0]}, expected {self.dim}.")
+        self.refresh()
+
+        with self._lock:
+            shadowed = self._changed | self._deleted
+            hits = self._overlay.search(query, k=k, min_score=min_score, filters=filters)
+            vectors, ids = self._vectors, self._ids
+            candidates = self._candidate_rows(filters) if filters and len(ids) else None
+
+        if candidates is not None:
+            vectors, ids = vectors[candidates], ids[candidates]
+        if len(ids):
+            scores = np.asarray(vectors @ query)
+            rows = np.flatnonzero(scores > min_score)
+            # Over-fetch by the number of shadowed tasks so filtering them cannot leave fewer than k hits
+            base_k = None if k is None else k + len(shadowed)
+            hits += [(task_id, score) for task_id, score in top_k(ids[rows], scores[rows], base_k)
+                     if task_id not in shadowed]
+        if not hits:
+            return []
+        return top_k(np.array([task_id for task_id, _ in hits], dtype=np.int64),
+                     np.array([score for _, score in hits], dtype=np.float32), k)
+
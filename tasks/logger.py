@@ -1,35 +1,194 @@
+from contextlib import contextmanager
+import atexit
+import copy
 import logging
 import logging.handlers
 import os
+import queue
+import random
+import threading
 from django.conf import settings
 
+LOGGER_NAME = 'tasks_logger'
 
-def setup_logger():
+_lock = threading.Lock()
+_queue = None
+_listener = None
+
+
+class SamplingFilter(logging.Filter):
     """
-    Set up and configure a logger for the tasks app.
-    Log rotation is used to limit the log file size.
+    Keeps only a fraction of the records below WARNING of the loggers given a sample rate, so
+    chatty INFO lines on hot paths (e.g. one per saved task) cost a coin flip instead of a write.
+    Warnings and errors always pass.
+    """
+    def __init__(self, sample_rates=None):
+        """
+        :param sample_rates: Mapping of logger name (e.g. 'tasks_logger.serializers') to the fraction
+                             of its records to keep; a rate also applies to the logger's children.
+        """
+        super().__init__()
+        self.sample_rates = dict(sample_rates or {})
+
+    def rate_for(self, name):
+        while name:
+            if name in self.sample_rates:
+                return self.sample_rates[name]
+            name = name.rpartition('.')[0]
+        return 1.0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.sample_rates:
+            return True
+        rate = self.rate_for(record.name)
+        return rate >= 1.0 or (rate > 0 and random.random() < rate)
+
+
+def qualified_name(name):
     """
-    # Log file name
-    log_file = 'tasks.log'
+    Map a short name ('serializers') or a module name ('tasks.serializers') to the tasks logger's
+    child of that name ('tasks_logger.serializers').
+    """
+    if not name or name == LOGGER_NAME or name.startswith(LOGGER_NAME + '.'):
+        return name or LOGGER_NAME
+    if name.startswith('tasks.'):
+        name = name[len('tasks.'):]
+    return f'{LOGGER_NAME}.{name}'
+
 
-    # Log file path
-    log_dir = os.path.join(settings.BASE_DIR, 'log')
+def _file_handler(rotate=True):
+    """
+    :param rotate: Rotate the file at 10 MB. Only one process may rotate a file, so forked children
+                   append to it instead, reopening it when the rotating process has moved it away.
+    """
+    log_dir = getattr(settings, 'TASK_LOG_DIR', os.path.join(settings.BASE_DIR, 'log'))
     os.makedirs(log_dir, exist_ok=True)
-    log_file_path = os.path.join(log_dir, log_file)
+    path = os.path.join(log_dir, 'tasks.log')
+    if rotate:
+        file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=10*1024*1024, backupCount=5, delay=True)
+    else:
+        file_handler = logging.handlers.WatchedFileHandler(path, delay=True)
+    file_handler.setFormatter(logging.Formatter("[ %(asctime)s ] %(name)s - %(levelname)s - %(message)s"))
+    return file_handler
+
+
+def _start_listener(rotate=True):
+    """
+    Start the thread writing the queued records to the log file.
+    """
+    global _queue, _listener
+
+    _queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(_queue, _file_handler(rotate), respect_handler_level=True)
+    _listener.start()
+
+
+def _restart_after_fork():
+    # A forked worker inherits the queue but not the listener thread: give it its own, which
+    # appends to the parent's log file but leaves rotating it to the parent.
+    # _lock was acquired before the fork, so no other thread can be starting or stopping one.
+    global _listener
+
+    try:
+        if _listener is not None:
+            _listener = None
+            _start_listener(rotate=False)
+            for handler in logging.getLogger(LOGGER_NAME).handlers:
+                if isinstance(handler, logging.handlers.QueueHandler):
+                    handler.queue = _queue
+    finally:
+        _lock.release()
+
+
+def stop_listener():
+    """
+    Flush the queued records to the log file and stop the listener thread.
+    """
+    global _listener
+
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            for handler in _listener.handlers:
+                handler.close()
+            _listener = None
 
-    # Configure the logger
-    logger = logging.getLogger('tasks_logger')
-    logger.setLevel(logging.INFO)
 
-    # Creating and setting the file handler with rotation
-    file_handler = logging.handlers.RotatingFileHandler(
-        log_file_path, maxBytes=10*1024*1024, backupCount=5
-    )
-    file_handler.setLevel(logging.INFO)
-    formatter = logging.Formatter("[ %(asctime)s ] %(name)s - %(levelname)s - %(message)s")
-    file_handler.setFormatter(formatter)
+def configure_logging():
+    """
+    Configure the tasks logger once per process: its records go through a QueueHandler to a
+    QueueListener thread, which does the file I/O off the request thread. Levels and sample
+    rates of its children come from TASK_LOG_LEVELS and TASK_LOG_SAMPLE_RATES.
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+    with _lock:
+        if _listener is not None:
+            return logger
 
-    # Adding the handler to the logger
-    logger.addHandler(file_handler)
+        logger.setLevel(getattr(settings, 'TASK_LOG_LEVEL', 'INFO').upper())
+        for name, level in getattr(settings, 'TASK_LOG_LEVELS', {}).items():
+            logging.getLogger(qualified_name(name)).setLevel(level.upper())
 
+        _start_listener()
+        handler = logging.handlers.QueueHandler(_queue)
+        handler.addFilter(SamplingFilter({qualified_name(name): float(rate) for name, rate
+                                          in getattr(settings, 'TASK_LOG_SAMPLE_RATES', {}).items()}))
+        for old in [h for h in logger.handlers if isinstance(h, logging.handlers.QueueHandler)]:
+            logger.removeHandler(old)
+        logger.addHandler(handler)
     return logger
+
+
+def reopen_log_files():
+    """
+    Close the Django and tasks log files and reopen them in the current DJANGO_LOG_DIR and
+    TASK_LOG_DIR, e.g. after those settings were overridden.
+    """
+    from django.utils.log import configure_logging as configure_django_logging
+
+    stop_listener()
+    django_log_dir = getattr(settings, 'DJANGO_LOG_DIR', None)
+    config = copy.deepcopy(settings.LOGGING)
+    if django_log_dir:
+        os.makedirs(django_log_dir, exist_ok=True)
+        for handler in config.get('handlers', {}).values():
+            if 'filename' in handler:
+                handler['filename'] = os.path.join(django_log_dir, os.path.basename(handler['filename']))
+    configure_django_logging(settings.LOGGING_CONFIG, config)
+    configure_logging()
+
+
+@contextmanager
+def log_files_in(log_dir):
+    """
+    Write the Django and tasks logs to log_dir for the duration of the block, e.g. for test and
+    benchmark runs, which should not write into the deployment's log files.
+    """
+    from django.test.utils import override_settings
+
+    with override_settings(DJANGO_LOG_DIR=log_dir, TASK_LOG_DIR=log_dir):
+        reopen_log_files()
+        try:
+            yield log_dir
+        finally:
+            stop_listener()
+    reopen_log_files()
+
+
+def setup_logger(name=None):
+    """
+    Set up and configure a logger for the tasks app.
+    Log rotation is used to limit the log file size.
+
+    Safe to call from every module at import time: the handler is only installed once.
+
+    :param name: Module name (__name__) to get the tasks logger's child for, so its level
+                 and sampling can be configured separately; the tasks logger itself if omitted.
+    """
+    configure_logging()
+    return logging.getLogger(qualified_name(name))
+
+
+atexit.register(stop_listener)
+# Hold _lock across fork(), so the child never inherits it locked by a thread that does not exist there
+os.register_at_fork(before=_lock.acquire, after_in_parent=_lock.release, after_in_child=_restart_after_fork)
@@ -0,0 +1,119 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.utils import timezone
+from tasks.benchmark import Benchmark, environment, parse_size, sqlite_profile, use_encoder
+from tasks.encoders import ENCODERS, create_encoder
+from tasks.logger import log_files_in
+import json
+import os
+import tempfile
+
+
+class Command(BaseCommand):
+    help = ("Benchmark task creation, bulk ingest, search, list pagination and serialization against "
+            "synthetic corpora of growing size, and write the results as JSON for comparison between commits. "
+            "Runs in a throwaway database unless --in-place is given.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', default=['1k'],
+                            help="Corpus sizes to measure at, e.g. 1k 100k 1m (default: 1k).")
+        parser.add_argument('--encoder', choices=[*ENCODERS, 'configured'], default='hashing',
+                            help="Encoder to benchmark with: 'hashing' (default) needs no model download; "
+                                 "'configured' uses TASK_ENCODER.")
+        parser.add_argument('--index-type', default=None, help="TASK_INDEX_TYPE to benchmark (default: setting).")
+        parser.add_argument('--owners', type=int, default=10, help="Users the corpus is spread over.")
+        parser.add_argument('--queries', type=int, default=100, help="Search requests per mode and size.")
+        parser.add_argument('--creates', type=int, default=100, help="Single task creations per size.")
+        parser.add_argument('--repeat', type=int, default=20, help="Requests per list and serialization case.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--concurrency', action='store_true',
+                            help="Instead of the size sweep, grow the corpus to the first size and measure "
+                                 "concurrent list and create throughput under the default and the production "
+                                 "SQLite profile (TASK_SQLITE_PRODUCTION).")
+        parser.add_argument('--readers', type=int, default=4, help="Reader threads in --concurrency runs.")
+        parser.add_argument('--writers', type=int, default=2, help="Writer threads in --concurrency runs.")
+        parser.add_argument('--duration', type=float, default=5.0, help="Seconds per --concurrency run.")
+        parser.add_argument('--output', default=None, help="JSON file to write (default: stdout).")
+        parser.add_argument('--in-place', action='store_true',
+                            help="Use the configured database instead of a throwaway one; the benchmark's "
+                                 "users and tasks are deleted afterwards.")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = sorted(parse_size(size) for size in options['sizes'])
+        except ValueError as e:
+            raise CommandError(f"Invalid size: {e}")
+
+        # Keep the benchmark's log records out of the deployment's log files
+        log_dir = os.path.join(tempfile.gettempdir(), 'taskvectorapi', 'benchmark-logs')
+        with tempfile.TemporaryDirectory(prefix='task-benchmark-') as workdir, log_files_in(log_dir):
+            old_name = None
+            if not options['in_place']:
+                if connection.vendor == 'sqlite':
+                    connection.settings_dict['TEST']['NAME'] = os.path.join(workdir, 'benchmark.sqlite3')
+                old_name = connection.settings_dict['NAME']
+                connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                results = self.run(sizes, options, workdir)
+            finally:
+                if old_name is not None:
+                    connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Wrote benchmark results to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def run(self, sizes, options, workdir):
+        overrides = {
+            # The test client's host; DEBUG would record every query in memory
+            'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver'],
+            'DEBUG': False,
+            # A single sequential client has nobody to batch encodes with; skip the hand-off to the dispatcher
+            'TASK_ENCODE_BATCH_WAIT_MS': 0,
+            'TASK_EMBEDDING_CACHE_ALIAS': None,
+            'TASK_INDEX_PATH': os.path.join(workdir, 'tasks.vidx'),
+        }
+        if options['index_type']:
+            overrides['TASK_INDEX_TYPE'] = options['index_type']
+
+        with override_settings(**overrides):
+            if options['encoder'] != 'configured':
+                with use_encoder(create_encoder(options['encoder'])):
+                    return self.measure(sizes, options)
+            return self.measure(sizes, options)
+
+    def measure(self, sizes, options):
+        benchmark = Benchmark(owners=options['owners'], seed=options['seed'], queries=options['queries'],
+                              creates=options['creates'], repeat=options['repeat'], log=self.stderr.write)
+        results = {
+            'started_at': timezone.now().isoformat(),
+            'environment': {**environment(), 'encoder': options['encoder'], 'seed': options['seed']},
+        }
+        try:
+            if options['concurrency']:
+                results['concurrency'] = self.measure_concurrency(benchmark, sizes[0], options)
+            else:
+                results['runs'] = []
+                for size in sizes:
+                    self.stderr.write(f"Benchmarking {size} tasks")
+                    results['runs'].append(benchmark.run(size))
+        finally:
+            if options['in_place']:
+                benchmark.cleanup()
+        return results
+
+    def measure_concurrency(self, benchmark, size, options):
+        benchmark.ingest(size - benchmark.task_count())
+        results = {'tasks': size}
+        for profile in ('default', 'production'):
+            self.stderr.write(f"Measuring concurrency with the {profile} SQLite profile")
+            with sqlite_profile(profile == 'production'):
+                results[profile] = benchmark.concurrency(options['readers'], options['writers'],
+                                                         options['duration'])
+        return results
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from tasks.index import write_index_snapshot
+from tasks.index_store import read_snapshot_header
+import time
+
+
+class Command(BaseCommand):
+    help = ("Write every stored task vector to the memory-mapped index file (TASK_INDEX_TYPE='mmap') at "
+            "TASK_INDEX_PATH, replacing the previous snapshot and its delta log. Workers switch to the new "
+            "snapshot on their next search.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=None, help="Index file to write (default: TASK_INDEX_PATH).")
+
+    def handle(self, *args, **options):
+        path = options['path'] or settings.TASK_INDEX_PATH
+        started = time.monotonic()
+        write_index_snapshot(path)
+        header = read_snapshot_header(path)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {header['count']} task vectors ({header['dim']} dimensions) to {path} "
+            f"in {time.monotonic() - started:.1f}s"
+        ))
@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from tasks.embedding_server import MAX_MESSAGE_SIZE, EmbeddingServer, tune_torch_threads
+from tasks.encoders import create_encoder
+from tasks.exception import AppException
+import signal
+import time
+
+
+class Command(BaseCommand):
+    help = ("Serve batched encode requests over a Unix domain socket, so web workers configured with "
+            "TASK_ENCODER=remote share one copy of the model instead of each loading their own.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default=None, help="Socket path (default: TASK_EMBEDDING_SERVER_SOCKET).")
+        parser.add_argument('--encoder', default=None,
+                            help="Encoder to serve (default: TASK_EMBEDDING_SERVER_ENCODER).")
+        parser.add_argument('--threads', type=int, default=None,
+                            help="Torch intra-op threads (default: TASK_EMBEDDING_SERVER_THREADS; 0 keeps "
+                                 "torch's default of one per core).")
+        parser.add_argument('--max-batch-size', type=int, default=None,
+                            help="Texts per model call (default: TASK_EMBEDDING_SERVER_MAX_BATCH_SIZE).")
+        parser.add_argument('--max-wait-ms', type=float, default=None,
+                            help="How long a request waits for others to batch with "
+                                 "(default: TASK_EMBEDDING_SERVER_MAX_WAIT_MS).")
+        parser.add_argument('--max-queue-size', type=int, default=None,
+                            help="Requests queued before new ones are held back "
+                                 "(default: TASK_EMBEDDING_SERVER_QUEUE_SIZE).")
+
+    def handle(self, *args, **options):
+        def option(name, setting, default):
+            return options[name] if options[name] is not None else getattr(settings, setting, default)
+
+        encoder_name = option('encoder', 'TASK_EMBEDDING_SERVER_ENCODER', 'sentence-transformers')
+        if encoder_name == 'remote':
+            raise CommandError("The embedding server cannot serve the 'remote' encoder.")
+        path = option('socket', 'TASK_EMBEDDING_SERVER_SOCKET', 'embedding.sock')
+
+        try:
+            tune_torch_threads(option('threads', 'TASK_EMBEDDING_SERVER_THREADS', 0))
+            started = time.monotonic()
+            encoder = create_encoder(encoder_name).load()
+            # Initialize the inference kernels before the first request
+            encoder.encode(['warmup'])
+        except AppException as e:
+            raise CommandError(str(e))
+        self.stdout.write(f"Loaded {encoder.name} in {time.monotonic() - started:.1f}s")
+
+        server = EmbeddingServer(
+            path, encoder,
+            max_batch_size=option('max_batch_size', 'TASK_EMBEDDING_SERVER_MAX_BATCH_SIZE', 64),
+            max_wait_ms=option('max_wait_ms', 'TASK_EMBEDDING_SERVER_MAX_WAIT_MS', 5.0),
+            max_queue_size=option('max_queue_size', 'TASK_EMBEDDING_SERVER_QUEUE_SIZE', 1024),
+            queue_timeout=getattr(settings, 'TASK_EMBEDDING_SERVER_QUEUE_TIMEOUT', 10.0),
+            max_message_size=getattr(settings, 'TASK_EMBEDDING_SERVER_MAX_MESSAGE_SIZE', MAX_MESSAGE_SIZE),
+        )
+
+        def stop(signum, frame):
+            raise KeyboardInterrupt
+
+        signal.signal(signal.SIGTERM, stop)
+        self.stdout.write(self.style.SUCCESS(f"Serving {encoder.name} on {path}"))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f"Stopped after {server.batcher.stats()['requests']} requests")
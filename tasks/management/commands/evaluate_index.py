@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from tasks.index import build_index, iter_task_vectors
+import time
+import numpy as np
+
+
+class Command(BaseCommand):
+    help = ("Compare the memory footprint, latency and recall@k of the exact vector index "
+            "with the quantized and IVF index types, using stored task vectors as queries.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--types', nargs='+', default=['int8', 'pq', 'ivf'], choices=['int8', 'pq', 'ivf'],
+                            help="Approximate index types to evaluate against the exact index.")
+        parser.add_argument('-k', type=int, default=10, help="Number of neighbours compared per query.")
+        parser.add_argument('--queries', type=int, default=100, help="Number of sampled query vectors.")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        k = self.k = options['k']
+        exact = build_index('exact')
+        if not len(exact):
+            self.stdout.write("No task vectors to evaluate.")
+            return
+
+        # Sample query vectors uniformly from the stored task vectors
+        rng = np.random.default_rng(options['seed'])
+        picks = set(rng.choice(len(exact), min(options['queries'], len(exact)), replace=False).tolist())
+        queries = [vector for position, (_, vector) in enumerate(iter_task_vectors()) if position in picks]
+
+        truth, exact_ms = self.run_queries(exact, queries, k)
+        self.report('exact', exact, exact_ms, 1.0)
+        for index_type in options['types']:
+            index = build_index(index_type)
+            results, latency_ms = self.run_queries(index, queries, k)
+            recall = np.mean([len(set(found) & set(expected)) / max(len(expected), 1)
+                              for found, expected in zip(results, truth)])
+            self.report(index_type, index, latency_ms, recall, exact.memory_bytes())
+
+    @staticmethod
+    def run_queries(index, queries, k):
+        results = []
+        started = time.perf_counter()
+        for query in queries:
+            results.append([task_id for task_id, _ in index.search(query, k=k, min_score=-1.0)])
+        latency_ms = (time.perf_counter() - started) * 1000 / max(len(queries), 1)
+        return results, latency_ms
+
+    def report(self, name, index, latency_ms, recall, baseline_bytes=None):
+        memory = index.memory_bytes()
+        ratio = f", {baseline_bytes / memory:.1f}x smaller" if baseline_bytes and memory else ''
+        self.stdout.write(f"{name:>6}: {len(index)} tasks, {memory / 2**20:.2f} MiB{ratio}, "
+                          f"{latency_ms:.2f} ms/query, recall@{self.k}={recall:.3f}")
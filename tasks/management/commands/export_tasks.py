@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+from tasks.export import TaskExport, VECTOR_FORMATS, format_datetime
+import sys
+import time
+
+
+class Command(BaseCommand):
+    help = ("Stream tasks as NDJSON, or their vectors as a binary vector file, in (updated_at, id) order "
+            "with constant memory. Pass the printed 'until' time as --since to the next run to export "
+            "the tasks written in between (and those of the last TASK_EXPORT_SINCE_OVERLAP seconds before it).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=['ndjson', 'vectors'], default='ndjson')
+        parser.add_argument('--vectors', choices=VECTOR_FORMATS, default='none',
+                            help="How NDJSON records include vectors (default: none).")
+        parser.add_argument('--since', default=None, help="Only export tasks written after this ISO 8601 time.")
+        parser.add_argument('--owner', type=int, default=None, help="Only export the tasks of this user id.")
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help="Rows fetched and written at a time (default: TASK_EXPORT_CHUNK_SIZE).")
+        parser.add_argument('--output', default=None, help="File to write (default: stdout).")
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                raise CommandError(f"Invalid --since time: {options['since']}")
+
+        task_export = TaskExport(since=since, owner_id=options['owner'], vectors=options['vectors'],
+                                 chunk_size=options['chunk_size'])
+        chunks = task_export.vector_file() if options['format'] == 'vectors' else task_export.ndjson()
+
+        started = time.monotonic()
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+        finally:
+            if options['output']:
+                output.close()
+            else:
+                output.flush()
+        elapsed = time.monotonic() - started
+
+        until = format_datetime(task_export.until) if task_export.until else options['since']
+        self.stderr.write(self.style.SUCCESS(
+            f"Exported {task_export.rows} tasks in {elapsed:.1f}s "
+            f"({task_export.rows / elapsed if elapsed else 0:.0f} rows/sec), until {until}"
+        ))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from tasks.embedding_worker import process_pending_embeddings
+import time
+
+
+class Command(BaseCommand):
+    help = "Generate vector representations for tasks saved while TASK_EMBEDDING_MODE is 'async'."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Tasks embedded per encode call (default: TASK_EMBEDDING_BATCH_SIZE).")
+        parser.add_argument('--once', action='store_true',
+                            help="Drain the pending tasks once and exit instead of polling.")
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help="Seconds to sleep when no tasks are pending.")
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            processed = process_pending_embeddings(options['batch_size'])
+            if processed:
+                self.stdout.write(f"Embedded {processed} tasks")
+            if options['once']:
+                break
+            if not processed:
+                time.sleep(options['interval'])
@@ -0,0 +1,187 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from tasks.embedding_server import tune_torch_threads
+from tasks.encoders import SentenceTransformerEncoder
+from tasks.index import reset_index, write_index_snapshot
+from tasks.models import Task
+from tasks.search_cache import bump_tasks_version
+from tasks.utils import get_encoder, get_model, get_model_name
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+import multiprocessing
+import json
+import os
+import time
+import numpy as np
+
+VECTOR_FIELDS = ['vector_blob', 'vector_norm', 'vector_dtype', 'vector_model', 'embedding_pending', 'updated_at']
+
+
+def init_worker(threads):
+    """
+    Split the CPU cores between pool workers so their torch thread pools do not oversubscribe them.
+    Encoders without a torch model are left alone, and torch is not imported for them.
+    """
+    if isinstance(get_encoder(), SentenceTransformerEncoder):
+        tune_torch_threads(threads)
+
+
+def encode_batch(texts):
+    """
+    Encode a batch of texts with the configured model. Runs in pool worker processes,
+    so it bypasses the embedding cache rather than filling it with one-off texts.
+    """
+    return np.asarray(get_model().encode(texts), dtype=np.float32)
+
+
+class Command(BaseCommand):
+    help = ("Regenerate the vector representation of every task, e.g. after changing TASK_ENCODER or "
+            "TASK_EMBEDDING_MODEL. Progress is checkpointed so an interrupted run resumes where it stopped.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=256, help="Tasks encoded and written per batch.")
+        parser.add_argument('--workers', type=int, default=0,
+                            help="Encode batches in this many worker processes (0 encodes in this process).")
+        parser.add_argument('--missing-only', action='store_true',
+                            help="Only embed tasks that have no vector, are pending or have a vector "
+                                 "of another encoder.")
+        parser.add_argument('--checkpoint', default=os.path.join(settings.BASE_DIR, 'reembed_tasks.checkpoint'),
+                            help="File recording the last re-embedded task id.")
+        parser.add_argument('--restart', action='store_true', help="Ignore an existing checkpoint and start over.")
+
+    def handle(self, *args, **options):
+        batch_size = max(options['batch_size'], 1)
+        checkpoint_path = options['checkpoint']
+        checkpoint = {} if options['restart'] else self.read_checkpoint(checkpoint_path)
+        if checkpoint and checkpoint.get('model') != get_model_name():
+            self.stdout.write(f"Ignoring checkpoint for model '{checkpoint.get('model')}'")
+            checkpoint = {}
+        last_id = checkpoint.get('last_id', 0)
+        processed = checkpoint.get('processed', 0)
+        if last_id:
+            self.stdout.write(f"Resuming after task {last_id} ({processed} tasks already re-embedded)")
+
+        queryset = Task.objects.filter(id__gt=last_id)
+        if options['missing_only']:
+            queryset = queryset.filter(Q(vector_blob=None) | Q(embedding_pending=True)
+                                       | ~Q(vector_model=get_model_name()))
+        rows = queryset.order_by('id').values_list('id', 'title', 'description').iterator(chunk_size=batch_size)
+
+        started = time.monotonic()
+        done = 0
+        for batch, vectors in self.encoded_batches(rows, batch_size, options['workers']):
+            ids = [task_id for task_id, _, _ in batch]
+            written = self.write_batch(batch, vectors)
+            if written < len(ids):
+                self.stdout.write(f"Skipped {len(ids) - written} tasks edited while they were encoded")
+            done += len(ids)
+            processed += len(ids)
+            self.write_checkpoint(checkpoint_path, {'model': get_model_name(), 'last_id': ids[-1],
+                                                    'processed': processed})
+            elapsed = time.monotonic() - started
+            self.stdout.write(f"Re-embedded {processed} tasks (up to id {ids[-1]}), "
+                              f"{done / elapsed if elapsed else 0:.1f} rows/sec")
+
+        elapsed = time.monotonic() - started
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        if done:
+            self.refresh_index()
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-embedded {done} tasks in {elapsed:.1f}s ({done / elapsed if elapsed else 0:.1f} rows/sec)."
+        ))
+
+    def refresh_index(self):
+        """
+        Rebuild the indexes from the new vectors. Each batch already bumped the tasks version with its
+        task ids, which makes web workers with a shared search cache reload those tasks into their
+        in-memory indexes; this process's index is discarded, and the mmap snapshot shared by all
+        workers is rewritten.
+        """
+        reset_index()
+        if getattr(settings, 'TASK_INDEX_TYPE', 'exact') == 'mmap':
+            write_index_snapshot()
+            self.stdout.write(f"Rewrote the vector index snapshot {settings.TASK_INDEX_PATH}")
+
+    def encoded_batches(self, rows, batch_size, workers):
+        """
+        Yield (rows, vectors) for consecutive batches of rows, in id order.
+        With workers, up to two batches per worker are encoded ahead of the writer.
+        """
+        batches = self.batches(rows, batch_size)
+        if workers <= 0:
+            for batch, texts in batches:
+                yield batch, encode_batch(texts)
+            return
+
+        threads = max((os.cpu_count() or 1) // workers, 1)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'),
+                                 initializer=init_worker, initargs=(threads,)) as pool:
+            pending = deque()
+            for batch, texts in batches:
+                pending.append((batch, pool.submit(encode_batch, texts)))
+                if len(pending) >= workers * 2:
+                    batch, future = pending.popleft()
+                    yield batch, future.result()
+            while pending:
+                batch, future = pending.popleft()
+                yield batch, future.result()
+
+    @staticmethod
+    def batches(rows, batch_size):
+        batch, texts = [], []
+        for task_id, title, description in rows:
+            batch.append((task_id, title, description))
+            texts.append(title + ' ' + description)
+            if len(batch) >= batch_size:
+                yield batch, texts
+                batch, texts = [], []
+        if batch:
+            yield batch, texts
+
+    @staticmethod
+    def write_batch(rows, vectors):
+        """
+        Write a batch of vectors with queryset updates, which send no signals, then invalidate the
+        cached searches over the written tasks and the indexes built before them.
+
+        Like process_pending_embeddings, a vector is only written if the task's title and description
+        are unchanged since its row was read, so a task edited meanwhile keeps the vector (or pending
+        flag) of its new text.
+
+        :param rows: (id, title, description) tuples the vectors were computed from.
+        :return: Number of tasks whose vector was written.
+        """
+        written = []
+        now = timezone.now()
+        with transaction.atomic():
+            for (task_id, title, description), vector in zip(rows, vectors):
+                task = Task(id=task_id)
+                task.vector_representation = vector
+                task.embedding_pending = False
+                task.updated_at = now
+                if Task.objects.filter(pk=task_id, title=title, description=description).update(
+                        **{field: getattr(task, field) for field in VECTOR_FIELDS}):
+                    written.append(task_id)
+        if written:
+            bump_tasks_version(Task.objects.filter(id__in=written).values_list('owner_id', flat=True).distinct(),
+                               written)
+        return len(written)
+
+    @staticmethod
+    def read_checkpoint(path):
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    @staticmethod
+    def write_checkpoint(path, state):
+        # Write to a temporary file and rename so a crash never leaves a truncated checkpoint
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from tasks.index import train_ivf_centroids, save_ivf_centroids
+import time
+
+
+class Command(BaseCommand):
+    help = ("Retrain the k-means centroids of the IVF vector index (TASK_INDEX_TYPE='ivf') on the stored "
+            "task vectors and save them to TASK_IVF_CENTROIDS_PATH. Workers use them from their next index build.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nlist', type=int, default=None, help="Number of cells (default: TASK_IVF_NLIST).")
+        parser.add_argument('--sample', type=int, default=None,
+                            help="Number of task vectors to train on (default: TASK_INDEX_TRAIN_SIZE).")
+        parser.add_argument('--iterations', type=int, default=20, help="Number of k-means iterations.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        centroids = train_ivf_centroids(options['nlist'], options['sample'], options['iterations'])
+        if centroids is None:
+            self.stdout.write("No task vectors to train on.")
+            return
+        save_ivf_centroids(centroids)
+        self.stdout.write(self.style.SUCCESS(
+            f"Trained {len(centroids)} centroids in {time.monotonic() - started:.1f}s "
+            f"and saved them to {settings.TASK_IVF_CENTROIDS_PATH}"
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from tasks.utils import get_model_source, warmup_model
+
+
+class Command(BaseCommand):
+    help = ("Load the embedding model and run a dummy encode, e.g. in a container build step to populate "
+            "the model cache, or to check that TASK_EMBEDDING_MODEL_PATH can be loaded offline.")
+
+    def handle(self, *args, **options):
+        elapsed = warmup_model()
+        self.stdout.write(self.style.SUCCESS(f"Loaded and warmed up {get_model_source()} in {elapsed:.1f}s"))
@@ -0,0 +1,173 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from django.conf import settings
+import os
+import threading
+import time
+
+# Upper bounds (seconds) of the latency histogram buckets, from 100 us to 10 s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0, 10.0)
+# Upper bounds of the encode batch size histogram buckets
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+def metrics_enabled():
+    return getattr(settings, 'TASK_METRICS_ENABLED', True)
+
+
+class Metric:
+    """
+    A named family of time series, one per combination of label values, in this process.
+    """
+    type = None
+
+    def __init__(self, name, help_text, labels=()):
+        """
+        :param name: Prometheus metric name.
+        :param help_text: Description rendered as the metric's HELP line.
+        :param labels: Names of the labels distinguishing the series.
+        """
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def label_values(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labels)
+
+    def format_labels(self, values, extra=()):
+        pairs = list(zip(self.labels, values)) + list(extra)
+        if not pairs:
+            return ''
+        escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+        return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Counter(Metric):
+    """
+    Monotonic counter, e.g. of requests or cache hits.
+    """
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if not metrics_enabled():
+            return
+        key = self.label_values(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            series = dict(self._series)
+        for values, count in sorted(series.items()):
+            yield f'{self.name}{self.format_labels(values)} {count}'
+
+    def snapshot(self):
+        with self._lock:
+            return [{'labels': dict(zip(self.labels, values)), 'value': count}
+                    for values, count in sorted(self._series.items())]
+
+
+class Histogram(Metric):
+    """
+    Histogram of observed values (e.g. durations in seconds) over fixed buckets, with their
+    count and sum. Observing costs one bisect and a few additions under a lock.
+    """
+    type = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        if not metrics_enabled():
+            return
+        key = self.label_values(labels)
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), count, sum
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+            series[0][position] += 1
+            series[1] += 1
+            series[2] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observe the wall-clock duration of the block, in seconds.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _copy(self):
+        with self._lock:
+            return {values: (list(counts), count, total) for values, (counts, count, total) in self._series.items()}
+
+    def samples(self):
+        for values, (counts, count, total) in sorted(self._copy().items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                le = bound if isinstance(bound, str) else repr(float(bound))
+                yield f'{self.name}_bucket{self.format_labels(values, [("le", le)])} {cumulative}'
+            yield f'{self.name}_count{self.format_labels(values)} {count}'
+            yield f'{self.name}_sum{self.format_labels(values)} {total}'
+
+    def snapshot(self):
+        return [{'labels': dict(zip(self.labels, values)), 'count': count, 'sum': total,
+                 'mean': total / count if count else None,
+                 'buckets': dict(zip([str(bound) for bound in self.buckets] + ['+Inf'], counts))}
+                for values, (counts, count, total) in sorted(self._copy().items())]
+
+
+ENCODE_SECONDS = Histogram('task_encode_seconds', "Time spent encoding texts that missed the embedding cache.",
+                           labels=('kind',))
+ENCODE_BATCH_SIZE = Histogram('task_encode_batch_size', "Number of texts per encode call.", labels=('kind',),
+                              buckets=BATCH_SIZE_BUCKETS)
+DB_FETCH_SECONDS = Histogram('task_db_fetch_seconds', "Time spent fetching tasks and vectors from the database.",
+                             labels=('operation',))
+SIMILARITY_SECONDS = Histogram('task_similarity_seconds', "Time spent scoring and ranking vectors against a query.",
+                               labels=('index',))
+SERIALIZATION_SECONDS = Histogram('task_serialization_seconds', "Time spent serializing tasks for a response.",
+                                  labels=('serializer',))
+REQUEST_SECONDS = Histogram('task_http_request_seconds', "Latency of HTTP requests by endpoint.",
+                            labels=('endpoint', 'method', 'status'))
+REQUESTS = Counter('task_http_requests_total', "HTTP requests by endpoint.", labels=('endpoint', 'method', 'status'))
+
+REGISTRY = [ENCODE_SECONDS, ENCODE_BATCH_SIZE, DB_FETCH_SECONDS, SIMILARITY_SECONDS, SERIALIZATION_SECONDS,
+            REQUEST_SECONDS, REQUESTS]
+
+
+def render_prometheus():
+    """
+    Render every metric of this process in the Prometheus text exposition format (version 0.0.4).
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f'# HELP {metric.name} {metric.help_text}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+def snapshot():
+    """
+    Every metric of this process as a JSON-serializable dict, for dumping on demand.
+    """
+    return {'pid': os.getpid(), 'metrics': {metric.name: metric.snapshot() for metric in REGISTRY}}
+
+
+def reset_metrics():
+    for metric in REGISTRY:
+        metric.reset()
@@ -0,0 +1,51 @@
+from .metrics import REQUEST_SECONDS, REQUESTS
+from asgiref.sync import iscoroutinefunction
+from django.utils.decorators import sync_and_async_middleware
+import time
+
+# Methods recorded as their own label value; any other (client-chosen) method is counted as 'other',
+# so arbitrary methods cannot create an unbounded number of time series
+KNOWN_METHODS = frozenset(['GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'TRACE', 'CONNECT'])
+
+
+def endpoint_name(request):
+    """
+    The route a request resolved to (e.g. 'task-search-tasks'), so latencies are grouped
+    per endpoint rather than per URL; 'unmatched' for 404s outside any route.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route
+
+
+def method_name(request):
+    return request.method if request.method in KNOWN_METHODS else 'other'
+
+
+def observe(request, response, started):
+    labels = {'endpoint': endpoint_name(request), 'method': method_name(request), 'status': response.status_code}
+    REQUEST_SECONDS.observe(time.perf_counter() - started, **labels)
+    REQUESTS.inc(**labels)
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """
+    Record the latency and count of every request per endpoint, method and status code.
+    Works in both sync and async mode, so the async views are not forced onto a thread.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            started = time.perf_counter()
+            response = await get_response(request)
+            observe(request, response, started)
+            return response
+    else:
+        def middleware(request):
+            started = time.perf_counter()
+            response = get_response(request)
+            observe(request, response, started)
+            return response
+
+    return middleware
@@ -0,0 +1,76 @@
+import numpy as np
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def pack_json_vectors(apps, schema_editor):
+    """
+    Backfill vector_blob/vector_norm from the JSON vector of every existing task.
+    """
+    Task = apps.get_model('tasks', 'Task')
+    batch = []
+    for task in Task.objects.exclude(vector_representation=None).only('id', 'vector_representation').iterator(
+            chunk_size=BATCH_SIZE):
+        vector = np.asarray(task.vector_representation, dtype=np.float32).ravel()
+        norm = float(np.linalg.norm(vector))
+        if vector.size == 0 or norm == 0:
+            continue
+        task.vector_blob = (vector / norm).tobytes()
+        task.vector_norm = norm
+        task.vector_dtype = 'float32'
+        batch.append(task)
+        if len(batch) >= BATCH_SIZE:
+            Task.objects.bulk_update(batch, ['vector_blob', 'vector_norm', 'vector_dtype'])
+            batch = []
+    if batch:
+        Task.objects.bulk_update(batch, ['vector_blob', 'vector_norm', 'vector_dtype'])
+
+
+def unpack_json_vectors(apps, schema_editor):
+    """
+    Restore the JSON vector of every task from its packed binary vector.
+    """
+    Task = apps.get_model('tasks', 'Task')
+    dtypes = {'float32': np.float32, 'float16': np.float16}
+    batch = []
+    for task in Task.objects.exclude(vector_blob=None).only('id', 'vector_blob', 'vector_norm', 'vector_dtype').iterator(
+            chunk_size=BATCH_SIZE):
+        vector = np.frombuffer(bytes(task.vector_blob), dtype=dtypes[task.vector_dtype]).astype(np.float32)
+        task.vector_representation = (vector * task.vector_norm).tolist()
+        batch.append(task)
+        if len(batch) >= BATCH_SIZE:
+            Task.objects.bulk_update(batch, ['vector_representation'])
+            batch = []
+    if batch:
+        Task.objects.bulk_update(batch, ['vector_representation'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='vector_blob',
+            field=models.BinaryField(blank=True, help_text='L2-normalized vector representation of the task, packed as binary.', null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='vector_norm',
+            field=models.FloatField(blank=True, help_text='L2 norm of the original vector representation.', null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='vector_dtype',
+            field=models.CharField(blank=True, help_text='Precision of the packed vector (float32 or float16).', max_length=8, null=True),
+        ),
+        migrations.RunPython(pack_json_vectors, unpack_json_vectors),
+        migrations.RemoveField(
+            model_name='task',
+            name='vector_representation',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0002_task_vector_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='embedding_pending',
+            field=models.BooleanField(db_index=True, default=False, help_text='Whether the vector representation is waiting to be generated by the background embedding worker.'),
+        ),
+    ]
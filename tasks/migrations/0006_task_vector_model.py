@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def tag_existing_vectors(apps, schema_editor):
+    """
+    Vectors stored so far were all produced by the sentence-transformers model TASK_EMBEDDING_MODEL.
+    """
+    Task = apps.get_model('tasks', 'Task')
+    Task.objects.exclude(vector_blob=None).update(
+        vector_model=getattr(settings, 'TASK_EMBEDDING_MODEL', 'all-MiniLM-L6-v2'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0005_task_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='vector_model',
+            field=models.CharField(blank=True, db_index=True, help_text='Name of the encoder that produced the vector representation.', max_length=100, null=True),
+        ),
+        migrations.RunPython(tag_existing_vectors, migrations.RunPython.noop),
+    ]
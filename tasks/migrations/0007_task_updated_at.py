@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:35
+
+from django.conf import settings
+from django.db import migrations, models
+import importlib
+
+# Adding a column rebuilds tasks_task on SQLite, which drops the full-text index's triggers:
+# drop the index first and recreate (and rebuild) it afterwards
+fts = importlib.import_module('tasks.migrations.0004_task_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0006_task_vector_model'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(fts.drop_fts, fts.create_fts),
+        migrations.AddField(
+            model_name='task',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, help_text='When the task or its vector representation was last written.'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['updated_at', 'id'], name='tasks_task_updated_id'),
+        ),
+        migrations.RunPython(fts.create_fts, fts.drop_fts),
+    ]
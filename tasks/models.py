@@ -1,14 +1,14 @@
 from .logger import setup_logger
 from .exception import AppException
-from django.db import models
+from django.db import models, transaction
 from dirtyfields import DirtyFieldsMixin
 from django.conf import settings
 from django.utils import timezone
 from django.core.exceptions import ValidationError
-from .utils import get_model
+from .utils import get_model_name, pack_vector, unpack_vector
+from .embeddings import encode_text
 
-logger = setup_logger()
-model = get_model()
+logger = setup_logger(__name__)
 
 
 class Task(DirtyFieldsMixin, models.Model):
@@ -28,12 +28,31 @@ class Task(DirtyFieldsMixin, models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING',
                               help_text="Current status of the task.")
     deadline = models.DateTimeField(help_text="Deadline for task completion.")
-    vector_representation = models.JSONField(null=True, blank=True,
-                                             help_text="Vector representation of the task for search functionality.")
+    vector_blob = models.BinaryField(null=True, blank=True,
+                                     help_text="L2-normalized vector representation of the task, packed as binary.")
+    vector_norm = models.FloatField(null=True, blank=True, help_text="L2 norm of the original vector representation.")
+    vector_dtype = models.CharField(max_length=8, null=True, blank=True,
+                                    help_text="Precision of the packed vector (float32 or float16).")
+    vector_model = models.CharField(max_length=100, null=True, blank=True, db_index=True,
+                                    help_text="Name of the encoder that produced the vector representation.")
+    embedding_pending = models.BooleanField(default=False, db_index=True,
+                                            help_text="Whether the vector representation is waiting to be "
+                                                      "generated by the background embedding worker.")
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, help_text="User who owns this task.")
+    updated_at = models.DateTimeField(auto_now=True,
+                                      help_text="When the task or its vector representation was last written.")
 
     class Meta:
-        ordering = ['deadline']
+        # The id breaks ties between equal deadlines, so pages of the list are stable
+        ordering = ['deadline', 'id']
+        indexes = [
+            # Ordered list and keyset pagination (see pagination.TaskCursorPagination)
+            models.Index(fields=['deadline', 'id'], name='tasks_task_deadline_id'),
+            # Owner, status and deadline filters of searches
+            models.Index(fields=['owner', 'status', 'deadline'], name='tasks_task_owner_status_dl'),
+            # Incremental export of the tasks changed since a point in time (see export.TaskExport)
+            models.Index(fields=['updated_at', 'id'], name='tasks_task_updated_id'),
+        ]
 
     def __str__(self):
         """
@@ -41,15 +60,74 @@ class Task(DirtyFieldsMixin, models.Model):
         """
         return self.title
 
+    @property
+    def vector_representation(self):
+        """
+        The vector representation of the task as a list of floats, rebuilt from
+        the packed normalized vector and its norm. None if no vector is stored.
+        """
+        vector = self.normalized_vector
+        if vector is None:
+            return None
+        return (vector * self.vector_norm).tolist()
+
+    @vector_representation.setter
+    def vector_representation(self, vector):
+        """
+        Packs a vector into vector_blob/vector_norm using the configured TASK_VECTOR_DTYPE and
+        tags it with the configured encoder, which produced it.
+        """
+        dtype = getattr(settings, 'TASK_VECTOR_DTYPE', 'float32')
+        self.vector_blob, self.vector_norm = pack_vector(vector, dtype)
+        self.vector_dtype = dtype if self.vector_blob is not None else None
+        self.vector_model = get_model_name() if self.vector_blob is not None else None
+
+    @property
+    def normalized_vector(self):
+        """
+        The stored unit-length vector as a float32 NumPy array, or None.
+        """
+        if self.vector_blob is None:
+            return None
+        return unpack_vector(bytes(self.vector_blob), self.vector_dtype)
+
+    @property
+    def embedding_text(self):
+        """
+        The text the vector representation is generated from.
+        """
+        return self.title + ' ' + self.description
+
     def save(self, *args, **kwargs):
         """
         Overridden save method to generate a vector representation
         whenever a task is created or its title or description is modified.
+
+        With TASK_EMBEDDING_MODE = 'async' the task is saved immediately and marked as
+        pending instead; the background embedding worker generates the vector later.
         """
-        if not self.pk or 'title' in self.get_dirty_fields() or 'description' in self.get_dirty_fields():
-            self.vector_representation = self.generate_vector_representation()
+        text_changed = not self.pk or 'title' in self.get_dirty_fields() or 'description' in self.get_dirty_fields()
+        if text_changed and self.__dict__.get('_embedded_text') != self.embedding_text:
+            if getattr(settings, 'TASK_EMBEDDING_MODE', 'sync') == 'async':
+                self.embedding_pending = True
+            else:
+                self.vector_representation = self.generate_vector_representation()
+                self.embedding_pending = False
         super().save(*args, **kwargs)
 
+        if self.embedding_pending:
+            from .embedding_worker import wake_embedding_worker
+            transaction.on_commit(wake_embedding_worker)
+
+    def set_embedding(self, vector):
+        """
+        Store a vector generated elsewhere (e.g. on an encoder thread) for the current
+        title and description, so that save() does not encode them again.
+        """
+        self.vector_representation = vector
+        self.embedding_pending = False
+        self._embedded_text = self.embedding_text
+
     def clean(self):
         """
         Custom validation method to ensure the deadline is not set in the past.
@@ -63,10 +141,8 @@ class Task(DirtyFieldsMixin, models.Model):
         Used for searching tasks based on text similarity.
         """
         logger.info(f"Generating vector representation for Task: {self.title}")
-        combined_text = self.title + ' ' + self.description
         try:
-            vector = model.encode(combined_text)
-            return vector.tolist()
+            return encode_text(self.embedding_text)
         except Exception as e:
             logger.error(f"Error in generating vector representation for Task: {self.title}: {e}")
             raise AppException(str(e))
@@ -0,0 +1,210 @@
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+import base64
+import json
+
+COUNT_MODES = ['exact', 'estimate']
+
+
+def use_cursor_pagination(request):
+    """
+    Returns True if a request is paginated with cursors: always with TASK_PAGINATION = 'cursor',
+    otherwise when the client opts in with a 'cursor' query parameter (empty for the first page).
+    """
+    return (getattr(settings, 'TASK_PAGINATION', 'page') == 'cursor'
+            or 'cursor' in request.query_params)
+
+
+def estimate_row_count(model):
+    """
+    Estimate the number of rows of a model's table without scanning it.
+
+    SQLite uses the row count recorded by ANALYZE in sqlite_stat1, or the rowid span of the table;
+    PostgreSQL uses the planner's reltuples. Other databases fall back to an exact count.
+    """
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone():
+                cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+                row = cursor.fetchone()
+                if row:
+                    return int(row[0].split()[0])
+            # MIN and MAX of the rowid are single B-tree lookups; gaps left by deletes overestimate
+            cursor.execute(f'SELECT MAX(rowid) - MIN(rowid) + 1 FROM "{table}"')
+            return cursor.fetchone()[0] or 0
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+            row = cursor.fetchone()
+            if row and row[0] >= 0:
+                return row[0]
+    return model._default_manager.count()
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination by the position of the last (or first) item of a page rather than an offset,
+    so every page costs the same as the first. Cursors are opaque, URL-safe encodings of the sort
+    key of that item and the direction to read in; subclasses define the sort key and how the
+    items after or before a key are selected.
+    """
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self):
+        self.page_size = getattr(settings, 'REST_FRAMEWORK', {}).get('PAGE_SIZE') or 10
+        self.count = None
+        self.next_key = self.previous_key = None
+
+    def sort_key(self, item):
+        raise NotImplementedError
+
+    def encode_key(self, key):
+        return list(key)
+
+    def decode_key(self, values):
+        return tuple(values)
+
+    def encode_cursor(self, key, reverse):
+        payload = json.dumps({'k': self.encode_key(key), 'r': int(reverse)}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request):
+        """
+        :return: (key, reverse) of the cursor of a request, or (None, False) for the first page.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)))
+            return self.decode_key(payload['k']), bool(payload['r'])
+        except (TypeError, ValueError, KeyError, IndexError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate(self, items, key, reverse):
+        """
+        Select a page from items ordered for the direction of the cursor (descending sort
+        key when reading backwards) and set the keys of the next and previous pages.
+
+        :param items: Iterable of up to page_size + 1 items following the cursor.
+        """
+        items = list(items)
+        has_more = len(items) > self.page_size
+        page = items[:self.page_size]
+        if reverse:
+            page.reverse()
+        if page:
+            has_next, has_previous = (True, has_more) if reverse else (has_more, key is not None)
+            self.next_key = self.sort_key(page[-1]) if has_next else None
+            self.previous_key = self.sort_key(page[0]) if has_previous else None
+        return page
+
+    def get_link(self, key, reverse):
+        if key is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(key, reverse))
+
+    def get_paginated_response(self, data):
+        response = {'next': self.get_link(self.next_key, False),
+                    'previous': self.get_link(self.previous_key, True),
+                    'results': data}
+        if self.count is not None:
+            response = {'count': self.count, **response}
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {'type': 'integer'},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class TaskCursorPagination(KeysetPagination):
+    """
+    Keyset pagination of task querysets by (deadline, id), served by the tasks_task_deadline_id
+    index: each page is a range scan starting at the cursor, with no OFFSET.
+
+    The total is left out by default; ?count=exact adds a COUNT(*) and ?count=estimate adds
+    the database's row estimate (see estimate_row_count).
+    """
+    ordering = ('deadline', 'id')
+
+    def sort_key(self, task):
+        return task.deadline, task.pk
+
+    def encode_key(self, key):
+        return [key[0].isoformat(), key[1]]
+
+    def decode_key(self, values):
+        deadline, task_id = parse_datetime(values[0]), int(values[1])
+        if deadline is None:
+            raise ValueError(values[0])
+        return deadline, task_id
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # The total is only computed for the page it was requested on, not for the pages linked from it
+        self.base_url = remove_query_param(request.build_absolute_uri(), self.count_query_param)
+        key, reverse = self.decode_cursor(request)
+
+        count_mode = request.query_params.get(self.count_query_param)
+        if count_mode == 'exact':
+            self.count = queryset.count()
+        elif count_mode == 'estimate':
+            self.count = estimate_row_count(queryset.model) if not queryset.query.has_filters() \
+                else queryset.count()
+        elif count_mode is not None:
+            raise ValidationError({self.count_query_param: f"Expected one of {', '.join(COUNT_MODES)}."})
+
+        if key is not None:
+            deadline, task_id = key
+            # The redundant bound on the deadline alone lets the database seek into the index
+            if reverse:
+                queryset = queryset.filter(Q(deadline__lt=deadline) | Q(deadline=deadline, pk__lt=task_id),
+                                           deadline__lte=deadline)
+            else:
+                queryset = queryset.filter(Q(deadline__gt=deadline) | Q(deadline=deadline, pk__gt=task_id),
+                                           deadline__gte=deadline)
+        ordering = [f'-{field}' for field in self.ordering] if reverse else self.ordering
+        return self.paginate(queryset.order_by(*ordering)[:self.page_size + 1], key, reverse)
+
+
+class RankedCursorPagination(KeysetPagination):
+    """
+    Keyset pagination of ranked search hits, (task_id, score) tuples, by descending score and
+    ascending id. A cursor resumes after the last hit of the previous page by its score, so
+    pages stay consistent while tasks are added or re-ranked between requests. The total
+    number of hits is always known and included.
+    """
+    def sort_key(self, hit):
+        return -hit[1], hit[0]
+
+    def decode_key(self, values):
+        return float(values[0]), int(values[1])
+
+    def paginate_queryset(self, hits, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        key, reverse = self.decode_cursor(request)
+        self.count = len(hits)
+
+        hits = sorted(hits, key=self.sort_key, reverse=reverse)
+        if key is not None:
+            if reverse:
+                hits = [hit for hit in hits if self.sort_key(hit) < key]
+            else:
+                hits = [hit for hit in hits if self.sort_key(hit) > key]
+        return self.paginate(hits[:self.page_size + 1], key, reverse)
@@ -0,0 +1,177 @@
+from .exception import AppException
+import numpy as np
+
+# Rows scored per chunk when decoding compressed codes, to bound temporary memory
+SCORE_CHUNK_ROWS = 65536
+
+
+def kmeans(data, n_clusters, n_iter=20, seed=0):
+    """
+    Lloyd's k-means on the rows of a float32 matrix.
+
+    Centroids are initialized from distinct random rows; a centroid that loses
+    all of its points is re-seeded from a random row.
+
+    :param data: Array of shape (n, d).
+    :param n_clusters: Number of centroids, clipped to the number of rows.
+    :param n_iter: Number of assignment/update iterations.
+    :param seed: Seed for the random initialization.
+    :return: Tuple of (centroids of shape (k, d), assignments of shape (n,)).
+    """
+    data = np.ascontiguousarray(data, dtype=np.float32)
+    if data.shape[0] == 0:
+        raise AppException("Cannot run k-means without training data.")
+    rng = np.random.default_rng(seed)
+    n_clusters = min(int(n_clusters), data.shape[0])
+    centroids = data[rng.choice(data.shape[0], n_clusters, replace=False)].copy()
+    assignments = np.zeros(data.shape[0], dtype=np.int64)
+
+    for _ in range(n_iter):
+        assignments = assign(data, centroids)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        empty = counts == 0
+        # Sum the points of each cluster with one reduceat over the rows sorted by cluster
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        sums = np.add.reduceat(data[np.argsort(assignments, kind='stable')], starts[~empty], axis=0)
+        centroids[~empty] = sums / counts[~empty, None]
+        if empty.any():
+            centroids[empty] = data[rng.choice(data.shape[0], int(empty.sum()))]
+
+    return centroids, assign(data, centroids)
+
+
+def assign(data, centroids):
+    """
+    Index of the nearest centroid (squared Euclidean distance) for each row of data.
+    """
+    data = np.atleast_2d(data)
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    assignments = np.empty(data.shape[0], dtype=np.int64)
+    for start in range(0, data.shape[0], SCORE_CHUNK_ROWS):
+        chunk = data[start:start + SCORE_CHUNK_ROWS]
+        distances = centroid_norms[None, :] - 2 * chunk @ centroids.T
+        assignments[start:start + len(chunk)] = distances.argmin(axis=1)
+    return assignments
+
+
+class ScalarQuantizer:
+    """
+    Per-dimension int8 scalar quantizer.
+
+    Each component is mapped linearly from its trained [min, max] range onto the
+    256 int8 levels, cutting a float32 vector to a quarter of its size. Inner
+    products with a float query are computed directly on the codes.
+    """
+    name = 'int8'
+    code_dtype = np.int8
+
+    def __init__(self, dim):
+        self.dim = dim
+        # Components of unit vectors lie in [-1, 1]; used until trained on real data
+        self.vmin = np.full(dim, -1.0, dtype=np.float32)
+        self.scale = np.full(dim, 2.0 / 255, dtype=np.float32)
+
+    @property
+    def code_shape(self):
+        return (self.dim,)
+
+    @property
+    def is_trained(self):
+        return True
+
+    def train(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(vectors) == 0:
+            return self
+        self.vmin = vectors.min(axis=0)
+        self.scale = np.maximum(vectors.max(axis=0) - self.vmin, 1e-6) / 255
+        return self
+
+    def encode(self, vectors):
+        levels = np.rint((np.atleast_2d(vectors) - self.vmin) / self.scale)
+        return (np.clip(levels, 0, 255) - 128).astype(np.int8)
+
+    def decode(self, codes):
+        return (codes.astype(np.float32) + 128) * self.scale + self.vmin
+
+    def scores(self, codes, query):
+        """
+        Approximate inner products between a query and every row of codes.
+        """
+        weights = query * self.scale
+        offset = float(query @ self.vmin + 128 * weights.sum())
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_CHUNK_ROWS):
+            chunk = codes[start:start + SCORE_CHUNK_ROWS]
+            scores[start:start + len(chunk)] = chunk.astype(np.float32) @ weights + offset
+        return scores
+
+    def memory_bytes(self):
+        return self.vmin.nbytes + self.scale.nbytes
+
+
+class ProductQuantizer:
+    """
+    Product quantizer with 8-bit codes.
+
+    Vectors are split into m contiguous subvectors and each subvector is replaced
+    by the index of its nearest centroid in a per-subspace codebook of up to 256
+    centroids trained with k-means. A query is scored against every code through
+    an m x 256 lookup table of subvector inner products (asymmetric distance).
+    """
+    name = 'pq'
+    code_dtype = np.uint8
+
+    def __init__(self, dim, m=96, n_iter=20):
+        if dim % m:
+            raise AppException(f"Vector dimension {dim} is not divisible by {m} PQ subspaces.")
+        self.dim = dim
+        self.m = m
+        self.dsub = dim // m
+        self.n_iter = n_iter
+        self.codebooks = None
+
+    @property
+    def code_shape(self):
+        return (self.m,)
+
+    @property
+    def is_trained(self):
+        return self.codebooks is not None
+
+    def _split(self, vectors):
+        return np.atleast_2d(vectors).reshape(-1, self.m, self.dsub)
+
+    def train(self, vectors):
+        subvectors = self._split(np.asarray(vectors, dtype=np.float32))
+        if len(subvectors) == 0:
+            raise AppException("Cannot train a product quantizer without training data.")
+        ksub = min(256, len(subvectors))
+        self.codebooks = np.stack([kmeans(subvectors[:, j], ksub, self.n_iter, seed=j)[0]
+                                   for j in range(self.m)])
+        return self
+
+    def encode(self, vectors):
+        subvectors = self._split(np.asarray(vectors, dtype=np.float32))
+        codes = np.empty((len(subvectors), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            codes[:, j] = assign(subvectors[:, j], self.codebooks[j])
+        return codes
+
+    def decode(self, codes):
+        return np.concatenate([self.codebooks[j][codes[:, j]] for j in range(self.m)], axis=1)
+
+    def scores(self, codes, query):
+        """
+        Approximate inner products between a query and every row of codes.
+        """
+        lookup = np.einsum('jkd,jd->jk', self.codebooks, query.reshape(self.m, self.dsub))
+        subspaces = np.arange(self.m)
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_CHUNK_ROWS):
+            chunk = codes[start:start + SCORE_CHUNK_ROWS]
+            scores[start:start + len(chunk)] = lookup[subspaces, chunk].sum(axis=1)
+        return scores
+
+    def memory_bytes(self):
+        return self.codebooks.nbytes if self.codebooks is not None else 0
@@ -0,0 +1,31 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+from contextlib import ExitStack
+from . import utils
+from .logger import log_files_in
+import os
+import tempfile
+
+# Encoder the tests run with: deterministic, lexical and free of model downloads
+TEST_ENCODER = 'hashing'
+
+
+class TaskTestRunner(DiscoverRunner):
+    """
+    Test runner (settings.TEST_RUNNER) that makes test runs independent of the deployment's settings:
+    every test uses the hashing encoder unless it overrides TASK_ENCODER, whatever TASK_ENCODER is
+    configured, and the Django and tasks logs go to the system temp directory instead of LOG_ROOT.
+    """
+    log_dir = os.path.join(tempfile.gettempdir(), 'taskvectorapi', 'test-logs')
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._environment = ExitStack()
+        self._environment.enter_context(log_files_in(self.log_dir))
+        self._environment.enter_context(override_settings(TASK_ENCODER=TEST_ENCODER))
+        self._environment.callback(setattr, utils, 'model', utils.model)
+        utils.model = None
+
+    def teardown_test_environment(self, **kwargs):
+        self._environment.close()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,167 @@
+from .logger import setup_logger
+from .index import fetch_exact_vectors
+from .metrics import DB_FETCH_SECONDS, SIMILARITY_SECONDS
+from django.conf import settings
+from django.db import connection
+from datetime import datetime, timezone
+import re
+import numpy as np
+
+logger = setup_logger(__name__)
+
+FTS_TABLE = 'tasks_task_fts'
+SEARCH_MODES = ['vector', 'hybrid', 'keyword']
+_fts_available = None
+
+# Runs of letters/digits, optionally joined by '-', '_' or '.', e.g. "JIRA-1234" or "E_CONN.42"
+TERM_RE = re.compile(r"\w+(?:[-_.]\w+)*")
+
+
+def fts_available():
+    """
+    Returns True if the FTS5 task index created by migration 0004 exists (SQLite only).
+    """
+    global _fts_available
+
+    if _fts_available is None:
+        _fts_available = connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names()
+    return _fts_available
+
+
+def build_match_query(text):
+    """
+    Build an FTS5 MATCH expression matching any term of free text.
+    Each term is quoted, so punctuation and FTS5 operators in the input are matched literally.
+
+    :return: The expression, or None if the text has no searchable terms.
+    """
+    terms = list(dict.fromkeys(term.lower() for term in TERM_RE.findall(text)))
+    if not terms:
+        return None
+    return ' OR '.join(f'"{term}"' for term in terms)
+
+
+def adapt_timestamp(timestamp):
+    return connection.ops.adapt_datetimefield_value(datetime.fromtimestamp(timestamp, tz=timezone.utc))
+
+
+def lexical_search(text, limit, filters=None):
+    """
+    Find tasks matching the terms of a text with the FTS5 index, ranked by BM25.
+
+    :param text: Free-text query.
+    :param limit: Maximum number of matches.
+    :param filters: Optional SearchFilter applied in the same query.
+    :return: List of (task_id, score) tuples, best first; scores are positive BM25 relevance.
+    """
+    match = build_match_query(text)
+    if match is None:
+        return []
+
+    conditions, params = [f"{FTS_TABLE} MATCH %s"], [match]
+    if filters:
+        if filters.owner_id is not None:
+            conditions.append("t.owner_id = %s")
+            params.append(filters.owner_id)
+        if filters.status_values:
+            conditions.append(f"t.status IN ({', '.join(['%s'] * len(filters.status_values))})")
+            params.extend(filters.status_values)
+        if filters.deadline_after is not None:
+            conditions.append("t.deadline >= %s")
+            params.append(adapt_timestamp(filters.deadline_after))
+        if filters.deadline_before is not None:
+            conditions.append("t.deadline <= %s")
+            params.append(adapt_timestamp(filters.deadline_before))
+    params.append(limit)
+
+    with DB_FETCH_SECONDS.time(operation='fts'), connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT f.rowid, bm25({FTS_TABLE}) FROM {FTS_TABLE} f JOIN tasks_task t ON t.id = f.rowid "
+            f"WHERE {' AND '.join(conditions)} ORDER BY bm25({FTS_TABLE}) LIMIT %s",
+            params,
+        )
+        # FTS5's bm25() is lower for better matches
+        return [(task_id, -score) for task_id, score in cursor.fetchall()]
+
+
+def reciprocal_rank_fusion(rankings, k=None, rrf_k=None):
+    """
+    Fuse several rankings of the same tasks with reciprocal rank fusion:
+    each task scores the sum of 1 / (rrf_k + rank) over the rankings it appears in.
+
+    :param rankings: Lists of (task_id, score) tuples, each ordered best first.
+    :param k: Number of fused hits to return; None returns all.
+    :param rrf_k: Rank offset damping the weight of the top ranks (TASK_SEARCH_RRF_K).
+    :return: List of (task_id, fused score) tuples, best first.
+    """
+    rrf_k = getattr(settings, 'TASK_SEARCH_RRF_K', 60) if rrf_k is None else rrf_k
+    fused = {}
+    for ranking in rankings:
+        for rank, (task_id, _) in enumerate(ranking, start=1):
+            fused[task_id] = fused.get(task_id, 0.0) + 1.0 / (rrf_k + rank)
+    hits = sorted(fused.items(), key=lambda hit: hit[1], reverse=True)
+    return hits if k is None else hits[:k]
+
+
+def rerank_candidates(candidates, query_vector, vectors):
+    """
+    Rank lexical candidates by the cosine similarity of their stored vectors to the query.
+    Candidates without a vector (e.g. still pending) are left out of this ranking.
+
+    :param candidates: List of (task_id, score) tuples.
+    :param query_vector: Query embedding.
+    :param vectors: Dict mapping task id to normalized vector, from fetch_exact_vectors.
+    :return: List of (task_id, similarity) tuples, best first.
+    """
+    ids = [task_id for task_id, _ in candidates if vectors.get(task_id) is not None]
+    if not ids:
+        return []
+    with SIMILARITY_SECONDS.time(index='hybrid'):
+        query = np.asarray(query_vector, dtype=np.float32)
+        scores = np.stack([vectors[task_id] for task_id in ids]) @ (query / (np.linalg.norm(query) or 1.0))
+        order = np.argsort(-scores, kind='stable')
+    return [(ids[i], float(scores[i])) for i in order]
+
+
+def fuse_hybrid(lexical_hits, query_vector, vectors, k=None, min_score=None):
+    """
+    Fuse the BM25 ranking of lexical candidates with their vector similarity ranking.
+
+    The hits are ordered by reciprocal rank fusion but carry their cosine similarity, like those
+    of a vector search, so that `score` and min_score mean the same in every search mode.
+    Candidates without a vector have no similarity and are left out.
+
+    :param min_score: Candidates must have a cosine similarity above this value; None keeps all.
+    :return: List of (task_id, similarity) tuples in fused order.
+    """
+    similar = rerank_candidates(lexical_hits, query_vector, vectors)
+    if min_score is not None:
+        similar = [(task_id, score) for task_id, score in similar if score > min_score]
+    similarity = dict(similar)
+    hits = [(task_id, similarity[task_id]) for task_id, _ in reciprocal_rank_fusion([lexical_hits, similar])
+            if task_id in similarity]
+    return hits if k is None else hits[:k]
+
+
+def hybrid_candidate_limit(k=None):
+    """
+    Number of full-text candidates re-ranked by a hybrid search returning k hits.
+    """
+    return max(getattr(settings, 'TASK_SEARCH_HYBRID_CANDIDATES', 200), k or 0)
+
+
+def hybrid_search(text, query_vector, k=None, filters=None, min_score=None):
+    """
+    Hybrid search: FTS5 selects up to TASK_SEARCH_HYBRID_CANDIDATES candidates by BM25,
+    only their stored vectors are scored against the query, and the two rankings are
+    fused with reciprocal rank fusion.
+
+    :param min_score: Candidates must have a cosine similarity above this value; None keeps all.
+    :return: List of (task_id, cosine similarity) tuples, best first by fused rank, or None if no
+             task matches lexically and the caller should fall back to a vector search.
+    """
+    lexical_hits = lexical_search(text, hybrid_candidate_limit(k), filters)
+    if not lexical_hits:
+        return None
+    vectors = fetch_exact_vectors([task_id for task_id, _ in lexical_hits])
+    return fuse_hybrid(lexical_hits, query_vector, vectors, k, min_score)
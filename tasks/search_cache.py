@@ -0,0 +1,194 @@
+from .logger import setup_logger
+from .utils import get_model_name
+from django.conf import settings
+from django.core.cache import caches
+import hashlib
+import json
+import threading
+import time
+
+logger = setup_logger(__name__)
+search_cache = None
+
+GLOBAL_VERSION_KEY = 'tasks-version'
+# Ids of the tasks changed by each global version bump, for catching up in-memory indexes
+CHANGED_TASKS_TIMEOUT = 24 * 3600
+# Versions an index may be behind by and still catch up from the changed ids instead of being rebuilt
+MAX_CHANGES_BEHIND = 1000
+
+
+def owner_version_key(owner_id):
+    return f'tasks-version:owner:{owner_id}'
+
+
+def changed_tasks_key(version):
+    return f'tasks-changed:{version}'
+
+
+def normalize_query(query):
+    """
+    Collapse runs of whitespace and strip the ends, so trivially different spellings of a query share results.
+    """
+    return ' '.join(query.split())
+
+
+class SearchCache:
+    """
+    Cache of ranked search hits in a Django cache, keyed by the normalized query, search mode, k,
+    min_score and filters.
+
+    Entries never expire by time. Instead every key embeds a "tasks version": a counter bumped
+    whenever a task is saved or deleted (see bump_tasks_version). Searches filtered to one owner
+    use that owner's counter, so they stay cached while other users' tasks change; all other
+    searches use the global counter. Stale entries are never read again and are culled by the
+    cache's MAX_ENTRIES.
+    """
+    def __init__(self, cache_alias):
+        """
+        :param cache_alias: Alias in settings.CACHES holding the entries and the version counters.
+                            It must be shared by all workers (e.g. a database or Redis cache) for
+                            changes made in one process to invalidate the results cached by others.
+        """
+        self.cache_alias = cache_alias
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def get_version(self, owner_id=None):
+        """
+        Current tasks version, global or of one owner's partition.
+        """
+        key = GLOBAL_VERSION_KEY if owner_id is None else owner_version_key(owner_id)
+        version = self.cache.get(key)
+        if version is None:
+            # A fresh, time-based start (also after the counter was evicted) never matches a version
+            # used before, so entries cached under an earlier counter cannot be resurrected
+            self.cache.add(key, time.time_ns(), timeout=None)
+            version = self.cache.get(key)
+        return version
+
+    def bump(self, owner_ids=(), task_ids=None):
+        """
+        Invalidate the cached results of every search, or of only these owners' partitions
+        plus every search that is not filtered by owner.
+
+        :param task_ids: Ids of the changed tasks, recorded under the new global version so that
+                         other processes can catch up their indexes (see changed_task_ids).
+        :return: The new global tasks version.
+        """
+        versions = {}
+        for key in [GLOBAL_VERSION_KEY] + [owner_version_key(owner_id) for owner_id in set(owner_ids)]:
+            try:
+                versions[key] = self.cache.incr(key)
+            except ValueError:
+                self.cache.add(key, time.time_ns(), timeout=None)
+                versions[key] = self.cache.get(key)
+        version = versions[GLOBAL_VERSION_KEY]
+        if task_ids is not None:
+            self.cache.set(changed_tasks_key(version), sorted(set(task_ids)), timeout=CHANGED_TASKS_TIMEOUT)
+        return version
+
+    def changed_task_ids(self, since, until):
+        """
+        Ids of the tasks changed by the global versions after since, up to until.
+
+        :return: A set of task ids, or None if they are not all known: a bump did not record its
+                 tasks, its record expired, or the versions are too far apart to be worth replaying.
+        """
+        if since is None or until is None or not 0 < until - since <= MAX_CHANGES_BEHIND:
+            return None
+        keys = [changed_tasks_key(version) for version in range(since + 1, until + 1)]
+        records = self.cache.get_many(keys)
+        if len(records) != len(keys):
+            return None
+        return {task_id for key in keys for task_id in records[key]}
+
+    def make_key(self, query, mode, k, min_score, filters):
+        """
+        Builds the cache key of a search against the current tasks version.
+        """
+        criteria = [get_model_name(), mode, k, min_score, normalize_query(query)]
+        owner_id = None
+        if filters:
+            owner_id = filters.owner_id
+            criteria += [filters.owner_id, sorted(filters.status_values or []),
+                         filters.deadline_after, filters.deadline_before]
+        digest = hashlib.sha256(json.dumps(criteria).encode('utf-8')).hexdigest()
+        return f"search:{self.get_version(owner_id)}:{digest}"
+
+    def get(self, key):
+        """
+        :return: The cached list of (task_id, score) tuples, or None.
+        """
+        try:
+            hits = self.cache.get(key)
+        except Exception as e:
+            logger.error(f"Error reading search results from cache '{self.cache_alias}': {e}")
+            hits = None
+        with self._lock:
+            if hits is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return hits
+
+    def lookup(self, query, mode, k, min_score, filters):
+        """
+        :return: (key, hits): the cache key of a search and its cached hits, or None on a miss.
+        """
+        key = self.make_key(query, mode, k, min_score, filters)
+        return key, self.get(key)
+
+    def set(self, key, hits):
+        try:
+            self.cache.set(key, [(int(task_id), float(score)) for task_id, score in hits], timeout=None)
+        except Exception as e:
+            logger.error(f"Error writing search results to cache '{self.cache_alias}': {e}")
+
+    def clear(self):
+        with self._lock:
+            self.hits = self.misses = 0
+
+    def stats(self):
+        """
+        Returns this process's hit/miss counters and hit rate.
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else None,
+        }
+
+
+def get_search_cache():
+    """
+    Returns the process-wide search result cache, or None if TASK_SEARCH_CACHE_ALIAS is unset.
+    """
+    global search_cache
+
+    alias = getattr(settings, 'TASK_SEARCH_CACHE_ALIAS', None)
+    if not alias:
+        return None
+    if search_cache is None or search_cache.cache_alias != alias:
+        search_cache = SearchCache(alias)
+
+    return search_cache
+
+
+def bump_tasks_version(owner_ids=(), task_ids=None):
+    """
+    Invalidate cached search results after tasks of the given owners were created, changed or deleted.
+
+    :param task_ids: Ids of the changed tasks, if known, so that other processes can catch up
+                     their indexes with only these tasks.
+    :return: The new global tasks version, or None if there is no search cache.
+    """
+    cache = get_search_cache()
+    if cache is not None:
+        return cache.bump(owner_ids, task_ids)
+    return None
@@ -1,25 +1,100 @@
 from .logger import setup_logger
 from rest_framework import serializers
 from .models import Task
+from .embeddings import encode_texts
+from .export import VECTOR_FORMATS
+from .index import apply_task_changes, SearchFilter
+from .metrics import SERIALIZATION_SECONDS
+from .search import SEARCH_MODES, fts_available
+from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 
-logger = setup_logger()
+logger = setup_logger(__name__)
+
+# Model columns read to render serializer fields that are not plain model fields
+FIELD_COLUMNS = {
+    'vector_representation': ['vector_blob', 'vector_norm', 'vector_dtype'],
+    'score': [],
+}
+
+
+def select_fields(serializer_class, query_params, default_exclude=()):
+    """
+    Resolve the fields a response should include from the ?fields= and ?exclude= query
+    parameters (comma-separated, or repeated). Fields in default_exclude are left out
+    unless they are listed in ?fields=.
+
+    :param serializer_class: Serializer whose Meta.fields are selectable.
+    :param query_params: The request's query parameters.
+    :param default_exclude: Fields omitted when not explicitly requested.
+    :return: List of field names in serializer order.
+    :raises serializers.ValidationError: If an unknown field is named.
+    """
+    def names(param):
+        return {name.strip() for value in query_params.getlist(param) for name in value.split(',') if name.strip()}
+
+    available = serializer_class.Meta.fields
+    requested, excluded = names('fields'), names('exclude')
+    unknown = (requested | excluded) - set(available)
+    if unknown:
+        raise serializers.ValidationError({'fields': [f"Unknown field '{name}'." for name in sorted(unknown)]})
+    if requested:
+        return [name for name in available if name in requested and name not in excluded]
+    return [name for name in available if name not in excluded and name not in default_exclude]
+
+
+def field_columns(fields):
+    """
+    Model columns needed to render the given serializer fields, for QuerySet.only().
+    """
+    columns = ['id']
+    for name in fields:
+        columns.extend(FIELD_COLUMNS.get(name, [name]))
+    return list(dict.fromkeys(columns))
+
+
+class TimedListSerializer(serializers.ListSerializer):
+    """
+    List serializer recording the time spent serializing a list in the task_serialization_seconds metric.
+    """
+    def to_representation(self, data):
+        with SERIALIZATION_SECONDS.time(serializer=type(self.child).__name__):
+            return super().to_representation(data)
 
 
 class TaskSerializer(serializers.ModelSerializer):
     """
     Serializer for the Task model.
 
-    Includes fields for id, title, description, status, deadline, vector representation, and owner.
-    The vector representation is read-only and automatically generated.
+    Includes fields for id, title, description, status, deadline, vector representation, the encoder
+    that produced it (vector_model), owner and the time of the last write (updated_at).
+    The vector representation is read-only and automatically generated; embedding_pending
+    is true while it is still being generated in the background.
     The owner field is also read-only and set to the current user when a task is created.
+    Pass fields= (see select_fields) to render only a subset of the fields.
     """
     vector_representation = serializers.JSONField(read_only=True)
 
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
     class Meta:
         model = Task
-        fields = ['id', 'title', 'description', 'status', 'deadline', 'vector_representation', 'owner']
-        read_only_fields = ['owner', 'vector_representation']
+        fields = ['id', 'title', 'description', 'status', 'deadline', 'vector_representation', 'vector_model',
+                  'embedding_pending', 'owner', 'updated_at']
+        read_only_fields = ['owner', 'vector_representation', 'vector_model', 'embedding_pending', 'updated_at']
+        list_serializer_class = TimedListSerializer
+
+    def to_representation(self, instance):
+        # Items of a list are timed as part of the list
+        if self.parent is not None:
+            return super().to_representation(instance)
+        with SERIALIZATION_SECONDS.time(serializer=type(self).__name__):
+            return super().to_representation(instance)
 
     def validate_deadline(self, value):
         """
@@ -87,3 +162,237 @@ class TaskSerializer(serializers.ModelSerializer):
         except Exception as e:
             logger.error(f"Error updating task: {instance.id}, {e}")
             raise serializers.ValidationError(f"Error updating task: {e}")
+
+
+class TaskSearchResultSerializer(TaskSerializer):
+    """
+    Serializer for a search hit: a task plus its cosine similarity to the query.
+    The score is read from a `score` attribute set on the task by the search view.
+    """
+    score = serializers.FloatField(read_only=True)
+
+    class Meta(TaskSerializer.Meta):
+        fields = TaskSerializer.Meta.fields + ['score']
+
+
+class TaskSearchParamsSerializer(serializers.Serializer):
+    """
+    Validates the query parameters of the search endpoint.
+
+    k is the number of best matches to rank (TASK_SEARCH_DEFAULT_K by default, at most
+    TASK_SEARCH_MAX_K) and min_score the cosine similarity a task must exceed to match
+    (in vector and hybrid mode).
+    The remaining parameters restrict the search to the tasks of an owner (mine=true
+    for the requesting user), with one of the given statuses, or with a deadline in a
+    window; they are applied inside the vector index, as validated_data['filters'].
+    mode selects 'vector' similarity search, 'keyword' full-text search ranked by BM25
+    (no embedding needed), or 'hybrid' full-text candidates re-ranked by similarity.
+    """
+    k = serializers.IntegerField(min_value=1, required=False)
+    min_score = serializers.FloatField(min_value=-1.0, max_value=1.0, required=False)
+    mine = serializers.BooleanField(required=False, default=False)
+    owner = serializers.IntegerField(required=False)
+    status = serializers.ListField(child=serializers.ChoiceField(choices=Task.STATUS_CHOICES), required=False)
+    deadline_after = serializers.DateTimeField(required=False)
+    deadline_before = serializers.DateTimeField(required=False)
+    mode = serializers.ChoiceField(choices=SEARCH_MODES, required=False)
+
+    def validate_mode(self, value):
+        if value != 'vector' and not fts_available():
+            raise serializers.ValidationError("Full-text search is only available on SQLite with FTS5.")
+        return value
+
+    def validate_k(self, value):
+        max_k = getattr(settings, 'TASK_SEARCH_MAX_K', 1000)
+        if value > max_k:
+            raise serializers.ValidationError(f"Ensure this value is less than or equal to {max_k}.")
+        return value
+
+    def validate(self, attrs):
+        attrs.setdefault('k', getattr(settings, 'TASK_SEARCH_DEFAULT_K', 100))
+        attrs.setdefault('min_score', getattr(settings, 'TASK_SEARCH_MIN_SCORE', 0.5))
+        if 'mode' not in attrs:
+            mode = getattr(settings, 'TASK_SEARCH_DEFAULT_MODE', 'vector')
+            attrs['mode'] = mode if mode == 'vector' or fts_available() else 'vector'
+        owner_id = attrs.get('owner')
+        if attrs.get('mine'):
+            request = self.context.get('request')
+            owner_id = getattr(getattr(request, 'user', None), 'pk', None)
+            if owner_id is None:
+                raise serializers.ValidationError({'mine': "Only available to authenticated users."})
+        attrs['filters'] = SearchFilter(owner_id=owner_id, statuses=attrs.get('status'),
+                                        deadline_after=attrs.get('deadline_after'),
+                                        deadline_before=attrs.get('deadline_before'))
+        return attrs
+
+
+class TaskExportParamsSerializer(serializers.Serializer):
+    """
+    Validates the query parameters of the export endpoints: since (only tasks written after
+    this time), owner or mine=true (only this user's / the requesting user's tasks) and, for
+    NDJSON, how vectors are written (see export.VECTOR_FORMATS).
+    """
+    since = serializers.DateTimeField(required=False)
+    mine = serializers.BooleanField(required=False, default=False)
+    owner = serializers.IntegerField(required=False)
+    vectors = serializers.ChoiceField(choices=VECTOR_FORMATS, required=False, default='none')
+
+    def validate(self, attrs):
+        if attrs.get('mine'):
+            request = self.context.get('request')
+            attrs['owner'] = getattr(getattr(request, 'user', None), 'pk', None)
+            if attrs['owner'] is None:
+                raise serializers.ValidationError({'mine': "Only available to authenticated users."})
+        return attrs
+
+
+class TaskBulkSerializer(serializers.Serializer):
+    """
+    Serializer for applying many task creates, partial updates and deletes in one request.
+
+    Each item is validated with TaskSerializer on its own, so invalid items are reported
+    in 'errors' without rejecting the rest of the batch. The texts of all created and
+    re-titled/re-described tasks are embedded with a single batched encode call, and the
+    rows are written with bulk_create/bulk_update inside one transaction.
+    """
+    create = serializers.ListField(child=serializers.DictField(), required=False)
+    update = serializers.ListField(child=serializers.DictField(), required=False)
+    delete = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+    def validate(self, attrs):
+        """
+        Rejects batches larger than TASK_BULK_MAX_ITEMS, and batches updating a task more than once,
+        whose updates would otherwise be applied in an arbitrary order.
+        """
+        max_items = getattr(settings, 'TASK_BULK_MAX_ITEMS', 1000)
+        for operation in ('create', 'update', 'delete'):
+            attrs.setdefault(operation, [])
+        total = len(attrs['create']) + len(attrs['update']) + len(attrs['delete'])
+        if total > max_items:
+            raise serializers.ValidationError(f"A bulk request may contain at most {max_items} operations.")
+        ids = [item.get('id') for item in attrs['update'] if item.get('id') is not None]
+        duplicates = sorted({str(task_id) for task_id in ids if ids.count(task_id) > 1})
+        if duplicates:
+            raise serializers.ValidationError(
+                {'update': [f"Each task may only be updated once per request; repeated ids: {', '.join(duplicates)}."]}
+            )
+        return attrs
+
+    def apply(self):
+        """
+        Validates and applies the operations. Called instead of save() because the
+        'create' and 'update' fields shadow the serializer's create()/update() hooks.
+
+        Returns:
+            dict: Serialized 'created' and 'updated' tasks, 'deleted' ids and per-item 'errors'.
+        """
+        validated_data = self.validated_data
+        request = self.context.get('request')
+        user = getattr(request, 'user', None)
+        errors = []
+
+        to_create = []
+        for position, item in enumerate(validated_data['create']):
+            serializer = TaskSerializer(data=item, context=self.context)
+            if serializer.is_valid():
+                to_create.append(Task(owner=user, **serializer.validated_data))
+            else:
+                errors.append({'operation': 'create', 'index': position, 'errors': serializer.errors})
+
+        update_items = validated_data['update']
+        instances = Task.objects.in_bulk([item['id'] for item in update_items if isinstance(item.get('id'), int)])
+        to_update = []
+        for position, item in enumerate(update_items):
+            instance = instances.get(item.get('id'))
+            if instance is None:
+                errors.append({'operation': 'update', 'index': position, 'errors': {'id': ['Task not found.']}})
+                continue
+            if instance.owner_id != getattr(user, 'pk', None):
+                errors.append({'operation': 'update', 'index': position,
+                               'errors': {'id': ['You do not have permission to update this task.']}})
+                continue
+            data = {key: value for key, value in item.items() if key != 'id'}
+            serializer = TaskSerializer(instance, data=data, partial=True, context=self.context)
+            if not serializer.is_valid():
+                errors.append({'operation': 'update', 'index': position, 'errors': serializer.errors})
+                continue
+            for attr, value in serializer.validated_data.items():
+                setattr(instance, attr, value)
+            to_update.append(instance)
+
+        delete_ids = list(dict.fromkeys(validated_data['delete']))
+        owned = dict(Task.objects.filter(id__in=delete_ids).values_list('id', 'owner_id'))
+        to_delete = []
+        for position, task_id in enumerate(delete_ids):
+            if task_id not in owned:
+                errors.append({'operation': 'delete', 'index': position, 'errors': {'id': ['Task not found.']}})
+            elif owned[task_id] != getattr(user, 'pk', None):
+                errors.append({'operation': 'delete', 'index': position,
+                               'errors': {'id': ['You do not have permission to delete this task.']}})
+            else:
+                to_delete.append(task_id)
+
+        to_embed = to_create + [task for task in to_update if {'title', 'description'} & set(task.get_dirty_fields())]
+        self._embed(to_embed)
+        update_fields = set()
+        for task in to_update:
+            update_fields.update(task.get_dirty_fields())
+        if update_fields:
+            # bulk_update does not apply auto_now
+            now = timezone.now()
+            for task in to_update:
+                task.updated_at = now
+            update_fields.add('updated_at')
+
+        try:
+            with transaction.atomic():
+                created = Task.objects.bulk_create(to_create)
+                if to_update and update_fields:
+                    Task.objects.bulk_update(to_update, sorted(update_fields))
+                if to_delete:
+                    Task.objects.filter(id__in=to_delete).delete()
+                if any(task.embedding_pending for task in to_embed):
+                    from .embedding_worker import wake_embedding_worker
+                    transaction.on_commit(wake_embedding_worker)
+        except Exception as e:
+            logger.error(f"Error applying bulk task operations: {e}")
+            raise serializers.ValidationError(f"Error applying bulk task operations: {e}")
+
+        # bulk_create/bulk_update do not send post_save, so update the index and cached searches here;
+        # deletes were signalled per task
+        if created or to_update:
+            apply_task_changes(saved=created + to_update, owner_ids=[getattr(user, 'pk', None)])
+
+        logger.info(f"Bulk operation: created {len(created)}, updated {len(to_update)}, "
+                    f"deleted {len(to_delete)}, failed {len(errors)}")
+        return {
+            'created': TaskSerializer(created, many=True, context=self.context).data,
+            'updated': TaskSerializer(to_update, many=True, context=self.context).data,
+            'deleted': to_delete,
+            'errors': errors,
+        }
+
+    @staticmethod
+    def _embed(tasks):
+        """
+        Generates the vector representations of the given tasks with one encode call,
+        or marks them as pending when TASK_EMBEDDING_MODE is 'async'. If the encode fails,
+        the tasks are still written, marked as pending for the embedding worker to retry.
+        """
+        if not tasks:
+            return
+        if getattr(settings, 'TASK_EMBEDDING_MODE', 'sync') == 'async':
+            for task in tasks:
+                task.embedding_pending = True
+            return
+        try:
+            vectors = encode_texts([task.embedding_text for task in tasks])
+        except Exception as e:
+            logger.error(f"Error generating vector representations for {len(tasks)} bulk tasks, "
+                         f"leaving them pending: {e}")
+            for task in tasks:
+                task.embedding_pending = True
+            return
+        for task, vector in zip(tasks, vectors):
+            task.vector_representation = vector
+            task.embedding_pending = False
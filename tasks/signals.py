@@ -0,0 +1,23 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Task
+from .index import apply_task_changes
+
+
+@receiver(post_save, sender=Task)
+def index_saved_task(sender, instance, **kwargs):
+    """
+    Keep the vector index in sync when a task is created or updated, and invalidate
+    the cached searches and the other processes' indexes it may change.
+    The index is only touched once it has been built; until then it will be
+    loaded from the database on first search.
+    """
+    apply_task_changes(saved=[instance], owner_ids=[instance.owner_id])
+
+
+@receiver(post_delete, sender=Task)
+def unindex_deleted_task(sender, instance, **kwargs):
+    """
+    Remove a deleted task from the vector index and invalidate the searches it appeared in.
+    """
+    apply_task_changes(deleted=[instance.pk], owner_ids=[instance.owner_id])
@@ -0,0 +1,19 @@
+from django.conf import settings
+from .logger import setup_logger
+from .utils import warmup_model
+
+logger = setup_logger(__name__)
+
+
+def warmup_on_startup():
+    """
+    Warm up the embedding model when a WSGI/ASGI worker starts, if TASK_EMBEDDING_WARMUP is set.
+    A failure is logged rather than raised, so the worker still starts and the readiness
+    endpoint keeps reporting it as not ready.
+    """
+    if not getattr(settings, 'TASK_EMBEDDING_WARMUP', False):
+        return
+    try:
+        warmup_model()
+    except Exception as e:
+        logger.error(f"Error warming up embedding model: {e}")
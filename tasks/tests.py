@@ -1,10 +1,50 @@
 from django.urls import reverse
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 from rest_framework import status
 from rest_framework.test import APIClient, APITestCase
 from django.contrib.auth import get_user_model
+from rest_framework.authtoken.models import Token
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from datetime import timedelta
+from io import StringIO
+from unittest import mock
+import base64
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+import numpy as np
 from .models import Task
+from .index import (VectorIndex, QuantizedIndex, IVFIndex, SearchFilter, TaskMeta, build_index, fetch_exact_vectors,
+                    get_index, load_ivf_centroids, reset_index, status_code, write_index_snapshot)
+from .index_store import MmapIndex, delta_path, write_snapshot
+from .quantization import ScalarQuantizer, ProductQuantizer, kmeans
+from .embeddings import EmbeddingCache, encode_text, encode_texts
+from .embedding_server import FRAME, EmbeddingServer, RemoteEncoder, recv_message
+from .embedding_worker import process_pending_embeddings
+from .batching import EncodeBatcher
+from .benchmark import parse_size
+from .db import get_sqlite_pragmas
+from .encoders import DeterministicEncoder, HashingEncoder, create_encoder
+from .export import TaskExport, read_vector_file
+from .exception import AppException
+from .logger import SamplingFilter, log_files_in, setup_logger, stop_listener
+from . import logger as logger_module
+from .metrics import Histogram, reset_metrics
+from .search import build_match_query, lexical_search, reciprocal_rank_fusion
+from .search_cache import get_search_cache
+from .utils import cosine_similarity, get_model_name
+from django.core.cache import caches
+from concurrent.futures import ThreadPoolExecutor
+from taskvectorapi.settings import log_level, name_value_pairs
 
 
 class TaskAPITestCase(APITestCase):
@@ -101,9 +141,9 @@ class TaskAPITestCase(APITestCase):
         """
         query = 'Task'
         url = f'/api/tasks/search/{query}/'
-        response = self.client.get(url)
+        response = self.client.get(url, {'min_score': 0.2})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertTrue(len(response.data) > 0)
+        self.assertTrue(len(response.data['results']) > 0)
 
     def test_unauthorized_access(self):
         """
@@ -174,11 +214,34 @@ class TaskAPITestCase(APITestCase):
         # Use a query that should match one of the tasks
         query = 'Similar'
         url = f'/api/tasks/search/{query}/'
-        response = self.client.get(url)
+        response = self.client.get(url, {'min_score': 0.2})
 
         # Verify that at least one task matches the search
-        self.assertTrue(len(response.data) > 0)
-        self.assertTrue(any('Similar Task' in task['title'] for task in response.data))
+        self.assertTrue(len(response.data['results']) > 0)
+        self.assertTrue(any('Similar Task' in task['title'] for task in response.data['results']))
+
+    def test_search_ranks_top_k_with_scores(self):
+        """
+        Test that search returns at most k hits, best first, each with a score.
+        """
+        response = self.client.get('/api/tasks/search/Task/', {'k': 1, 'min_score': -1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIn('score', response.data['results'][0])
+
+        response = self.client.get('/api/tasks/search/Task/', {'min_score': -1})
+        scores = [task['score'] for task in response.data['results']]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_search_with_invalid_parameters(self):
+        """
+        Test that invalid ranking parameters are rejected.
+        """
+        response = self.client.get('/api/tasks/search/Task/', {'k': 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/tasks/search/Task/', {'min_score': 2})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
     def test_permission_denied_for_other_user(self):
         """
@@ -195,3 +258,1623 @@ class TaskAPITestCase(APITestCase):
         # Attempt to delete
         response = self.client.delete(url)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class VectorIndexTestCase(SimpleTestCase):
+    def test_search_orders_by_similarity(self):
+        """
+        Ensure search returns matches above the threshold, best first.
+        """
+        index = VectorIndex(capacity=1)
+        index.upsert(1, [1.0, 0.0, 0.0])
+        index.upsert(2, [0.8, 0.6, 0.0])
+        index.upsert(3, [0.0, 0.0, 1.0])
+
+        hits = index.search(np.array([1.0, 0.1, 0.0]), min_score=0.5)
+        self.assertEqual([task_id for task_id, _ in hits], [1, 2])
+        self.assertAlmostEqual(hits[0][1], 1 / np.sqrt(1.01), places=5)
+
+        hits = index.search(np.array([1.0, 0.1, 0.0]), k=1, min_score=-1)
+        self.assertEqual([task_id for task_id, _ in hits], [1])
+
+    def test_upsert_and_remove_keep_index_dense(self):
+        """
+        Ensure replacing and removing rows keeps ids and vectors aligned.
+        """
+        index = VectorIndex()
+        for task_id in range(1, 6):
+            index.upsert(task_id, [float(task_id), 1.0])
+        index.remove(2)
+        index.upsert(4, [0.0, 1.0])
+        index.upsert(5, None)
+
+        self.assertEqual(len(index), 3)
+        self.assertNotIn(2, index)
+        self.assertNotIn(5, index)
+        hits = dict(index.search([0.0, 1.0], min_score=0.99))
+        self.assertEqual(list(hits), [4])
+
+
+class FilteredSearchTestCase(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        self.vectors = rng.normal(size=(60, 8)).astype(np.float32)
+        statuses = [status_code('PENDING'), status_code('COMPLETED')]
+        # Tasks 1-60 belong to owners 1-3 in turn, alternate status and have deadlines 1000-1059
+        self.metas = [TaskMeta(task_id % 3 + 1, statuses[task_id % 2], 1000.0 + task_id) for task_id in range(60)]
+
+    def expected(self, keep, query, k):
+        exact = VectorIndex()
+        exact.upsert_many([task_id + 1 for task_id in range(60) if keep(self.metas[task_id])],
+                          [self.vectors[task_id] for task_id in range(60) if keep(self.metas[task_id])])
+        return [task_id for task_id, _ in exact.search(query, k=k, min_score=-1)]
+
+    def assert_filters_match(self, index):
+        query = self.vectors[0]
+        cases = [
+            (SearchFilter(owner_id=2), lambda meta: meta.owner_id == 2),
+            (SearchFilter(owner_id=1, statuses=['COMPLETED']),
+             lambda meta: meta.owner_id == 1 and meta.status == status_code('COMPLETED')),
+            (SearchFilter(deadline_after=1010, deadline_before=1030), lambda meta: 1010 <= meta.deadline <= 1030),
+            (SearchFilter(owner_id=99), lambda meta: False),
+        ]
+        for filters, keep in cases:
+            found = [task_id for task_id, _ in index.search(query, k=5, min_score=-1, filters=filters)]
+            self.assertEqual(found, self.expected(keep, query, 5))
+
+    def test_vector_index_filters(self):
+        """
+        Ensure filtered searches return the best matches among the matching tasks only.
+        """
+        index = VectorIndex()
+        index.upsert_many(range(1, 61), self.vectors, self.metas)
+        self.assert_filters_match(index)
+
+    def test_owner_partition_only_scores_owner_rows(self):
+        """
+        Ensure an owner filter scores that owner's rows, and partitions follow removals and owner changes.
+        """
+        index = VectorIndex()
+        index.upsert_many(range(1, 61), self.vectors, self.metas)
+        with mock.patch.object(VectorIndex, '_scores', autospec=True, side_effect=VectorIndex._scores) as scores:
+            index.search(self.vectors[0], k=5, min_score=-1, filters=SearchFilter(owner_id=2))
+        self.assertEqual(len(scores.call_args.args[2]), 20)
+
+        index.remove(2)
+        index.upsert(4, self.vectors[3], TaskMeta(2, 0, 1003.0))
+        found = {task_id for task_id, _ in index.search(self.vectors[0], min_score=-1,
+                                                        filters=SearchFilter(owner_id=2))}
+        self.assertEqual(len(found), 20)
+        self.assertIn(4, found)
+        self.assertNotIn(2, found)
+
+    def test_mmap_index_filters(self):
+        """
+        Ensure the mmap index applies filters to its snapshot and its delta overlay.
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'tasks.vidx')
+            write_snapshot(path, zip(range(1, 41), self.vectors[:40], self.metas[:40]), dim=8)
+            index = MmapIndex(path)
+            index.upsert_many(range(41, 61), self.vectors[40:], self.metas[40:])
+            self.assert_filters_match(index)
+
+
+class TaskVectorStorageTestCase(SimpleTestCase):
+    def test_vector_round_trip(self):
+        """
+        Ensure vectors are stored normalized and the list form is rebuilt from the norm.
+        """
+        task = Task(title='Task', description='Description')
+        task.vector_representation = [3.0, 4.0]
+        self.assertEqual(task.vector_dtype, 'float32')
+        self.assertEqual(len(task.vector_blob), 8)
+        self.assertAlmostEqual(task.vector_norm, 5.0)
+        np.testing.assert_allclose(task.normalized_vector, [0.6, 0.8], rtol=1e-6)
+        np.testing.assert_allclose(task.vector_representation, [3.0, 4.0], rtol=1e-6)
+
+    @override_settings(TASK_VECTOR_DTYPE='float16')
+    def test_float16_storage(self):
+        """
+        Ensure half precision storage halves the blob size.
+        """
+        task = Task(title='Task', description='Description')
+        task.vector_representation = np.arange(1, 385, dtype=np.float32)
+        self.assertEqual(task.vector_dtype, 'float16')
+        self.assertEqual(len(task.vector_blob), 384 * 2)
+        np.testing.assert_allclose(task.vector_representation, np.arange(1, 385), rtol=1e-2)
+
+    def test_zero_vector_is_not_stored(self):
+        task = Task(title='Task', description='Description')
+        task.vector_representation = [0.0, 0.0]
+        self.assertIsNone(task.vector_blob)
+        self.assertIsNone(task.vector_representation)
+
+
+class EmbeddingCacheTestCase(SimpleTestCase):
+    def test_lru_eviction_and_counters(self):
+        """
+        Ensure the in-process tier is bounded and counts hits, misses and evictions.
+        """
+        cache = EmbeddingCache(maxsize=2)
+        keys = [cache.make_key('model', text) for text in ('a', 'b', 'c')]
+        cache.set_many({keys[0]: [1.0], keys[1]: [2.0]})
+        cache.get_many([keys[0]])
+        cache.set_many({keys[2]: [3.0]})
+
+        self.assertEqual(set(cache.get_many(keys)), {keys[0], keys[2]})
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertEqual(cache.stats()['hits'], 3)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_persistent_tier(self):
+        """
+        Ensure embeddings evicted from memory are served from the Django cache tier.
+        """
+        cache = EmbeddingCache(maxsize=0, cache_alias='default')
+        key = cache.make_key('model', 'persisted text')
+        cache.set_many({key: [0.5, 0.25]})
+
+        found = cache.get_many([key])
+        np.testing.assert_array_equal(found[key], [0.5, 0.25])
+        self.assertEqual(cache.stats()['persistent_hits'], 1)
+
+    @override_settings(TASK_ENCODE_BATCH_WAIT_MS=0)
+    def test_encode_texts_batches_misses(self):
+        """
+        Ensure repeated texts hit the cache and misses are encoded in one call.
+        """
+        model = mock.Mock()
+        model.encode.side_effect = lambda texts: np.array([[len(text), 1.0] for text in texts])
+        with mock.patch('tasks.embeddings.get_model', return_value=model), \
+                mock.patch('tasks.embeddings.embedding_cache', EmbeddingCache(maxsize=10)):
+            vectors = encode_texts(['fix login bug', 'deploy', 'fix login bug'])
+            encode_texts(['deploy'])
+
+        self.assertEqual(vectors.shape, (3, 2))
+        np.testing.assert_array_equal(vectors[0], vectors[2])
+        model.encode.assert_called_once_with(['fix login bug', 'deploy'])
+
+
+class EncodeBatcherTestCase(SimpleTestCase):
+    def test_concurrent_requests_share_a_batch(self):
+        """
+        Ensure concurrent encodes are coalesced into fewer model calls and each caller gets its own rows.
+        """
+        calls = []
+
+        def encode(texts):
+            calls.append(list(texts))
+            time.sleep(0.02)
+            return np.array([[len(text), 1.0] for text in texts])
+
+        batcher = EncodeBatcher(max_batch_size=8, max_wait_ms=20, encode=encode)
+        texts = [['a' * n] for n in range(1, 17)]
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            results = list(pool.map(batcher.encode, texts))
+
+        for n, vectors in enumerate(results, start=1):
+            np.testing.assert_array_equal(vectors, [[n, 1.0]])
+        self.assertLess(len(calls), 16)
+        self.assertTrue(all(len(batch) <= 8 for batch in calls))
+        stats = batcher.stats()
+        self.assertEqual(stats['requests'], 16)
+        self.assertEqual(stats['batches'], len(calls))
+        self.assertGreater(stats['mean_batch_size'], 1)
+
+    def test_lone_request_is_not_held_back(self):
+        """
+        Ensure a request with nobody queued behind it is encoded without waiting out max_wait_ms.
+        """
+        batcher = EncodeBatcher(max_wait_ms=5000, encode=lambda texts: np.ones((len(texts), 2)))
+        started = time.monotonic()
+        self.assertEqual(batcher.encode(['alone']).shape, (1, 2))
+        self.assertLess(time.monotonic() - started, 1.0)
+
+    def test_stalled_batch_times_out(self):
+        """
+        Ensure a caller gives up after result_timeout instead of waiting forever for a stuck dispatcher.
+        """
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def encode(texts):
+            release.wait(5)
+            return np.ones((len(texts), 2))
+
+        batcher = EncodeBatcher(max_wait_ms=0, encode=encode, result_timeout=0.05)
+        with self.assertRaises(AppException):
+            batcher.encode(['stuck'])
+
+    def test_encode_errors_reach_every_caller(self):
+        """
+        Ensure a failed batch raises in the waiting caller and the batcher keeps serving.
+        """
+        def encode(texts):
+            if 'bad' in texts:
+                raise ValueError('model failure')
+            return np.ones((len(texts), 2))
+
+        batcher = EncodeBatcher(max_wait_ms=1, encode=encode)
+        with self.assertRaises(ValueError):
+            batcher.encode(['bad'])
+        self.assertEqual(batcher.encode(['good']).shape, (1, 2))
+
+    def test_full_queue_rejects_requests(self):
+        """
+        Ensure requests beyond max_queue_size fail after queue_timeout instead of queueing without bound.
+        """
+        busy, release = threading.Event(), threading.Event()
+
+        def encode(texts):
+            busy.set()
+            release.wait(5)
+            return np.ones((len(texts), 2))
+
+        batcher = EncodeBatcher(max_batch_size=1, max_wait_ms=0, encode=encode, max_queue_size=1, queue_timeout=0.05)
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            running = pool.submit(batcher.encode, ['a'])
+            busy.wait(5)
+            queued = pool.submit(batcher.encode, ['b'])
+            while batcher.stats()['queued'] < 1:
+                time.sleep(0.001)
+            with self.assertRaises(AppException):
+                batcher.encode(['c'])
+            release.set()
+            self.assertEqual(running.result().shape, (1, 2))
+            self.assertEqual(queued.result().shape, (1, 2))
+        self.assertEqual(batcher.stats()['rejected'], 1)
+
+
+@override_settings(TASK_EMBEDDING_MODE='async', TASK_EMBEDDING_WORKER='command')
+class AsyncEmbeddingTestCase(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='user1', password='password1')
+        self.client.force_authenticate(user=self.user)
+
+    def test_create_returns_before_embedding(self):
+        """
+        Ensure tasks are saved as pending and embedded later by the worker.
+        """
+        data = {'title': 'Async Task', 'description': 'Embedded later', 'deadline': timezone.now() + timedelta(days=5)}
+        response = self.client.post(reverse('task-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(response.data['embedding_pending'])
+        self.assertIsNone(response.data['vector_representation'])
+
+        self.assertEqual(process_pending_embeddings(batch_size=10), 1)
+        task = Task.objects.get(pk=response.data['id'])
+        self.assertFalse(task.embedding_pending)
+        self.assertIsNotNone(task.vector_representation)
+
+    def test_edited_task_stays_pending(self):
+        """
+        Ensure a vector computed from stale text is not written back.
+        """
+        task = Task.objects.create(title='Old', description='Text', owner=self.user,
+                                   deadline=timezone.now() + timedelta(days=1))
+
+        def edit_during_encode(texts):
+            Task.objects.filter(pk=task.pk).update(title='New')
+            return np.ones((len(texts), 4), dtype=np.float32)
+
+        with mock.patch('tasks.embedding_worker.encode_texts', side_effect=edit_during_encode):
+            self.assertEqual(process_pending_embeddings(), 0)
+        task.refresh_from_db()
+        self.assertTrue(task.embedding_pending)
+        self.assertIsNone(task.vector_blob)
+
+
+class IndexSyncTestCase(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='syncuser', password='password')
+        self.client.force_authenticate(user=self.user)
+        self.task = Task.objects.create(title='Renew passport', description='Before the trip', owner=self.user,
+                                        deadline=timezone.now() + timedelta(days=1))
+        reset_index()
+        self.addCleanup(reset_index)
+
+    def test_changes_of_other_processes_rebuild_the_index(self):
+        """
+        Ensure an index catches up with the tasks another process changed, is rebuilt if they are not known,
+        and is left alone for changes this process applied itself.
+        """
+        index = get_index()
+        self.assertIn(self.task.pk, index)
+        other = Task.objects.create(title='Book flights', description='For the trip', owner=self.user,
+                                    deadline=timezone.now() + timedelta(days=1))
+        self.assertIs(get_index(), index)
+        self.assertIn(other.pk, index)
+
+        # Another worker deletes one task and renames another: no signal reaches this process, only
+        # the version bump with the ids of the changed tasks, which are reloaded into the same index
+        Task.objects.filter(pk=other.pk)._raw_delete(Task.objects.db)
+        renamed = Task(pk=self.task.pk)
+        renamed.vector_representation = encode_texts(['Book a hotel'])[0]
+        Task.objects.filter(pk=self.task.pk).update(vector_blob=renamed.vector_blob)
+        get_search_cache().bump([self.user.pk], [other.pk, self.task.pk])
+        self.assertIs(get_index(), index)
+        self.assertNotIn(other.pk, index)
+        np.testing.assert_allclose(index.search(renamed.normalized_vector, k=1)[0], (self.task.pk, 1.0), rtol=1e-5)
+
+        # A bump without the changed ids can only be followed by a rebuild
+        Task.objects.filter(pk=self.task.pk)._raw_delete(Task.objects.db)
+        get_search_cache().bump([self.user.pk])
+        rebuilt = get_index()
+        self.assertIsNot(rebuilt, index)
+        self.assertNotIn(self.task.pk, rebuilt)
+
+    def test_only_current_vectors_are_indexed(self):
+        """
+        Ensure saved tasks whose vector is of another encoder, or pending re-embedding, leave the index.
+        """
+        index = get_index()
+        Task.objects.filter(pk=self.task.pk).update(vector_model='another-model')
+        self.task.refresh_from_db()
+        self.task.save()
+        self.assertNotIn(self.task.pk, index)
+
+        with override_settings(TASK_EMBEDDING_MODE='async'):
+            task = Task.objects.create(title='Pay rent', description='Monthly', owner=self.user,
+                                       deadline=timezone.now() + timedelta(days=1))
+            self.assertNotIn(task.pk, index)
+            process_pending_embeddings()
+            self.assertIn(task.pk, index)
+
+            task.title = 'Pay the rent'
+            task.save()
+            self.assertNotIn(task.pk, index)
+            self.assertNotIn(task.pk, build_index('exact'))
+
+
+class TaskBulkTestCase(APITestCase):
+    def setUp(self):
+        self.user1 = get_user_model().objects.create_user(username='user1', password='password1')
+        self.user2 = get_user_model().objects.create_user(username='user2', password='password2')
+        self.task1 = Task.objects.create(title='Task 1', description='Description 1', owner=self.user1,
+                                         deadline=timezone.now() + timedelta(days=3))
+        self.task2 = Task.objects.create(title='Task 2', description='Description 2', owner=self.user2,
+                                         deadline=timezone.now() + timedelta(days=3))
+        self.client.force_authenticate(user=self.user1)
+
+    def test_bulk_operations_report_per_item_errors(self):
+        """
+        Ensure valid operations are applied and invalid ones are reported individually.
+        """
+        deadline = timezone.now() + timedelta(days=5)
+        data = {
+            'create': [{'title': 'Bulk 1', 'description': 'First', 'deadline': deadline},
+                       {'description': 'Missing title', 'deadline': deadline},
+                       {'title': 'Bulk 2', 'description': 'Second', 'deadline': deadline}],
+            'update': [{'id': self.task1.pk, 'title': 'Renamed'}, {'id': self.task2.pk, 'status': 'COMPLETED'}],
+            'delete': [self.task2.pk, 9999],
+        }
+        with mock.patch('tasks.serializers.encode_texts', wraps=encode_texts) as encode:
+            response = self.client.post(reverse('task-bulk'), data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        encode.assert_called_once()
+        self.assertEqual(len(encode.call_args.args[0]), 3)
+        self.assertEqual([task['title'] for task in response.data['created']], ['Bulk 1', 'Bulk 2'])
+        self.assertEqual(response.data['updated'][0]['title'], 'Renamed')
+        self.assertEqual(response.data['deleted'], [])
+        self.assertEqual([(error['operation'], error['index']) for error in response.data['errors']],
+                         [('create', 1), ('update', 1), ('delete', 0), ('delete', 1)])
+
+        self.assertEqual(Task.objects.count(), 4)
+        self.assertIsNotNone(Task.objects.get(title='Bulk 2').vector_representation)
+        self.task1.refresh_from_db()
+        self.assertEqual(self.task1.title, 'Renamed')
+
+    def test_bulk_delete(self):
+        response = self.client.post(reverse('task-bulk'), {'delete': [self.task1.pk]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['deleted'], [self.task1.pk])
+        self.assertFalse(Task.objects.filter(pk=self.task1.pk).exists())
+
+    @override_settings(TASK_BULK_MAX_ITEMS=1)
+    def test_bulk_size_limit(self):
+        response = self.client.post(reverse('task-bulk'), {'delete': [1, 2]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_duplicate_update_ids_are_rejected(self):
+        """
+        Ensure a batch updating the same task twice is rejected as a whole instead of applied in arbitrary order.
+        """
+        data = {'update': [{'id': self.task1.pk, 'title': 'First'}, {'id': self.task1.pk, 'title': 'Second'}]}
+        response = self.client.post(reverse('task-bulk'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('update', response.data)
+        self.task1.refresh_from_db()
+        self.assertEqual(self.task1.title, 'Task 1')
+
+    @override_settings(TASK_EMBEDDING_WORKER='command')
+    def test_encode_failure_leaves_tasks_pending(self):
+        """
+        Ensure a failed batch encode still writes the tasks, marked as pending for the embedding worker.
+        """
+        data = {'create': [{'title': 'Bulk', 'description': 'Encoder down',
+                            'deadline': timezone.now() + timedelta(days=5)}],
+                'update': [{'id': self.task1.pk, 'title': 'Renamed'}]}
+        with mock.patch('tasks.serializers.encode_texts', side_effect=RuntimeError('encoder down')):
+            response = self.client.post(reverse('task-bulk'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['errors'], [])
+        self.assertTrue(Task.objects.get(pk=response.data['created'][0]['id']).embedding_pending)
+        self.task1.refresh_from_db()
+        self.assertEqual(self.task1.title, 'Renamed')
+        self.assertTrue(self.task1.embedding_pending)
+
+
+class ReembedTasksCommandTestCase(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user(username='user1', password='password1')
+        self.tasks = [Task.objects.create(title=f'Task {i}', description=f'Description {i}', owner=user,
+                                          deadline=timezone.now() + timedelta(days=1)) for i in range(3)]
+        Task.objects.update(vector_blob=None, vector_norm=None, vector_dtype=None)
+        self.checkpoint = os.path.join(tempfile.mkdtemp(), 'reembed.checkpoint')
+
+    def test_reembeds_all_tasks(self):
+        """
+        Ensure every task gets a vector and the checkpoint is removed on completion.
+        """
+        call_command('reembed_tasks', batch_size=2, checkpoint=self.checkpoint, stdout=StringIO())
+        self.assertFalse(Task.objects.filter(vector_blob=None).exists())
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_invalidates_indexes_and_cached_searches(self):
+        """
+        Ensure re-embedded vectors reach the search index and cached searches, although queryset updates send no signals.
+        """
+        reset_index()
+        self.addCleanup(reset_index)
+        self.assertEqual(len(get_index()), 0)
+        cache = get_search_cache()
+        version = cache.get_version()
+        call_command('reembed_tasks', batch_size=2, checkpoint=self.checkpoint, stdout=StringIO())
+        self.assertEqual(cache.get_version(), version + 2)
+        self.assertEqual(len(get_index()), 3)
+
+    def test_task_edited_during_encoding_is_not_overwritten(self):
+        """
+        Ensure a vector computed from a task's old text is not written over a concurrent edit.
+        """
+        from tasks.management.commands import reembed_tasks
+
+        encode_batch = reembed_tasks.encode_batch
+
+        def encode_and_edit(texts):
+            vectors = encode_batch(texts)
+            Task.objects.filter(pk=self.tasks[0].pk).update(title='Edited', embedding_pending=True)
+            return vectors
+
+        with mock.patch.object(reembed_tasks, 'encode_batch', side_effect=encode_and_edit):
+            call_command('reembed_tasks', checkpoint=self.checkpoint, stdout=StringIO())
+        edited = Task.objects.get(pk=self.tasks[0].pk)
+        self.assertTrue(edited.embedding_pending)
+        self.assertIsNone(edited.vector_blob)
+        self.assertFalse(Task.objects.exclude(pk=edited.pk).filter(vector_blob=None).exists())
+
+    def test_resumes_from_checkpoint(self):
+        """
+        Ensure a run resumes after the task id recorded in the checkpoint.
+        """
+        with open(self.checkpoint, 'w') as f:
+            json.dump({'model': get_model_name(), 'last_id': self.tasks[1].id, 'processed': 2}, f)
+        call_command('reembed_tasks', checkpoint=self.checkpoint, stdout=StringIO())
+        self.assertEqual(list(Task.objects.exclude(vector_blob=None).values_list('id', flat=True)),
+                         [self.tasks[2].id])
+
+
+class QuantizedIndexTestCase(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        vectors = rng.normal(size=(500, 32)).astype(np.float32)
+        self.vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.exact = {task_id: vector for task_id, vector in enumerate(self.vectors, start=1)}
+
+    def build(self, quantizer):
+        index = QuantizedIndex(quantizer.train(self.vectors), exact_lookup=lambda ids: {
+            task_id: self.exact[task_id] for task_id in ids if task_id in self.exact})
+        index.upsert_many(list(self.exact), list(self.exact.values()))
+        return index
+
+    def test_int8_index_finds_exact_neighbours(self):
+        """
+        Ensure the int8 index is 4x smaller and re-ranked hits carry exact scores.
+        """
+        index = self.build(ScalarQuantizer(32))
+        self.assertEqual(index._data.dtype, np.int8)
+        hits = index.search(self.vectors[7], k=3, min_score=-1)
+        self.assertEqual(hits[0][0], 8)
+        self.assertAlmostEqual(hits[0][1], 1.0, places=5)
+
+    def test_shortlist_is_capped(self):
+        """
+        Ensure the exact lookup reads at most rerank_limit vectors (or k, if larger), whatever rerank_factor * k is,
+        and that searches for every match (k=None) are not truncated.
+        """
+        lookups = []
+        index = QuantizedIndex(ScalarQuantizer(32).train(self.vectors), rerank_factor=10, rerank_limit=50,
+                               exact_lookup=lambda ids: lookups.append(len(ids)) or {
+                                   task_id: self.exact[task_id] for task_id in ids})
+        index.upsert_many(list(self.exact), list(self.exact.values()))
+        for k, expected in [(3, 30), (10, 50), (100, 100), (None, 500)]:
+            index.search(self.vectors[7], k=k, min_score=-1)
+            self.assertEqual(lookups.pop(), expected)
+
+    def test_pq_index_finds_exact_neighbours(self):
+        """
+        Ensure the product-quantized index stores one byte per subspace and finds the query's task.
+        """
+        index = self.build(ProductQuantizer(32, m=8, n_iter=5))
+        self.assertEqual(index._data.shape[1:], (8,))
+        hits = index.search(self.vectors[42], k=1, min_score=-1)
+        self.assertEqual([task_id for task_id, _ in hits], [43])
+        self.assertLess(index.memory_bytes(), 500 * 32 * 4)
+
+
+class IVFIndexTestCase(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        centers = rng.normal(size=(8, 16))
+        vectors = centers[rng.integers(0, 8, 400)] + 0.1 * rng.normal(size=(400, 16))
+        self.vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+        self.centroids, _ = kmeans(self.vectors, 8, n_iter=10)
+
+    def test_probing_all_cells_matches_exact_search(self):
+        """
+        Ensure an IVF search over every cell returns the exact top k.
+        """
+        ivf = IVFIndex(self.centroids, nprobe=8)
+        exact = VectorIndex()
+        ids = list(range(1, 401))
+        ivf.upsert_many(ids, self.vectors)
+        exact.upsert_many(ids, self.vectors)
+
+        query = self.vectors[3]
+        self.assertEqual([task_id for task_id, _ in ivf.search(query, k=5, min_score=-1)],
+                         [task_id for task_id, _ in exact.search(query, k=5, min_score=-1)])
+
+    def test_incremental_insert_and_delete(self):
+        """
+        Ensure tasks move between cells when their vectors change and disappear when deleted.
+        """
+        ivf = IVFIndex(self.centroids, nprobe=1)
+        ivf.upsert(1, self.vectors[0])
+        ivf.upsert(1, -self.vectors[0])
+        self.assertEqual(len(ivf), 1)
+        self.assertEqual(ivf.search(-self.vectors[0], k=1)[0][0], 1)
+        self.assertEqual(ivf.search(self.vectors[0], k=1), [])
+
+        ivf.remove(1)
+        self.assertEqual(len(ivf), 0)
+        self.assertEqual(sum(len(cell) for cell in ivf._lists), 0)
+
+
+    @override_settings(TASK_IVF_CENTROIDS_PATH='/nonexistent/ivf_centroids.npy', TASK_IVF_FALLBACK_TRAIN_SIZE=300)
+    def test_missing_centroids_train_a_capped_fallback(self):
+        """
+        Ensure building without saved centroids warns and trains on a capped sample with few iterations.
+        """
+        with mock.patch('tasks.index.train_ivf_centroids', return_value=self.centroids) as train, \
+                self.assertLogs('tasks_logger.index', 'WARNING') as logs:
+            np.testing.assert_array_equal(load_ivf_centroids(), self.centroids)
+        train.assert_called_once_with(sample_size=300, n_iter=5)
+        self.assertIn('manage.py train_ivf', logs.output[0])
+
+
+class MmapIndexTestCase(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(2)
+        vectors = rng.normal(size=(50, 16))
+        self.vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'tasks.vidx')
+        write_snapshot(self.path, zip(range(1, 51), self.vectors), dim=16)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_snapshot_search_matches_exact_search(self):
+        """
+        Ensure searching the mapped snapshot returns the same hits as the in-memory index.
+        """
+        mapped = MmapIndex(self.path)
+        exact = VectorIndex()
+        exact.upsert_many(range(1, 51), self.vectors)
+        self.assertEqual(len(mapped), 50)
+        self.assertIsInstance(mapped._vectors, np.memmap)
+        query = self.vectors[7]
+        self.assertEqual([task_id for task_id, _ in mapped.search(query, k=5, min_score=-1)],
+                         [task_id for task_id, _ in exact.search(query, k=5, min_score=-1)])
+
+    def test_deltas_are_shared_between_processes(self):
+        """
+        Ensure changes logged by one index instance are seen by another mapping the same file.
+        """
+        writer, reader = MmapIndex(self.path), MmapIndex(self.path)
+        writer.upsert(1, -self.vectors[0])
+        writer.upsert(51, self.vectors[0])
+        writer.remove(2)
+
+        self.assertEqual(len(reader), 50)
+        self.assertNotIn(2, reader)
+        self.assertEqual(reader.search(self.vectors[0], k=1)[0][0], 51)
+        self.assertEqual(reader.search(-self.vectors[0], k=1)[0][0], 1)
+        self.assertNotIn(2, [task_id for task_id, _ in reader.search(self.vectors[1], k=None, min_score=-1)])
+
+    def test_missing_delta_log_is_recreated(self):
+        """
+        Ensure the first change after the delta log went missing starts a new log instead of failing.
+        """
+        os.remove(delta_path(self.path))
+        writer, reader = MmapIndex(self.path), MmapIndex(self.path)
+        writer.upsert(51, self.vectors[0])
+        self.assertEqual(reader.search(self.vectors[0], k=1)[0][0], 51)
+        self.assertEqual(len(reader), 51)
+
+    def test_new_snapshot_replaces_mapping(self):
+        """
+        Ensure readers switch to a rewritten snapshot and keep changes logged after it.
+        """
+        reader = MmapIndex(self.path)
+        self.assertEqual(len(reader), 50)
+        write_snapshot(self.path, zip(range(1, 11), self.vectors[:10]), dim=16)
+        MmapIndex(self.path).upsert(99, self.vectors[20])
+
+        self.assertEqual(len(reader), 11)
+        self.assertEqual(reader.search(self.vectors[20], k=1)[0][0], 99)
+
+
+class MmapIndexIntegrationTestCase(APITestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.user = get_user_model().objects.create_user(username='mmapuser', password='password')
+        self.client.force_authenticate(user=self.user)
+        reset_index()
+
+    def tearDown(self):
+        reset_index()
+        self.tmpdir.cleanup()
+
+    def test_saved_tasks_are_logged_to_the_index_file(self):
+        """
+        Ensure tasks saved before and after the snapshot is written are both searchable.
+        """
+        path = os.path.join(self.tmpdir.name, 'tasks.vidx')
+        with override_settings(TASK_INDEX_TYPE='mmap', TASK_INDEX_PATH=path):
+            Task.objects.create(title='Water plants', description='In the garden', owner=self.user,
+                                deadline=timezone.now() + timedelta(days=1))
+            call_command('build_index_snapshot', stdout=StringIO())
+            Task.objects.create(title='Buy groceries', description='Milk and eggs', owner=self.user,
+                                deadline=timezone.now() + timedelta(days=1))
+            response = self.client.get(reverse('task-search-tasks', args=['Buy groceries']))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['title'], 'Buy groceries')
+
+    def test_saving_never_writes_the_snapshot(self):
+        """
+        Ensure saves log to an existing snapshot but leave writing a missing one to the first search.
+        """
+        path = os.path.join(self.tmpdir.name, 'tasks.vidx')
+        with override_settings(TASK_INDEX_TYPE='mmap', TASK_INDEX_PATH=path):
+            Task.objects.create(title='Water plants', description='In the garden', owner=self.user,
+                                deadline=timezone.now() + timedelta(days=1))
+            self.assertFalse(os.path.exists(path))
+            self.assertEqual(len(get_index()), 1)
+            self.assertTrue(os.path.exists(path))
+
+    @override_settings(TASK_ENCODER='deterministic', TASK_ENCODER_DIM=16)
+    def test_empty_snapshot_takes_the_encoder_dimension(self):
+        path = os.path.join(self.tmpdir.name, 'tasks.vidx')
+        with mock.patch('tasks.utils.model', None):
+            write_index_snapshot(path)
+        self.assertEqual(MmapIndex(path).dim, 16)
+
+
+class ModelLoadingTestCase(APITestCase):
+    def test_readiness_reports_model_state(self):
+        """
+        Ensure the readiness endpoint is unavailable until the model is loaded, without authentication.
+        """
+        with mock.patch('tasks.utils.model', None):
+            response = self.client.get(reverse('readiness'))
+            self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+            self.assertFalse(response.data['model_loaded'])
+
+            call_command('warmup_model', stdout=StringIO())
+            response = self.client.get(reverse('readiness'))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(response.data['ready'])
+
+    @override_settings(TASK_ENCODER='sentence-transformers', TASK_EMBEDDING_MODEL_PATH='/models/minilm')
+    def test_model_loaded_from_local_path(self):
+        """
+        Ensure a configured local model path is loaded without contacting the hub.
+        """
+        with mock.patch('tasks.utils.model', None), \
+                mock.patch('sentence_transformers.SentenceTransformer') as transformer:
+            from .utils import get_model
+            self.assertIs(get_model().model, transformer.return_value)
+        transformer.assert_called_once_with('/models/minilm', local_files_only=True)
+
+
+class AsyncTaskViewsTestCase(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='asyncuser', password='password')
+        self.other = get_user_model().objects.create_user(username='otheruser', password='password')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+        self.deadline = (timezone.now() + timedelta(days=1)).isoformat()
+        reset_index()
+
+    def tearDown(self):
+        reset_index()
+
+    def test_create_update_and_search(self):
+        """
+        Ensure tasks created and updated through the async views are embedded and searchable.
+        """
+        response = self.client.post(reverse('async-task-list'), {
+            'title': 'Water plants', 'description': 'In the garden', 'deadline': self.deadline,
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        task = Task.objects.get(pk=response.json()['id'])
+        self.assertEqual(task.owner, self.user)
+        self.assertIsNotNone(task.vector_blob)
+
+        response = self.client.patch(reverse('async-task-detail', args=[task.pk]),
+                                     {'title': 'Buy groceries'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['title'], 'Buy groceries')
+
+        response = self.client.get(reverse('async-task-search', args=['Buy groceries']), {'k': 5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['results'][0]['id'], task.pk)
+        self.assertIn('score', response.json()['results'][0])
+
+    @override_settings(TASK_INDEX_TYPE='int8')
+    def test_quantized_search_reads_exact_vectors_off_the_executor(self):
+        """
+        Ensure the exact re-rank of a quantized index reads the database on the ORM's thread, not on an encode thread.
+        """
+        task = Task.objects.create(title='Water plants', description='In the garden', owner=self.user,
+                                   deadline=timezone.now() + timedelta(days=1))
+        threads = []
+
+        def fetch(task_ids):
+            threads.append(threading.current_thread().name)
+            return fetch_exact_vectors(task_ids)
+
+        with mock.patch('tasks.index.fetch_exact_vectors', side_effect=fetch):
+            reset_index()
+            response = self.client.get(reverse('async-task-search', args=['Water plants']), {'k': 5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['results'][0]['id'], task.pk)
+        self.assertTrue(threads)
+        self.assertFalse([name for name in threads if name.startswith('task-async-encode')])
+
+    def test_authentication_and_ownership(self):
+        """
+        Ensure the async views require a token and only let owners update their tasks.
+        """
+        task = Task.objects.create(title='Other task', description='Not mine', owner=self.other,
+                                   deadline=timezone.now() + timedelta(days=1))
+        response = self.client.patch(reverse('async-task-detail', args=[task.pk]), {'title': 'Mine'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.post(reverse('async-task-list'), {'title': 'Late', 'description': 'Past',
+                                                                 'deadline': '2000-01-01T00:00:00Z'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.credentials()
+        response = self.client.get(reverse('async-task-detail', args=[task.pk]))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class FilteredSearchAPITestCase(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='filteruser', password='password')
+        other = get_user_model().objects.create_user(username='otherfilteruser', password='password')
+        deadline = timezone.now() + timedelta(days=2)
+        self.mine = Task.objects.create(title='Quarterly report', description='Finance', owner=self.user,
+                                        deadline=deadline)
+        self.done = Task.objects.create(title='Quarterly report', description='Finance', owner=self.user,
+                                        deadline=deadline, status='COMPLETED')
+        Task.objects.create(title='Quarterly report', description='Finance', owner=other, deadline=deadline)
+        self.client.force_authenticate(user=self.user)
+        reset_index()
+
+    def tearDown(self):
+        reset_index()
+
+    def search(self, **params):
+        response = self.client.get(reverse('task-search-tasks', args=['Quarterly report']), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [task['id'] for task in response.data['results']]
+
+    def test_search_filters(self):
+        """
+        Ensure search can be restricted to the caller's tasks, a status and a deadline window.
+        """
+        self.assertEqual(len(self.search()), 3)
+        self.assertCountEqual(self.search(mine='true'), [self.mine.pk, self.done.pk])
+        self.assertEqual(self.search(mine='true', status='PENDING'), [self.mine.pk])
+        self.assertEqual(self.search(deadline_after=(timezone.now() + timedelta(days=3)).isoformat()), [])
+
+    def test_invalid_status_is_rejected(self):
+        """
+        Ensure unknown status filter values are rejected.
+        """
+        response = self.client.get(reverse('task-search-tasks', args=['Quarterly report']), {'status': 'LATE'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class HybridSearchTestCase(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='hybriduser', password='password')
+        self.client.force_authenticate(user=self.user)
+        deadline = timezone.now() + timedelta(days=1)
+        self.ticket = Task.objects.create(title='Fix JIRA-1234', description='Login fails with error E42',
+                                          owner=self.user, deadline=deadline)
+        self.other = Task.objects.create(title='Plan sprint', description='Review the backlog',
+                                         owner=self.user, deadline=deadline)
+        reset_index()
+
+    def tearDown(self):
+        reset_index()
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('task-search-tasks', args=[query]), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [task['id'] for task in response.data['results']]
+
+    def test_match_query_quotes_terms(self):
+        """
+        Ensure free text becomes a safe FTS5 expression.
+        """
+        self.assertEqual(build_match_query('JIRA-1234 "login" OR NOT'), '"jira-1234" OR "login" OR "or" OR "not"')
+        self.assertIsNone(build_match_query('?! --'))
+
+    def test_reciprocal_rank_fusion(self):
+        """
+        Ensure tasks ranked well in both rankings come first.
+        """
+        fused = reciprocal_rank_fusion([[(1, 9.0), (2, 5.0), (3, 1.0)], [(2, 0.9), (1, 0.8)]], rrf_k=60)
+        self.assertEqual([task_id for task_id, _ in fused], [1, 2, 3])
+        self.assertAlmostEqual(fused[0][1], 1 / 61 + 1 / 62)
+
+    def test_fts_index_follows_task_changes(self):
+        """
+        Ensure the FTS5 index is kept in sync by updates, bulk updates and deletes.
+        """
+        self.assertEqual([task_id for task_id, _ in lexical_search('E42', 10)], [self.ticket.pk])
+        self.other.description = 'Triage error E42 reports'
+        self.other.save()
+        self.assertCountEqual([task_id for task_id, _ in lexical_search('E42', 10)], [self.ticket.pk, self.other.pk])
+        Task.objects.filter(pk=self.other.pk).update(description='Nothing here')
+        self.ticket.delete()
+        self.assertEqual(lexical_search('E42', 10), [])
+
+    def test_keyword_search_skips_encoding(self):
+        """
+        Ensure keyword mode finds exact identifiers without embedding the query.
+        """
+        with mock.patch('tasks.views.encode_text') as encode:
+            self.assertEqual(self.search('JIRA-1234', mode='keyword'), [self.ticket.pk])
+        encode.assert_not_called()
+
+    def test_hybrid_search_only_scores_candidates(self):
+        """
+        Ensure hybrid mode ranks the full-text candidates without a full index scan,
+        and falls back to vector search when nothing matches lexically.
+        """
+        with mock.patch('tasks.views.get_index') as get_index:
+            self.assertEqual(self.search('JIRA-1234 login', mode='hybrid'), [self.ticket.pk])
+        get_index.assert_not_called()
+        self.assertIn(self.other.pk, self.search('Plan sprint', mode='hybrid'))
+        self.assertEqual(self.search('unrelated words', mode='hybrid', min_score=0.99), [])
+
+    def test_hybrid_hits_report_and_filter_by_cosine_similarity(self):
+        """
+        Ensure hybrid hits carry the cosine similarity of their vector, not the fused rank score,
+        and are cut off by min_score like vector hits.
+        """
+        query = 'Fix JIRA-1234'
+        response = self.client.get(reverse('task-search-tasks', args=[query]), {'mode': 'hybrid', 'min_score': -1})
+        hit = response.data['results'][0]
+        self.assertEqual(hit['id'], self.ticket.pk)
+        expected = cosine_similarity(encode_text(query, kind='query'), np.asarray(self.ticket.vector_representation))
+        self.assertAlmostEqual(hit['score'], expected, places=5)
+        self.assertEqual(self.search(query, mode='hybrid', min_score=hit['score']), [])
+
+
+class SparseFieldsetTestCase(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='sparseuser', password='password')
+        self.client.force_authenticate(user=self.user)
+        self.task = Task.objects.create(title='Write docs', description='API reference', owner=self.user,
+                                        deadline=timezone.now() + timedelta(days=1))
+        reset_index()
+
+    def tearDown(self):
+        reset_index()
+
+    def test_list_leaves_out_vectors_by_default(self):
+        """
+        Ensure list responses omit vectors unless requested, without reading the vector column.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('task-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('vector_representation', response.data['results'][0])
+        self.assertFalse(any('vector_blob' in query['sql'] for query in queries.captured_queries))
+
+        response = self.client.get(reverse('task-list'), {'fields': 'id,title,vector_representation'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title', 'vector_representation'})
+        self.assertEqual(len(response.data['results'][0]['vector_representation']), 384)
+
+    def test_detail_and_exclude(self):
+        """
+        Ensure detail reads keep the vector by default and honour exclude.
+        """
+        url = reverse('task-detail', kwargs={'pk': self.task.pk})
+        self.assertIn('vector_representation', self.client.get(url).data)
+        response = self.client.get(url, {'exclude': 'vector_representation,description'})
+        self.assertNotIn('vector_representation', response.data)
+        self.assertNotIn('description', response.data)
+        self.assertEqual(response.data['title'], 'Write docs')
+
+    def test_search_fields(self):
+        """
+        Ensure search hits omit vectors by default and can be trimmed to ids and scores.
+        """
+        url = reverse('task-search-tasks', args=['Write docs'])
+        self.assertNotIn('vector_representation', self.client.get(url).data['results'][0])
+        response = self.client.get(url, {'fields': 'id,score'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'score'})
+
+    def test_unknown_field_is_rejected(self):
+        """
+        Ensure unknown field names are reported.
+        """
+        response = self.client.get(reverse('task-list'), {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CursorPaginationTestCase(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='cursoruser', password='password')
+        self.client.force_authenticate(user=self.user)
+        deadline = timezone.now() + timedelta(days=1)
+        # Pairs of equal deadlines check that ties are ordered by id
+        self.tasks = [Task.objects.create(title=f'Report {n}', description='Quarterly report', owner=self.user,
+                                          deadline=deadline + timedelta(hours=n // 2)) for n in range(25)]
+        reset_index()
+
+    def tearDown(self):
+        reset_index()
+
+    def walk(self, url, params, direction='next'):
+        pages, response = [], self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append(response.data)
+            if not response.data[direction]:
+                return pages
+            response = self.client.get(response.data[direction])
+
+    def test_list_cursor_pages(self):
+        """
+        Ensure cursor pages of the list follow (deadline, id) without gaps or repeats, in both directions.
+        """
+        pages = self.walk(reverse('task-list'), {'cursor': ''})
+        self.assertEqual([len(page['results']) for page in pages], [10, 10, 5])
+        ids = [task['id'] for page in pages for task in page['results']]
+        self.assertEqual(ids, [task.pk for task in self.tasks])
+        self.assertNotIn('count', pages[0])
+        self.assertIsNone(pages[0]['previous'])
+
+        back = self.walk(pages[-1]['previous'], {}, direction='previous')
+        self.assertEqual([task['id'] for page in reversed(back) for task in page['results']], ids[:20])
+
+    def test_list_cursor_query_has_no_offset(self):
+        """
+        Ensure deeper pages are fetched with a key range and a limit, without OFFSET or COUNT.
+        """
+        second = self.client.get(reverse('task-list'), {'cursor': ''}).data['next']
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(second)
+        sql = ' '.join(query['sql'] for query in queries.captured_queries).upper()
+        self.assertIn('LIMIT 11', sql)
+        self.assertNotIn('OFFSET', sql.replace('OFFSET 0', ''))
+        self.assertNotIn('COUNT(', sql)
+
+    def test_list_count_modes(self):
+        """
+        Ensure the count is only added on request, exactly or estimated, and invalid cursors are rejected.
+        """
+        url = reverse('task-list')
+        self.assertEqual(self.client.get(url, {'cursor': '', 'count': 'exact'}).data['count'], 25)
+        response = self.client.get(url, {'cursor': '', 'count': 'estimate'})
+        self.assertEqual(response.data['count'], 25)
+        self.assertNotIn('count=', response.data['next'])
+        self.assertEqual(self.client.get(url, {'cursor': '', 'count': 'all'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url, {'cursor': 'garbage'}).status_code, status.HTTP_404_NOT_FOUND)
+        with override_settings(TASK_PAGINATION='cursor'):
+            self.assertIn('next', self.client.get(url).data)
+        self.assertEqual(self.client.get(url).data['count'], 25)
+
+    def test_search_cursor_pages(self):
+        """
+        Ensure cursor pages of search results follow the ranking, best first, with the number of hits.
+        """
+        url = reverse('task-search-tasks', args=['Quarterly report'])
+        pages = self.walk(url, {'cursor': '', 'min_score': 0})
+        hits = [(task['score'], task['id']) for page in pages for task in page['results']]
+        self.assertEqual(len(hits), 25)
+        self.assertEqual(len({task_id for _, task_id in hits}), 25)
+        self.assertEqual(hits, sorted(hits, key=lambda hit: (-hit[0], hit[1])))
+        self.assertEqual(pages[0]['count'], 25)
+
+        async_url = reverse('async-task-search', args=['Quarterly report'])
+        token = Token.objects.create(user=self.user)
+        response = APIClient().get(async_url, {'cursor': '', 'min_score': 0}, HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.assertEqual([task['id'] for task in response.json()['results']],
+                         [task['id'] for task in pages[0]['results']])
+
+
+class SearchCacheTestCase(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='cacheuser', password='password')
+        self.other_user = get_user_model().objects.create_user(username='othercacheuser', password='password')
+        self.client.force_authenticate(user=self.user)
+        self.deadline = timezone.now() + timedelta(days=1)
+        self.task = Task.objects.create(title='Renew passport', description='Book an appointment',
+                                        owner=self.user, deadline=self.deadline)
+        caches['search'].clear()
+        get_search_cache().clear()
+        reset_index()
+
+    def tearDown(self):
+        reset_index()
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('task-search-tasks', args=[query]), {'min_score': 0, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [task['id'] for task in response.data['results']]
+
+    def test_repeated_search_is_served_from_cache(self):
+        """
+        Ensure a repeated search, also with different whitespace, neither encodes nor scans the index.
+        """
+        self.assertEqual(self.search('Renew passport'), [self.task.pk])
+        with mock.patch('tasks.views.encode_text') as encode, mock.patch('tasks.views.get_index') as get_index:
+            self.assertEqual(self.search('  Renew   passport '), [self.task.pk])
+            self.assertEqual(self.search('Renew passport', page=1), [self.task.pk])
+        encode.assert_not_called()
+        get_index.assert_not_called()
+        self.assertEqual(get_search_cache().stats(), {'hits': 2, 'misses': 1, 'hit_rate': 2 / 3})
+        self.assertEqual(self.client.get(reverse('readiness')).data['search_cache']['hits'], 2)
+
+    def test_task_changes_invalidate_results(self):
+        """
+        Ensure saving and deleting a task changes the next search's results.
+        """
+        self.assertEqual(self.search('Renew passport'), [self.task.pk])
+        other = Task.objects.create(title='Renew passport photos', description='Book an appointment',
+                                    owner=self.user, deadline=self.deadline)
+        self.assertCountEqual(self.search('Renew passport'), [self.task.pk, other.pk])
+        other.delete()
+        self.assertEqual(self.search('Renew passport'), [self.task.pk])
+        self.assertEqual(get_search_cache().hits, 0)
+
+    def test_owner_partition(self):
+        """
+        Ensure another owner's changes keep owner-filtered results cached but invalidate unfiltered ones.
+        """
+        self.search('Renew passport', mine='true')
+        self.search('Renew passport')
+        Task.objects.create(title='Renew passport', description='Book an appointment', owner=self.other_user,
+                            deadline=self.deadline)
+        self.assertEqual(self.search('Renew passport', mine='true'), [self.task.pk])
+        self.assertEqual(get_search_cache().hits, 1)
+        self.assertEqual(len(self.search('Renew passport')), 2)
+        self.assertEqual(get_search_cache().hits, 1)
+
+    @override_settings(TASK_SEARCH_CACHE_ALIAS='')
+    def test_cache_can_be_disabled(self):
+        """
+        Ensure searches run uncached without a cache alias.
+        """
+        self.assertIsNone(get_search_cache())
+        self.assertEqual(self.search('Renew passport'), [self.task.pk])
+
+
+class BenchmarkTestCase(TestCase):
+    def test_hashing_encoder_is_deterministic(self):
+        """
+        Ensure the hashing encoder maps equal texts to equal vectors and related texts closer than unrelated ones.
+        """
+        encoder = HashingEncoder(dim=64)
+        vectors = encoder.encode(['fix login bug', 'fix login bug', 'fix the login page', 'quarterly tax report'])
+        self.assertEqual(vectors.shape, (4, 64))
+        self.assertEqual(vectors.dtype, np.float32)
+        np.testing.assert_array_equal(vectors[0], vectors[1])
+        np.testing.assert_array_equal(HashingEncoder(dim=64).encode(['fix login bug']), vectors[:1])
+        self.assertEqual(encoder.encode([]).shape, (0, 64))
+        with self.assertRaises(TypeError):
+            encoder.encode('fix login bug')
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.assertGreater(vectors[0] @ vectors[2], vectors[0] @ vectors[3])
+
+    def test_parse_size(self):
+        self.assertEqual([parse_size(size) for size in ['500', '1k', '100K', '1m', '2.5k']],
+                         [500, 1000, 100000, 1000000, 2500])
+
+    def test_benchmark_command(self):
+        """
+        Ensure the benchmark runs end to end with the hashing encoder and reports JSON results.
+        """
+        out = StringIO()
+        call_command('benchmark', '--in-place', '--sizes', '30', '--queries', '3', '--creates', '2',
+                     '--repeat', '2', stdout=out, stderr=StringIO())
+        results = json.loads(out.getvalue())
+        self.assertEqual(results['environment']['embedding_model'], 'hashing-384')
+        run = results['runs'][0]
+        self.assertEqual(run['tasks'], 30)
+        self.assertEqual(run['bulk_ingest']['tasks'], 30)
+        self.assertEqual(run['search']['vector']['n'], 3)
+        self.assertIn('p99_ms', run['list']['cursor_last'])
+        self.assertIn('with_vectors', run['serialization'])
+        self.assertEqual(run['create']['latency']['n'], 2)
+        self.assertFalse(Task.objects.filter(owner__username__startswith='benchmark-').exists())
+
+
+class EncoderTestCase(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='encoderuser', password='password')
+        self.client.force_authenticate(user=self.user)
+        reset_index()
+
+    def tearDown(self):
+        reset_index()
+
+    def test_deterministic_encoder(self):
+        """
+        Ensure the deterministic encoder gives equal texts equal unit vectors of the configured dimension.
+        """
+        with override_settings(TASK_ENCODER_DIM=32):
+            encoder = create_encoder('deterministic')
+        self.assertEqual((encoder.name, encoder.dim), ('deterministic-32', 32))
+        vectors = encoder.encode(['ship release', 'ship release', 'other'])
+        np.testing.assert_array_equal(vectors[0], DeterministicEncoder(dim=32).encode(['ship release'])[0])
+        np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0, rtol=1e-5)
+        with self.assertRaises(AppException):
+            create_encoder('no.such.Encoder')
+
+    def test_encoders_share_the_encode_contract(self):
+        """
+        Ensure every local backend takes a list of texts and returns a 2-D float32 array, even for one text.
+        """
+        for encoder in [HashingEncoder(dim=16), DeterministicEncoder(dim=16)]:
+            vectors = encoder.encode(['one text'])
+            self.assertEqual((vectors.shape, vectors.dtype), ((1, 16), np.float32))
+
+    def test_vectors_are_tagged_and_searched_per_encoder(self):
+        """
+        Ensure stored vectors are tagged with their encoder and only the configured encoder's vectors are searched.
+        """
+        deadline = timezone.now() + timedelta(days=1)
+        with override_settings(TASK_ENCODER='deterministic'), mock.patch('tasks.utils.model', None):
+            legacy = Task.objects.create(title='Ship release notes', description='Changelog', owner=self.user,
+                                         deadline=deadline)
+        self.assertEqual(legacy.vector_model, 'deterministic-384')
+
+        with override_settings(TASK_ENCODER='hashing'), mock.patch('tasks.utils.model', None):
+            task = Task.objects.create(title='Ship release notes', description='Changelog', owner=self.user,
+                                       deadline=deadline)
+            self.assertEqual(task.vector_model, 'hashing-384')
+            response = self.client.get(reverse('task-search-tasks', args=['Ship release notes']))
+            self.assertEqual([hit['id'] for hit in response.data['results']], [task.pk])
+            self.assertEqual(response.data['results'][0]['vector_model'], 'hashing-384')
+
+            with tempfile.TemporaryDirectory() as tmp:
+                call_command('reembed_tasks', '--missing-only', '--restart',
+                             '--checkpoint', os.path.join(tmp, 'checkpoint'), stdout=StringIO())
+            legacy.refresh_from_db()
+            self.assertEqual(legacy.vector_model, 'hashing-384')
+
+
+class MetricsTestCase(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='metricsuser', password='password')
+        self.client.force_authenticate(user=self.user)
+        Task.objects.create(title='Measure latency', description='Histogram buckets', owner=self.user,
+                            deadline=timezone.now() + timedelta(days=1))
+        caches['search'].clear()
+        reset_index()
+        reset_metrics()
+
+    def tearDown(self):
+        reset_index()
+
+    def test_histogram_buckets(self):
+        """
+        Ensure histogram buckets are rendered cumulatively with their count and sum.
+        """
+        histogram = Histogram('test_seconds', "Test.", labels=('kind',), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value, kind='a')
+        self.assertEqual(list(histogram.samples()), [
+            'test_seconds_bucket{kind="a",le="0.1"} 1',
+            'test_seconds_bucket{kind="a",le="1.0"} 2',
+            'test_seconds_bucket{kind="a",le="+Inf"} 3',
+            'test_seconds_count{kind="a"} 3',
+            'test_seconds_sum{kind="a"} 5.55',
+        ])
+
+    def test_search_is_instrumented(self):
+        """
+        Ensure a search records encode, scoring, fetch, serialization and request metrics on /metrics.
+        """
+        response = self.client.get(reverse('task-search-tasks', args=['Measure latency of metrics']))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        for sample in ['task_encode_seconds_count{kind="query"} 1',
+                       'task_encode_batch_size_count{kind="query"} 1',
+                       'task_similarity_seconds_count{index="exact"} 1',
+                       'task_db_fetch_seconds_count{operation="search_page"} 1',
+                       'task_serialization_seconds_count{serializer="TaskSearchResultSerializer"} 1',
+                       'task_http_request_seconds_count{endpoint="task-search-tasks",method="GET",status="200"} 1',
+                       'task_http_requests_total{endpoint="task-search-tasks",method="GET",status="200"} 1']:
+            self.assertIn(sample, text)
+
+        metrics = self.client.get(reverse('metrics'), {'format': 'json'}).json()['metrics']
+        self.assertEqual(metrics['task_similarity_seconds'][0]['count'], 1)
+
+    def test_unknown_methods_share_one_label(self):
+        """
+        Ensure arbitrary request methods are counted as 'other' instead of each creating its own time series.
+        """
+        for method in ['FOOBAR', 'BAZ']:
+            self.client.generic(method, reverse('task-list'))
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('task_http_requests_total{endpoint="task-list",method="other",status="405"} 2', text)
+        self.assertNotIn('FOOBAR', text)
+
+    @override_settings(TASK_METRICS_ENABLED=False)
+    def test_metrics_can_be_disabled(self):
+        self.client.get(reverse('task-list'))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_404_NOT_FOUND)
+
+
+class LoggerTestCase(SimpleTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.addCleanup(setup_logger)
+        self.addCleanup(stop_listener)
+
+    def reconfigure(self, **overrides):
+        stop_listener()
+        with override_settings(TASK_LOG_DIR=self.tmpdir.name, **overrides):
+            return setup_logger()
+
+    def read_log(self):
+        stop_listener()
+        with open(os.path.join(self.tmpdir.name, 'tasks.log')) as f:
+            return f.read()
+
+    def test_setup_is_idempotent(self):
+        """
+        Ensure repeated setup_logger() calls install a single queue handler, written through off-thread.
+        """
+        logger = self.reconfigure()
+        for name in ['tasks.models', 'tasks.serializers', None]:
+            setup_logger(name)
+        self.assertEqual(len(logger.handlers), 1)
+        self.assertIsInstance(logger.handlers[0], logging.handlers.QueueHandler)
+
+        setup_logger('tasks.models').info("Written once")
+        self.assertEqual(self.read_log().count("tasks_logger.models - INFO - Written once"), 1)
+
+    def test_levels_and_sampling(self):
+        """
+        Ensure per-logger levels apply and sampled loggers drop records below WARNING only.
+        """
+        self.addCleanup(logging.getLogger('tasks_logger.serializers').setLevel, logging.NOTSET)
+        self.reconfigure(TASK_LOG_LEVELS={'serializers': 'warning'}, TASK_LOG_SAMPLE_RATES={'models': '0'})
+        setup_logger('tasks.serializers').info("Validating deadline")
+        setup_logger('tasks.models').info("Generating vector representation")
+        setup_logger('tasks.models').warning("Kept warning")
+        setup_logger('tasks.utils').info("Kept info")
+        log = self.read_log()
+        self.assertNotIn("Validating deadline", log)
+        self.assertNotIn("Generating vector representation", log)
+        self.assertIn("Kept warning", log)
+        self.assertIn("Kept info", log)
+
+    def test_log_files_in_redirects_both_logs(self):
+        """
+        Ensure log_files_in() moves the tasks and Django log files to its directory for the block only.
+        """
+        def django_log_files():
+            return [handler.baseFilename for handler in logging.getLogger('django').handlers
+                    if isinstance(handler, logging.FileHandler)]
+
+        with log_files_in(self.tmpdir.name):
+            setup_logger('tasks.models').warning("Redirected")
+            self.assertEqual(django_log_files(), [os.path.join(self.tmpdir.name, 'django.log')])
+        with open(os.path.join(self.tmpdir.name, 'tasks.log')) as f:
+            self.assertIn("Redirected", f.read())
+        self.assertNotIn(os.path.join(self.tmpdir.name, 'django.log'), django_log_files())
+
+    def test_forked_children_do_not_rotate_the_log(self):
+        """
+        Ensure a forked child's listener appends to the shared log file without rotating it, leaving that to the parent.
+        """
+        def file_handlers():
+            return [type(handler) for handler in logger_module._listener.handlers]
+
+        self.reconfigure()
+        self.assertEqual(file_handlers(), [logging.handlers.RotatingFileHandler])
+        with override_settings(TASK_LOG_DIR=self.tmpdir.name):
+            # What os.register_at_fork runs around a fork, in the parent and then in the child
+            logger_module._lock.acquire()
+            logger_module._restart_after_fork()
+        self.assertEqual(file_handlers(), [logging.handlers.WatchedFileHandler])
+        setup_logger('tasks.models').info("Written by a child")
+        self.assertIn("Written by a child", self.read_log())
+
+    def test_sample_rate(self):
+        sampler = SamplingFilter({'tasks_logger.models': 0.25})
+        record = logging.LogRecord('tasks_logger.models', logging.INFO, __file__, 0, "msg", None, None)
+        with mock.patch('tasks.logger.random.random', side_effect=[0.1, 0.5]):
+            self.assertTrue(sampler.filter(record))
+            self.assertFalse(sampler.filter(record))
+        self.assertEqual(sampler.rate_for('tasks_logger.models.child'), 0.25)
+        self.assertEqual(sampler.rate_for('tasks_logger.views'), 1.0)
+
+    def test_malformed_pairs_raise_improperly_configured(self):
+        """
+        Ensure a TASK_LOG_LEVELS or TASK_LOG_SAMPLE_RATES entry that is not a valid name=value pair is reported
+        as a configuration error naming the setting.
+        """
+        self.assertEqual(name_value_pairs('TASK_LOG_LEVELS', log_level)('models=warning, views=DEBUG'),
+                         {'models': 'WARNING', 'views': 'DEBUG'})
+        for setting, cast, value in [('TASK_LOG_LEVELS', log_level, 'models=WARNING,serializers'),
+                                     ('TASK_LOG_LEVELS', log_level, 'models=LOUD'),
+                                     ('TASK_LOG_SAMPLE_RATES', float, '=0.5'),
+                                     ('TASK_LOG_SAMPLE_RATES', float, 'models=often')]:
+            with self.assertRaisesMessage(ImproperlyConfigured, f"Invalid {setting} entry"):
+                name_value_pairs(setting, cast)(value)
+
+
+class SQLiteProfileTestCase(SimpleTestCase):
+    def open_connection(self):
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        wrapper = DatabaseWrapper({**connection.settings_dict, 'NAME': os.path.join(tmpdir.name, 'db.sqlite3')},
+                                  alias='profile-test')
+        self.addCleanup(wrapper.close)
+        wrapper.ensure_connection()
+        return wrapper
+
+    @override_settings(TASK_SQLITE_PRODUCTION=False)
+    def test_default_profile_leaves_connections_alone(self):
+        pragmas = get_sqlite_pragmas(self.open_connection())
+        self.assertEqual(pragmas['journal_mode'], 'delete')
+        self.assertEqual(pragmas['mmap_size'], 0)
+
+    @override_settings(TASK_SQLITE_PRODUCTION=True, TASK_SQLITE_MMAP_SIZE=1024 * 1024,
+                       TASK_SQLITE_CACHE_SIZE=-8192, TASK_SQLITE_BUSY_TIMEOUT_MS=2500)
+    def test_production_profile_pragmas(self):
+        """
+        Ensure the production profile switches new connections to WAL with the configured PRAGMAs.
+        """
+        self.assertEqual(get_sqlite_pragmas(self.open_connection()), {
+            'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 2500, 'mmap_size': 1024 * 1024,
+            'cache_size': -8192,
+        })
+
+
+class ExportTestCase(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='exporter', password='password')
+        self.other = get_user_model().objects.create_user(username='other', password='password')
+        self.client.force_authenticate(user=self.user)
+        deadline = timezone.now() + timedelta(days=1)
+        self.tasks = [Task.objects.create(title=f'Export {n}', description='Streamed row', owner=owner,
+                                          deadline=deadline) for n, owner in enumerate([self.user, self.other] * 3)]
+
+    def export(self, **params):
+        response = self.client.get(reverse('task-export'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        return response, [json.loads(line) for line in lines]
+
+    def test_ndjson_export(self):
+        """
+        Ensure every task is streamed in (updated_at, id) order with the API's fields and, on request, its vector.
+        """
+        response, records = self.export()
+        self.assertEqual([record['id'] for record in records], [task.pk for task in self.tasks])
+        self.assertEqual(records[0]['owner'], self.user.pk)
+        self.assertEqual(records[0]['title'], 'Export 0')
+        self.assertNotIn('vector_representation', records[0])
+        self.assertEqual(response['X-Export-Until'], records[-1]['updated_at'])
+
+        _, records = self.export(vectors='list', mine='true')
+        self.assertEqual(len(records), 3)
+        np.testing.assert_allclose(records[0]['vector_representation'], self.tasks[0].vector_representation,
+                                   rtol=1e-6)
+
+        _, records = self.export(vectors='base64', owner=self.other.pk)
+        self.assertEqual(base64.b64decode(records[0]['vector_blob']), bytes(self.tasks[1].vector_blob))
+
+    @override_settings(TASK_EXPORT_SINCE_OVERLAP=0)
+    def test_incremental_export(self):
+        """
+        Ensure exporting since a previous export's X-Export-Until only returns tasks written afterwards,
+        including by bulk updates.
+        """
+        until = self.export()[0]['X-Export-Until']
+        self.assertEqual(self.export(since=until)[1], [])
+
+        self.client.post(reverse('task-bulk'), {'update': [{'id': self.tasks[2].pk, 'title': 'Renamed'}]},
+                         format='json')
+        response, records = self.export(since=until)
+        self.assertEqual([(record['id'], record['title']) for record in records], [(self.tasks[2].pk, 'Renamed')])
+        self.assertGreater(response['X-Export-Until'], until)
+
+        response = self.client.get(reverse('task-export'), {'since': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_incremental_export_overlaps_late_commits(self):
+        """
+        Ensure an incremental export picks up a write that became visible after the previous export although
+        its updated_at is older, and that tasks repeated from the overlap do not move the watermark backwards.
+        """
+        until = self.export()[0]['X-Export-Until']
+        late = parse_datetime(until) - timedelta(seconds=1)
+        Task.objects.filter(pk=self.tasks[0].pk).update(title='Committed late', updated_at=late)
+        with override_settings(TASK_EXPORT_SINCE_OVERLAP=0):
+            self.assertEqual(self.export(since=until)[1], [])
+
+        response, records = self.export(since=until)
+        self.assertIn((self.tasks[0].pk, 'Committed late'), [(record['id'], record['title']) for record in records])
+        self.assertEqual(response['X-Export-Until'], until)
+
+    def test_vector_file_export(self):
+        """
+        Ensure the binary export round-trips the normalized vectors through read_vector_file and the command.
+        """
+        response = self.client.get(reverse('task-export-vectors'))
+        header, ids, vectors = read_vector_file(b''.join(response.streaming_content))
+        self.assertEqual(header['dim'], 384)
+        self.assertEqual(list(ids), [task.pk for task in self.tasks])
+        np.testing.assert_array_equal(vectors[1], self.tasks[1].normalized_vector)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'tasks.vectors')
+            call_command('export_tasks', '--format', 'vectors', '--chunk-size', '4', '--output', path,
+                         stderr=StringIO())
+            with open(path, 'rb') as f:
+                _, file_ids, file_vectors = read_vector_file(f.read())
+        np.testing.assert_array_equal(file_ids, ids)
+        np.testing.assert_array_equal(file_vectors, vectors)
+
+    def test_vector_export_is_chunked(self):
+        """
+        Ensure NDJSON exports with vectors are yielded chunk_size rows at a time rather than held until the end.
+        """
+        for vectors in ['base64', 'list']:
+            task_export = TaskExport(vectors=vectors, chunk_size=4)
+            chunks = list(task_export.ndjson())
+            self.assertEqual([chunk.count(b'\n') for chunk in chunks], [4, 2])
+            self.assertEqual(task_export.rows, 6)
+        chunks = TaskExport(vectors='base64', chunk_size=4).ndjson()
+        records = [json.loads(line) for line in b''.join(chunks).splitlines()]
+        self.assertEqual([record['id'] for record in records], [task.pk for task in self.tasks])
+        self.assertEqual(base64.b64decode(records[5]['vector_blob']), bytes(self.tasks[5].vector_blob))
+        self.assertEqual(records[5]['vector_dtype'], self.tasks[5].vector_dtype)
+
+    async def test_export_streams_asynchronously_under_asgi(self):
+        """
+        Ensure ASGI requests get an async iterator, which Django streams instead of reading it to the end first.
+        """
+        token = await Token.objects.acreate(user=self.user)
+        response = await AsyncClient().get(reverse('task-export'), {'vectors': 'base64'},
+                                           headers={'Authorization': f'Token {token.key}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.is_async)
+        lines = b''.join([chunk async for chunk in response.streaming_content]).decode().splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], [task.pk for task in self.tasks])
+
+
+@override_settings(TASK_EMBEDDING_SERVER_ENCODER='deterministic', TASK_ENCODER_DIM=16)
+class EmbeddingServerTestCase(SimpleTestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = os.path.join(tmpdir.name, 'embedding.sock')
+        self.server = self.start_server(DeterministicEncoder(dim=16))
+
+    def start_server(self, encoder):
+        server = EmbeddingServer(self.path, encoder, max_batch_size=32, max_wait_ms=20)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def test_remote_encoder_batches_requests(self):
+        """
+        Ensure the client gets the server encoder's vectors and name, with concurrent requests batched.
+        """
+        client = RemoteEncoder(self.path)
+        self.assertFalse(client.loaded)
+        self.assertEqual(client.name, 'deterministic-16')
+        self.assertEqual(client.dim, 16)
+        self.assertTrue(client.loaded)
+
+        texts = [f'task {n}' for n in range(24)]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            vectors = list(pool.map(lambda text: client.encode([text])[0], texts))
+        np.testing.assert_array_equal(np.stack(vectors), DeterministicEncoder(dim=16).encode(texts))
+        stats = client.info()['batching']
+        self.assertEqual(stats['requests'], 24)
+        self.assertLess(stats['batches'], 24)
+
+    def test_client_reconnects_after_server_restart(self):
+        client = RemoteEncoder(self.path)
+        first = client.encode(['before restart'])
+        self.server.shutdown()
+        self.server.server_close()
+        self.start_server(DeterministicEncoder(dim=16))
+        np.testing.assert_array_equal(client.encode(['before restart']), first)
+
+    @override_settings(TASK_EMBEDDING_SERVER_ENCODER='hashing')
+    def test_encoder_mismatch_is_rejected(self):
+        """
+        Ensure a client expecting another encoder refuses to tag vectors with the wrong name.
+        """
+        with self.assertRaises(AppException):
+            RemoteEncoder(self.path).load()
+
+    def test_socket_is_private_from_creation(self):
+        """
+        Ensure the socket is bound with owner and group permissions only, rather than chmod-ed afterwards.
+        """
+        with mock.patch('tasks.embedding_server.os.chmod') as chmod:
+            self.server.shutdown()
+            self.server.server_close()
+            self.start_server(DeterministicEncoder(dim=16))
+        chmod.assert_not_called()
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o660)
+
+    def test_oversized_message_is_rejected(self):
+        """
+        Ensure a frame announcing more than max_message_size bytes is refused without reading it.
+        """
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(5)
+            sock.connect(self.path)
+            sock.sendall(FRAME.pack(16, 4 * 1024 ** 3 - 1))
+            response, _ = recv_message(sock)
+            self.assertIn('exceeds the limit', response['error'])
+            self.assertIsNone(recv_message(sock))
+        np.testing.assert_array_equal(RemoteEncoder(self.path).encode(['still serving']),
+                                      DeterministicEncoder(dim=16).encode(['still serving']))
+
+    def test_unavailable_server(self):
+        with self.assertRaises(AppException):
+            RemoteEncoder(self.path + '.missing').encode(['text'])
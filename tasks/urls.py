@@ -1,6 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import TaskViewSet
+from .views import TaskViewSet, ReadinessView
+from .async_views import AsyncTaskListView, AsyncTaskDetailView, AsyncTaskSearchView
 
 # Create a router and register your viewsets with it.
 router = DefaultRouter()
@@ -8,5 +9,10 @@ router.register(r'tasks', TaskViewSet)
 
 # The API URLs are now determined automatically by the router.
 urlpatterns = [
+    path('ready/', ReadinessView.as_view(), name='readiness'),
+    # Native async views, for deployments on the ASGI application (taskvectorapi.asgi)
+    path('async/tasks/', AsyncTaskListView.as_view(), name='async-task-list'),
+    path('async/tasks/<int:pk>/', AsyncTaskDetailView.as_view(), name='async-task-detail'),
+    path('async/tasks/search/<path:query>/', AsyncTaskSearchView.as_view(), name='async-task-search'),
     path('', include(router.urls)),
 ]
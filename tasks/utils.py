@@ -1,30 +1,85 @@
 from .logger import setup_logger
 from .exception import AppException
-from sentence_transformers import SentenceTransformer
+import threading
+import time
 import numpy as np
 
-logger = setup_logger()
+logger = setup_logger(__name__)
 model = None
+_model_lock = threading.Lock()
 
+# Supported encodings for vectors stored in Task.vector_blob
+VECTOR_DTYPES = {
+    'float32': np.float32,
+    'float16': np.float16,
+}
 
-def get_model():
+
+def get_encoder():
     """
-    initializes this model only once (lazy initialization) with the 'all-MiniLM-L6-v2' model,
-    which is an efficient choice for generating text embeddings.
-    Handles any exceptions during model loading and logs them.
+    Returns the process-wide text encoder configured by TASK_ENCODER (see tasks/encoders.py),
+    without loading model weights yet.
     """
     global model
 
     if model is None:
-        try:
-            model = SentenceTransformer('all-MiniLM-L6-v2')
-        except Exception as e:
-            logger.error(f"Error initializing SentenceTransformer model: {e}")
-            raise AppException("Failed to load SentenceTransformer model.") from e
+        with _model_lock:
+            if model is None:
+                from .encoders import create_encoder
+
+                model = create_encoder()
 
     return model
 
 
+def get_model_name():
+    """
+    Returns the name of the configured encoder, e.g. the sentence-transformers model TASK_EMBEDDING_MODEL.
+    Stored vectors are tagged with it (Task.vector_model) and it keys the embedding cache.
+    """
+    return get_encoder().name
+
+
+def get_model_source():
+    """
+    Returns where the model is loaded from: the local directory TASK_EMBEDDING_MODEL_PATH
+    if configured (for offline deployments), otherwise the model name on the Hugging Face hub.
+    Encoders without model files report their name.
+    """
+    encoder = get_encoder()
+    return getattr(encoder, 'source', encoder.name)
+
+
+def get_model():
+    """
+    Returns the process-wide encoder, loaded and ready to encode. With the default
+    'sentence-transformers' encoder, sentence-transformers (and torch) are only
+    imported here, so processes that never encode text do not pay for loading them.
+    """
+    return get_encoder().load()
+
+
+def is_model_loaded():
+    """
+    Returns True once the embedding model has been loaded in this process.
+    """
+    return model is not None and model.loaded
+
+
+def warmup_model():
+    """
+    Load the embedding model and run a dummy encode, so the first request
+    does not pay for loading weights and initializing the inference kernels.
+
+    :return: Seconds spent warming up.
+    """
+    started = time.monotonic()
+    get_model().encode(['warmup'])
+    elapsed = time.monotonic() - started
+    logger.info(f"Warmed up embedding model in {elapsed:.1f}s")
+    return elapsed
+
+
 def cosine_similarity(a, b):
     """
     Calculate the cosine similarity between two vectors.
@@ -42,3 +97,47 @@ def cosine_similarity(a, b):
     except Exception as e:
         logger.error(f"Error calculating cosine similarity: {e}")
         raise AppException("Failed to calculate cosine similarity.") from e
+
+
+def normalize_vector(vector):
+    """
+    Convert a vector to a contiguous float32 NumPy array with unit L2 norm.
+    Returns None for empty or zero vectors, which can never match a query.
+    """
+    if vector is None:
+        return None
+    array = np.asarray(vector, dtype=np.float32).ravel()
+    norm = np.linalg.norm(array)
+    if array.size == 0 or not np.isfinite(norm) or norm == 0:
+        return None
+    return array / norm
+
+
+def pack_vector(vector, dtype='float32'):
+    """
+    Pack a vector into the compact binary form stored on a task.
+    The vector is L2-normalized before packing and its original norm is returned
+    alongside, so the raw vector can still be reconstructed.
+
+    :param vector: Sequence of floats or NumPy array.
+    :param dtype: Storage precision, one of VECTOR_DTYPES.
+    :return: Tuple of (bytes, norm), or (None, None) for an empty or zero vector.
+    """
+    if dtype not in VECTOR_DTYPES:
+        raise AppException(f"Unsupported vector dtype '{dtype}'.")
+    normalized = normalize_vector(vector)
+    if normalized is None:
+        return None, None
+    norm = float(np.linalg.norm(np.asarray(vector, dtype=np.float32)))
+    return normalized.astype(VECTOR_DTYPES[dtype]).tobytes(), norm
+
+
+def unpack_vector(blob, dtype='float32'):
+    """
+    Decode a vector packed by pack_vector into a normalized float32 NumPy array.
+    """
+    if blob is None:
+        return None
+    if dtype not in VECTOR_DTYPES:
+        raise AppException(f"Unsupported vector dtype '{dtype}'.")
+    return np.frombuffer(blob, dtype=VECTOR_DTYPES[dtype]).astype(np.float32)
@@ -1,15 +1,24 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.views import APIView
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views import View
 from .models import Task
-from .serializers import TaskSerializer
+from .serializers import (TaskSerializer, TaskBulkSerializer, TaskExportParamsSerializer, TaskSearchParamsSerializer,
+                          TaskSearchResultSerializer, field_columns, select_fields)
 from .permissions import IsOwnerOrReadOnly
-import numpy as np
-from .utils import get_model, cosine_similarity
-
-# Initialize the model for vector encoding
-model = get_model()
+from .batching import get_encode_batcher
+from .embeddings import encode_text
+from .export import TaskExport, format_datetime, iterate_async
+from .index import get_index, get_loaded_index, search_index
+from .metrics import DB_FETCH_SECONDS, render_prometheus, snapshot
+from .pagination import RankedCursorPagination, TaskCursorPagination, use_cursor_pagination
+from .search import hybrid_search, lexical_search
+from .search_cache import get_search_cache
+from .utils import get_model_name, get_model_source, is_model_loaded
 
 
 class TaskViewSet(viewsets.ModelViewSet):
@@ -21,6 +30,59 @@ class TaskViewSet(viewsets.ModelViewSet):
     queryset = Task.objects.all()
     serializer_class = TaskSerializer
     permission_classes = [IsAuthenticated, IsOwnerOrReadOnly]
+    # Actions whose responses only contain the fields selected with ?fields= / ?exclude=
+    sparse_actions = {'list': ['vector_representation'], 'retrieve': [],
+                      'search_tasks': ['vector_representation']}
+
+    def get_response_fields(self, serializer_class=None):
+        """
+        Fields selected by the request for read actions; vectors are left out of lists and
+        search results unless requested with ?fields=. None for other actions.
+        """
+        if self.action not in self.sparse_actions:
+            return None
+        return select_fields(serializer_class or self.get_serializer_class(), self.request.query_params,
+                             self.sparse_actions[self.action])
+
+    def get_queryset(self):
+        """
+        For read actions, only load the columns of the selected fields, so that unrequested
+        vectors are never read from the database.
+        """
+        queryset = super().get_queryset()
+        fields = self.get_response_fields()
+        if fields is not None:
+            queryset = queryset.only(*field_columns(fields))
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_response_fields(kwargs.get('serializer_class'))
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        return super().get_serializer(*args, **kwargs)
+
+    @property
+    def paginator(self):
+        """
+        The page-number paginator, or with ?cursor= (or TASK_PAGINATION = 'cursor') a keyset
+        paginator: by (deadline, id) for the list and by score for search results.
+        """
+        if not hasattr(self, '_paginator'):
+            if self.pagination_class is not None and use_cursor_pagination(self.request):
+                self._paginator = RankedCursorPagination() if self.action == 'search_tasks' \
+                    else TaskCursorPagination()
+            else:
+                self._paginator = None if self.pagination_class is None else self.pagination_class()
+        return self._paginator
+
+    def paginate_queryset(self, queryset):
+        # Pagination evaluates the list queryset
+        with DB_FETCH_SECONDS.time(operation='list_page'):
+            return super().paginate_queryset(queryset)
+
+    def get_object(self):
+        with DB_FETCH_SECONDS.time(operation='task'):
+            return super().get_object()
 
     def perform_create(self, serializer):
         """
@@ -34,26 +96,175 @@ class TaskViewSet(viewsets.ModelViewSet):
         Custom action to search tasks based on a provided title, description,
         or a combination of both, using the vector retrieval system.
 
+        Query parameters:
+            k: Number of best matches to rank (default TASK_SEARCH_DEFAULT_K).
+            min_score: Minimum cosine similarity of a match (default TASK_SEARCH_MIN_SCORE); not
+                applied in keyword mode.
+            mine / owner: Only match the requesting user's tasks / the tasks of this user id.
+            status: Only match tasks with this status; may be repeated.
+            deadline_after / deadline_before: Only match tasks with a deadline in this window.
+            mode: 'vector' (default), 'keyword' (FTS5 BM25 only) or 'hybrid' (FTS5 candidates
+                re-ranked by vector similarity, fused with reciprocal rank fusion).
+                Scores are cosine similarities, except BM25 relevance in keyword mode.
+            The ranked hits are cached by these parameters until a task is saved or deleted.
+            page: Page of the ranked matches to return.
+            cursor: Cursor of the page to return with keyset pagination (empty for the first page).
+            fields / exclude: Comma-separated fields to include or leave out; the vector
+                representation is only included when listed in fields.
+
         Args:
             request: The HTTP request object.
             query (str): The query string to search for.
 
         Returns:
-            Response: A list of tasks that match the search criteria.
+            Response: A page of matching tasks, best first, each with its similarity score.
         """
         if not query:
             return Response({'message': 'No query provided'}, status=status.HTTP_400_BAD_REQUEST)
 
-        query_vector = model.encode(query, convert_to_tensor=True).cpu().numpy()
-        tasks = Task.objects.all()
-        similar_tasks = []
+        params = TaskSearchParamsSerializer(data=request.query_params, context={'request': request})
+        params.is_valid(raise_exception=True)
+        fields = self.get_response_fields(TaskSearchResultSerializer)
 
-        # Compare the query vector with the vector representation of each task
-        for task in tasks:
-            if task.vector_representation:
-                similarity = cosine_similarity(np.array(query_vector), np.array(task.vector_representation))
-                if similarity > 0.5:  # Adjust threshold as needed
-                    similar_tasks.append(task)
+        k, mode, filters = params.validated_data['k'], params.validated_data['mode'], params.validated_data['filters']
+        min_score = params.validated_data['min_score']
+        # Repeated searches are served from the result cache until a task changes
+        cache = get_search_cache()
+        cache_key, hits = cache.lookup(query, mode, k, min_score, filters) if cache is not None else (None, None)
+        if hits is None:
+            if mode == 'keyword':
+                hits = lexical_search(query, k, filters)
+            else:
+                query_vector = encode_text(query, kind='query')
+                # Hybrid mode only scores the full-text candidates; without any it falls back to a vector search
+                hits = hybrid_search(query, query_vector, k, filters, min_score) if mode == 'hybrid' else None
+                if hits is None:
+                    # Rank the top k tasks in one pass over the vector index
+                    hits = search_index(get_index(), query_vector, k, min_score, filters)
+            if cache is not None:
+                cache.set(cache_key, hits)
 
-        serializer = TaskSerializer(similar_tasks, many=True, context={'request': request})
+        # Only the requested page of hits is fetched from the database and serialized
+        page = self.paginate_queryset(hits)
+        page_hits = page if page is not None else hits
+        with DB_FETCH_SECONDS.time(operation='search_page'):
+            tasks_by_id = Task.objects.only(*field_columns(fields)).in_bulk([task_id for task_id, _ in page_hits])
+        similar_tasks = []
+        for task_id, score in page_hits:
+            # Ids of tasks deleted in another process may linger in the index; skip them
+            task = tasks_by_id.get(task_id)
+            if task is not None:
+                task.score = score
+                similar_tasks.append(task)
+
+        serializer = TaskSearchResultSerializer(similar_tasks, many=True, fields=fields,
+                                                context={'request': request})
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
         return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """
+        Custom action to create, partially update and delete many tasks in one request.
+
+        Args:
+            request: The HTTP request object, with optional 'create', 'update' and 'delete' lists.
+
+        Returns:
+            Response: The created and updated tasks, the deleted ids and any per-item errors.
+        """
+        serializer = TaskBulkSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        result = serializer.apply()
+        return Response(result, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='export')
+    def export(self, request):
+        """
+        Custom action to stream tasks as NDJSON, one JSON object per line in (updated_at, id) order.
+
+        Query parameters:
+            since: Only export tasks written after this time, e.g. the X-Export-Until of a previous export.
+            mine / owner: Only export the requesting user's tasks / the tasks of this user id.
+            vectors: 'none' (default), 'list' (vector_representation as in the API) or 'base64'
+                (the stored normalized vector_blob with its vector_dtype and vector_norm).
+
+        Args:
+            request: The HTTP request object.
+
+        Returns:
+            StreamingHttpResponse: The tasks, with the time the export covers up to in X-Export-Until.
+        """
+        task_export = self.get_export(request)
+        return self.stream(request, task_export, task_export.ndjson(), 'application/x-ndjson', 'tasks.ndjson')
+
+    @action(detail=False, methods=['get'], url_path='export/vectors')
+    def export_vectors(self, request):
+        """
+        Custom action to stream the task vectors of the configured encoder as a binary vector
+        file (see export.TaskExport.vector_file), e.g. to build an index offline.
+
+        Takes the since, mine and owner query parameters of the NDJSON export.
+        """
+        task_export = self.get_export(request)
+        return self.stream(request, task_export, task_export.vector_file(), 'application/octet-stream',
+                           'tasks.vectors')
+
+    def get_export(self, request):
+        params = TaskExportParamsSerializer(data=request.query_params, context={'request': request})
+        params.is_valid(raise_exception=True)
+        return TaskExport(since=params.validated_data.get('since'), owner_id=params.validated_data.get('owner'),
+                          vectors=params.validated_data['vectors'])
+
+    @staticmethod
+    def stream(request, task_export, chunks, content_type, filename):
+        # Under ASGI a synchronous iterator would be read to the end before the first byte is sent.
+        # Under WSGI, META is the WSGI environ, which always holds wsgi.version (PEP 3333).
+        if 'wsgi.version' not in request.META:
+            chunks = iterate_async(chunks)
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        if task_export.until is not None:
+            response['X-Export-Until'] = format_datetime(task_export.until)
+        return response
+
+
+class ReadinessView(APIView):
+    """
+    Readiness probe for load balancers and orchestrators.
+    Responds 200 once the embedding model is loaded in this process and 503 until then,
+    so traffic is only routed to workers that have been warmed up. Also reports the
+    encode batcher's batch-size and queue-wait metrics and the search cache's hit rate.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        ready = is_model_loaded()
+        index = get_loaded_index()
+        batcher = get_encode_batcher()
+        cache = get_search_cache()
+        return Response({
+            'ready': ready,
+            'model': get_model_name(),
+            'model_source': get_model_source(),
+            'model_loaded': ready,
+            'index_loaded': index is not None,
+            'encode_batching': batcher.stats() if batcher is not None else None,
+            'search_cache': cache.stats() if cache is not None else None,
+        }, status=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+class MetricsView(View):
+    """
+    Timing histograms and counters of this process (encodes, database fetches, similarity
+    scoring, serialization and per-endpoint latency) in the Prometheus text format, or as
+    JSON with ?format=json. Each worker process reports its own metrics.
+    """
+    def get(self, request):
+        if not getattr(settings, 'TASK_METRICS_ENABLED', True):
+            raise Http404
+        if request.GET.get('format') == 'json':
+            return JsonResponse(snapshot())
+        return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -11,9 +11,11 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
 from pathlib import Path
+import logging
 import os
 from django.conf import settings
-from decouple import config
+from django.core.exceptions import ImproperlyConfigured
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -50,6 +52,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so that request latencies include every other middleware
+    'tasks.middleware.metrics_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -79,14 +83,32 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'taskvectorapi.wsgi.application'
 
+# Runs the tests with the hashing encoder (no model download) and their logs outside LOG_ROOT
+TEST_RUNNER = 'tasks.runner.TaskTestRunner'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# Opt-in SQLite production profile (see tasks/db.py): WAL journal, synchronous=NORMAL, memory-mapped
+# I/O, a larger page cache and a busy timeout on every connection, IMMEDIATE write transactions and
+# persistent connections, so concurrent task writes no longer block list and search readers.
+TASK_SQLITE_PRODUCTION = config('TASK_SQLITE_PRODUCTION', default=False, cast=bool)
+TASK_SQLITE_MMAP_SIZE = config('TASK_SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int)
+# Pages, or KiB when negative (SQLite's convention)
+TASK_SQLITE_CACHE_SIZE = config('TASK_SQLITE_CACHE_SIZE', default=-64 * 1024, cast=int)
+TASK_SQLITE_BUSY_TIMEOUT_MS = config('TASK_SQLITE_BUSY_TIMEOUT_MS', default=5000, cast=int)
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Seconds a connection is reused across requests (0 closes it after each request)
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=600 if TASK_SQLITE_PRODUCTION else 0, cast=int),
+        'CONN_HEALTH_CHECKS': TASK_SQLITE_PRODUCTION,
+        # Take the write lock when a transaction begins, so the busy timeout applies instead of a
+        # deferred transaction failing with "database is locked" when it upgrades to a write
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'} if TASK_SQLITE_PRODUCTION else {},
     }
 }
 
@@ -132,6 +154,12 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Log directories. The test runner (tasks/runner.py) and the benchmark command write their logs to
+# the system temp directory instead, so they never leave rotating log files in the source tree.
+LOG_ROOT = config('LOG_ROOT', default=BASE_DIR)
+DJANGO_LOG_DIR = config('DJANGO_LOG_DIR', default=os.path.join(LOG_ROOT, 'logs'))
+TASK_LOG_DIR = config('TASK_LOG_DIR', default=os.path.join(LOG_ROOT, 'log'))
+
 # logging Configuration
 LOGGING = {
     'version': 1,
@@ -150,9 +178,10 @@ LOGGING = {
         'file': {
             'level': 'INFO',
             'class': 'logging.handlers.RotatingFileHandler',  # Rotating log files
-            'filename': os.path.join(settings.BASE_DIR, 'logs', 'django.log'),
+            'filename': os.path.join(DJANGO_LOG_DIR, 'django.log'),
             'maxBytes': 10*1024*1024,  # 10 MB
             'backupCount': 5,          # Keep 5 old logs
+            'delay': True,             # Not created until the first record
             'formatter': 'verbose',
         },
         'console': {
@@ -171,9 +200,41 @@ LOGGING = {
     },
 }
 
+# Tasks app logger (TASK_LOG_DIR/tasks.log), written by a background thread; see tasks/logger.py.
+# TASK_LOG_LEVELS and TASK_LOG_SAMPLE_RATES are comma-separated name=value pairs keyed by module,
+# e.g. TASK_LOG_LEVELS=serializers=WARNING and TASK_LOG_SAMPLE_RATES=models=0.01,serializers=0.1
+# (keep 1% and 10% of their records below WARNING).
+def name_value_pairs(setting, cast):
+    """
+    decouple cast for a comma-separated list of name=value pairs, parsed into a dict.
+
+    :param setting: Name of the setting, for the error message.
+    :param cast: Converts a value; raises ValueError if it is invalid.
+    """
+    def parse(item):
+        name, separator, value = item.partition('=')
+        try:
+            if not separator or not name.strip():
+                raise ValueError
+            return name.strip(), cast(value.strip())
+        except ValueError:
+            raise ImproperlyConfigured(f"Invalid {setting} entry '{item}': expected name=value.")
+    return Csv(cast=parse, post_process=dict)
+
+
+def log_level(value):
+    if not isinstance(logging.getLevelName(value.upper()), int):
+        raise ValueError(value)
+    return value.upper()
+
+
+TASK_LOG_LEVEL = config('TASK_LOG_LEVEL', default='INFO').upper()
+TASK_LOG_LEVELS = config('TASK_LOG_LEVELS', default='', cast=name_value_pairs('TASK_LOG_LEVELS', log_level))
+TASK_LOG_SAMPLE_RATES = config('TASK_LOG_SAMPLE_RATES', default='',
+                               cast=name_value_pairs('TASK_LOG_SAMPLE_RATES', float))
+
 # Create the logs directory if it doesn't exist
-if not os.path.exists(os.path.join(settings.BASE_DIR, 'logs')):
-    os.makedirs(os.path.join(settings.BASE_DIR, 'logs'))
+os.makedirs(DJANGO_LOG_DIR, exist_ok=True)
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -185,3 +246,134 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10  # Adjust the number per your requirement
 }
+# 'page' paginates lists and search results by page number unless a request passes ?cursor=;
+# 'cursor' always uses keyset pagination, whose pages cost the same however deep they are
+TASK_PAGINATION = config('TASK_PAGINATION', default='page')
+
+# Caches
+# 'embeddings' is a database-backed cache shared by all workers; create its table with
+# `python manage.py createcachetable` and set TASK_EMBEDDING_CACHE_ALIAS=embeddings to use it.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'embeddings': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'tasks_embedding_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': config('TASK_EMBEDDING_CACHE_MAX_ENTRIES', default=100000, cast=int),
+        },
+    },
+    # Ranked search results, see TASK_SEARCH_CACHE_ALIAS. Per process; with several workers use a
+    # shared backend (database or Redis) so that a task saved by one worker invalidates every worker's results.
+    'search': {
+        'BACKEND': config('TASK_SEARCH_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('TASK_SEARCH_CACHE_LOCATION', default='tasks-search'),
+        'OPTIONS': {
+            'MAX_ENTRIES': config('TASK_SEARCH_CACHE_MAX_ENTRIES', default=10000, cast=int),
+        },
+    },
+}
+
+# Task embeddings
+# Encoder producing task and query vectors: 'sentence-transformers' (TASK_EMBEDDING_MODEL), 'hashing'
+# (a cheap hashed bag-of-words vectorizer for CPU-starved deployments), 'deterministic' (for tests) or a
+# dotted path to a tasks.encoders.Encoder subclass. Stored vectors are tagged with the encoder's name;
+# run `manage.py reembed_tasks --missing-only` after switching. 'remote' sends texts to the shared
+# embedding server below instead of loading a model in each worker.
+TASK_ENCODER = config('TASK_ENCODER', default='sentence-transformers')
+# Vector dimension of the hashing and deterministic encoders
+TASK_ENCODER_DIM = config('TASK_ENCODER_DIM', default=384, cast=int)
+TASK_EMBEDDING_MODEL = config('TASK_EMBEDDING_MODEL', default='all-MiniLM-L6-v2')
+# Local directory holding the model files (e.g. saved with SentenceTransformer.save()); when set the
+# model is loaded from disk without contacting the hub. Keep TASK_EMBEDDING_MODEL as its cache key.
+TASK_EMBEDDING_MODEL_PATH = config('TASK_EMBEDDING_MODEL_PATH', default='')
+# Load the model and run a dummy encode when a WSGI/ASGI worker starts instead of on the first request
+TASK_EMBEDDING_WARMUP = config('TASK_EMBEDDING_WARMUP', default=False, cast=bool)
+# Number of embeddings kept in each process's LRU cache (0 disables it)
+TASK_EMBEDDING_CACHE_SIZE = config('TASK_EMBEDDING_CACHE_SIZE', default=10000, cast=int)
+# Optional CACHES alias used as a persistent second tier for embeddings
+TASK_EMBEDDING_CACHE_ALIAS = config('TASK_EMBEDDING_CACHE_ALIAS', default=None)
+TASK_EMBEDDING_CACHE_TIMEOUT = None
+# 'sync' embeds tasks inside Task.save(); 'async' saves them as pending and embeds them in the background
+TASK_EMBEDDING_MODE = config('TASK_EMBEDDING_MODE', default='sync')
+# Who drains pending embeddings in async mode: 'thread' (a worker thread in each web process)
+# or 'command' (a separate `python manage.py process_embeddings` process)
+TASK_EMBEDDING_WORKER = config('TASK_EMBEDDING_WORKER', default='thread')
+TASK_EMBEDDING_BATCH_SIZE = config('TASK_EMBEDDING_BATCH_SIZE', default=64, cast=int)
+TASK_EMBEDDING_POLL_INTERVAL = config('TASK_EMBEDDING_POLL_INTERVAL', default=5.0, cast=float)
+# Concurrent small encodes (search queries, single saves) are coalesced into one model call:
+# a batch of queued requests is dispatched after TASK_ENCODE_BATCH_WAIT_MS or once it holds
+# TASK_ENCODE_BATCH_MAX_SIZE texts; a request arriving alone is dispatched at once.
+# 0 ms encodes every request on its own thread. A request fails after TASK_ENCODE_BATCH_TIMEOUT seconds.
+TASK_ENCODE_BATCH_WAIT_MS = config('TASK_ENCODE_BATCH_WAIT_MS', default=5.0, cast=float)
+TASK_ENCODE_BATCH_MAX_SIZE = config('TASK_ENCODE_BATCH_MAX_SIZE', default=32, cast=int)
+TASK_ENCODE_BATCH_TIMEOUT = config('TASK_ENCODE_BATCH_TIMEOUT', default=60.0, cast=float)
+# Threads the async views (/api/async/) run encodes and index searches on, off the event loop
+TASK_ASYNC_ENCODE_WORKERS = config('TASK_ASYNC_ENCODE_WORKERS', default=4, cast=int)
+
+# Shared embedding server (`python manage.py embedding_server`): one process loads
+# TASK_EMBEDDING_SERVER_ENCODER and serves batched encodes to workers with TASK_ENCODER=remote
+TASK_EMBEDDING_SERVER_SOCKET = config('TASK_EMBEDDING_SERVER_SOCKET', default=os.path.join(BASE_DIR, 'run', 'embedding.sock'))
+TASK_EMBEDDING_SERVER_ENCODER = config('TASK_EMBEDDING_SERVER_ENCODER', default='sentence-transformers')
+# Torch intra-op threads of the server (0 keeps torch's default of one per core)
+TASK_EMBEDDING_SERVER_THREADS = config('TASK_EMBEDDING_SERVER_THREADS', default=0, cast=int)
+TASK_EMBEDDING_SERVER_MAX_BATCH_SIZE = config('TASK_EMBEDDING_SERVER_MAX_BATCH_SIZE', default=64, cast=int)
+TASK_EMBEDDING_SERVER_MAX_WAIT_MS = config('TASK_EMBEDDING_SERVER_MAX_WAIT_MS', default=5.0, cast=float)
+# Requests waiting for a batch; more wait up to TASK_EMBEDDING_SERVER_QUEUE_TIMEOUT seconds, then fail
+TASK_EMBEDDING_SERVER_QUEUE_SIZE = config('TASK_EMBEDDING_SERVER_QUEUE_SIZE', default=1024, cast=int)
+TASK_EMBEDDING_SERVER_QUEUE_TIMEOUT = config('TASK_EMBEDDING_SERVER_QUEUE_TIMEOUT', default=10.0, cast=float)
+# Largest request the server reads, in bytes; bigger ones are refused before any memory is allocated for them
+TASK_EMBEDDING_SERVER_MAX_MESSAGE_SIZE = config('TASK_EMBEDDING_SERVER_MAX_MESSAGE_SIZE', default=16 * 1024 * 1024,
+                                                cast=int)
+# Seconds a worker waits for the server's response
+TASK_EMBEDDING_SERVER_TIMEOUT = config('TASK_EMBEDDING_SERVER_TIMEOUT', default=30.0, cast=float)
+
+# Vector index held by each process: 'exact' (float32), 'int8' (scalar quantized, 4x smaller),
+# 'pq' (product quantized, 1536 / TASK_INDEX_PQ_SUBSPACES times smaller for 384-dim vectors)
+# 'ivf' (clustered: only the TASK_IVF_NPROBE closest of TASK_IVF_NLIST cells are scanned per query)
+# or 'mmap' (exact, memory-mapped from TASK_INDEX_PATH and shared by every worker process).
+# Quantized indexes re-rank TASK_INDEX_RERANK_FACTOR * k candidates against the exact stored vectors,
+# but at most TASK_INDEX_RERANK_LIMIT (or k if larger; 0 for no limit) per query.
+TASK_INDEX_TYPE = config('TASK_INDEX_TYPE', default='exact')
+TASK_INDEX_PQ_SUBSPACES = config('TASK_INDEX_PQ_SUBSPACES', default=96, cast=int)
+TASK_INDEX_RERANK_FACTOR = config('TASK_INDEX_RERANK_FACTOR', default=10, cast=int)
+TASK_INDEX_RERANK_LIMIT = config('TASK_INDEX_RERANK_LIMIT', default=200, cast=int)
+# Number of stored vectors the quantizer codebooks and IVF centroids are trained on
+TASK_INDEX_TRAIN_SIZE = config('TASK_INDEX_TRAIN_SIZE', default=50000, cast=int)
+# Raising nprobe improves recall at the cost of latency; retrain centroids with `manage.py train_ivf`
+TASK_IVF_NLIST = config('TASK_IVF_NLIST', default=1024, cast=int)
+TASK_IVF_NPROBE = config('TASK_IVF_NPROBE', default=16, cast=int)
+# Without saved centroids, indexes are built with provisional ones trained on this many vectors
+TASK_IVF_FALLBACK_TRAIN_SIZE = config('TASK_IVF_FALLBACK_TRAIN_SIZE', default=10000, cast=int)
+# Snapshot file of the mmap index; rewrite it with `manage.py build_index_snapshot` to compact its delta log
+TASK_INDEX_PATH = config('TASK_INDEX_PATH', default=os.path.join(BASE_DIR, 'index', 'tasks.vidx'))
+TASK_IVF_CENTROIDS_PATH = config('TASK_IVF_CENTROIDS_PATH', default=os.path.join(BASE_DIR, 'index', 'ivf_centroids.npy'))
+
+# Search ranking: number of best matches ranked per query by default and at most,
+# and the cosine similarity a task must exceed to match
+TASK_SEARCH_DEFAULT_K = config('TASK_SEARCH_DEFAULT_K', default=100, cast=int)
+TASK_SEARCH_MAX_K = config('TASK_SEARCH_MAX_K', default=1000, cast=int)
+TASK_SEARCH_MIN_SCORE = config('TASK_SEARCH_MIN_SCORE', default=0.5, cast=float)
+# Default search mode: 'vector', 'hybrid' or 'keyword' (the last two need SQLite FTS5, see migration 0004).
+# Hybrid search re-ranks up to TASK_SEARCH_HYBRID_CANDIDATES full-text matches by vector similarity
+# and fuses both rankings with reciprocal rank fusion, 1 / (TASK_SEARCH_RRF_K + rank).
+TASK_SEARCH_DEFAULT_MODE = config('TASK_SEARCH_DEFAULT_MODE', default='vector')
+TASK_SEARCH_HYBRID_CANDIDATES = config('TASK_SEARCH_HYBRID_CANDIDATES', default=200, cast=int)
+TASK_SEARCH_RRF_K = config('TASK_SEARCH_RRF_K', default=60, cast=int)
+# CACHES alias caching ranked search hits until a task is saved or deleted; empty disables the cache
+TASK_SEARCH_CACHE_ALIAS = config('TASK_SEARCH_CACHE_ALIAS', default='search')
+
+# Timing histograms and counters, exposed in the Prometheus text format on /metrics
+TASK_METRICS_ENABLED = config('TASK_METRICS_ENABLED', default=True, cast=bool)
+
+# Maximum number of operations accepted by POST /api/tasks/bulk/
+TASK_BULK_MAX_ITEMS = config('TASK_BULK_MAX_ITEMS', default=1000, cast=int)
+# Rows fetched from the database and written per chunk by the streaming exports
+TASK_EXPORT_CHUNK_SIZE = config('TASK_EXPORT_CHUNK_SIZE', default=2000, cast=int)
+# Seconds an incremental export (since=...) reaches back, to pick up writes committed after the previous export
+TASK_EXPORT_SINCE_OVERLAP = config('TASK_EXPORT_SINCE_OVERLAP', default=60.0, cast=float)
+
+# Task vector storage
+# Precision used to pack normalized task vectors: 'float32' or 'float16' (half the size, ~3 decimal digits)
+TASK_VECTOR_DTYPE = config('TASK_VECTOR_DTYPE', default='float32')